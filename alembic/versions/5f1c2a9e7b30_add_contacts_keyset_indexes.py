@@ -0,0 +1,28 @@
+"""add contacts keyset indexes
+
+Revision ID: 5f1c2a9e7b30
+Revises: d0634f4b5419
+Create Date: 2026-10-17 10:12:41.508113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5f1c2a9e7b30'
+down_revision: Union[str, None] = 'd0634f4b5419'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_contacts_user_id_id', 'contacts', ['user_id', 'id'], unique=False)
+    op.create_index('ix_contacts_user_id_last_name_id', 'contacts', ['user_id', 'last_name', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_contacts_user_id_last_name_id', table_name='contacts')
+    op.drop_index('ix_contacts_user_id_id', table_name='contacts')
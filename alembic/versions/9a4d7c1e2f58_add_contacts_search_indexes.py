@@ -0,0 +1,42 @@
+"""add contacts search indexes
+
+Revision ID: 9a4d7c1e2f58
+Revises: 5f1c2a9e7b30
+Create Date: 2026-10-17 11:03:17.220941
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from src.database.search import SEARCH_FIELDS, SQLITE_FTS_DDL, POSTGRESQL_TRGM_DDL
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9a4d7c1e2f58'
+down_revision: Union[str, None] = '5f1c2a9e7b30'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        for statement in POSTGRESQL_TRGM_DDL:
+            op.execute(statement)
+    elif dialect == 'sqlite':
+        for statement in SQLITE_FTS_DDL:
+            op.execute(statement)
+        op.execute("INSERT INTO contacts_fts(contacts_fts) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        for field in SEARCH_FIELDS:
+            op.drop_index(f'ix_contacts_{field}_trgm', table_name='contacts')
+    elif dialect == 'sqlite':
+        for trigger in ('contacts_fts_ai', 'contacts_fts_ad', 'contacts_fts_au'):
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        op.execute("DROP TABLE IF EXISTS contacts_fts")
@@ -0,0 +1,52 @@
+"""add contact change sequence and tombstones
+
+Revision ID: a1c4e9d27f63
+Revises: f6a3d8b2c419
+Create Date: 2026-10-17 18:21:09.304113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a1c4e9d27f63'
+down_revision: Union[str, None] = 'f6a3d8b2c419'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('contacts', sa.Column('seq', sa.Integer(), server_default='0', nullable=False))
+    # Наявні контакти отримують номери за id: вони зростають і не повторюються в межах користувача
+    op.execute("UPDATE contacts SET seq = id")
+    op.create_index('ix_contacts_user_id_seq', 'contacts', ['user_id', 'seq'], unique=False)
+    op.create_table('contact_sequences',
+                    sa.Column('user_id', sa.Integer(), nullable=False),
+                    sa.Column('last_seq', sa.Integer(), server_default='0', nullable=False),
+                    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+                    sa.PrimaryKeyConstraint('user_id')
+                    )
+    op.execute("INSERT INTO contact_sequences (user_id, last_seq) "
+               "SELECT user_id, MAX(seq) FROM contacts WHERE user_id IS NOT NULL GROUP BY user_id")
+    op.create_table('contact_tombstones',
+                    sa.Column('id', sa.Integer(), nullable=False),
+                    sa.Column('contact_id', sa.Integer(), nullable=False),
+                    sa.Column('user_id', sa.Integer(), nullable=False),
+                    sa.Column('seq', sa.Integer(), nullable=False),
+                    sa.Column('deleted_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'),
+                              nullable=False),
+                    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+                    sa.PrimaryKeyConstraint('id')
+                    )
+    op.create_index('ix_contact_tombstones_user_id_seq', 'contact_tombstones', ['user_id', 'seq'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_contact_tombstones_user_id_seq', table_name='contact_tombstones')
+    op.drop_table('contact_tombstones')
+    op.drop_table('contact_sequences')
+    op.drop_index('ix_contacts_user_id_seq', table_name='contacts')
+    op.drop_column('contacts', 'seq')
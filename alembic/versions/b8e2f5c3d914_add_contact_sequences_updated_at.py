@@ -0,0 +1,28 @@
+"""add contact_sequences.updated_at
+
+Revision ID: b8e2f5c3d914
+Revises: a1c4e9d27f63
+Create Date: 2026-10-17 20:42:37.518204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8e2f5c3d914'
+down_revision: Union[str, None] = 'a1c4e9d27f63'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # SQLite не додає колонку з непостійним DEFAULT, тому наявні рядки заповнюємо окремо
+    op.add_column('contact_sequences', sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True))
+    op.execute("UPDATE contact_sequences SET updated_at = CURRENT_TIMESTAMP")
+
+
+def downgrade() -> None:
+    op.drop_column('contact_sequences', 'updated_at')
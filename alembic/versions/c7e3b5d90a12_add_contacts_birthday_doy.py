@@ -0,0 +1,35 @@
+"""add contacts birthday doy
+
+Revision ID: c7e3b5d90a12
+Revises: 9a4d7c1e2f58
+Create Date: 2026-10-17 11:47:52.631804
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c7e3b5d90a12'
+down_revision: Union[str, None] = '9a4d7c1e2f58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('contacts', sa.Column('birthday_doy', sa.Integer(), nullable=True))
+    # День року рахується у високосному 2000 році, тож 29 лютого завжди 60
+    if op.get_bind().dialect.name == 'sqlite':
+        op.execute("UPDATE contacts SET birthday_doy = CAST(strftime('%j', '2000-' || strftime('%m-%d', birthday)) "
+                   "AS INTEGER) WHERE birthday IS NOT NULL")
+    else:
+        op.execute("UPDATE contacts SET birthday_doy = EXTRACT(DOY FROM make_date(2000, "
+                   "EXTRACT(MONTH FROM birthday)::int, EXTRACT(DAY FROM birthday)::int)) WHERE birthday IS NOT NULL")
+    op.create_index('ix_contacts_user_id_birthday_doy', 'contacts', ['user_id', 'birthday_doy'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_contacts_user_id_birthday_doy', table_name='contacts')
+    op.drop_column('contacts', 'birthday_doy')
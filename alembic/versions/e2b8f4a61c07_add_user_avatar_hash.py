@@ -0,0 +1,26 @@
+"""add user avatar hash
+
+Revision ID: e2b8f4a61c07
+Revises: c7e3b5d90a12
+Create Date: 2026-10-17 13:26:05.914372
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2b8f4a61c07'
+down_revision: Union[str, None] = 'c7e3b5d90a12'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('avatar_hash', sa.String(length=64), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('users', 'avatar_hash')
@@ -0,0 +1,26 @@
+"""add user token version
+
+Revision ID: f6a3d8b2c419
+Revises: e2b8f4a61c07
+Create Date: 2026-10-17 15:02:41.517220
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f6a3d8b2c419'
+down_revision: Union[str, None] = 'e2b8f4a61c07'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('token_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('users', 'token_version')
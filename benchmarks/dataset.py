@@ -0,0 +1,350 @@
+import argparse
+import csv
+import io
+import itertools
+import multiprocessing
+import random
+import time
+from datetime import date, timedelta
+
+from faker.providers.internet.uk_UA import Provider as UkInternetProvider
+from faker.providers.person.en_US import Provider as EnProvider
+from faker.providers.person.uk_UA import Provider as UkProvider
+from sqlalchemy import create_engine, func, insert, select, text
+
+from src.database.db import Base
+from src.database.models import Contact, User, birthday_day_of_year
+from src.database.search import SQLITE_FTS_DDL
+from src.services.auth import get_password_hash
+
+USER_COLUMNS = ("id", "username", "email", "hashed_password", "confirmed", "token_version")
+CONTACT_COLUMNS = ("id", "first_name", "last_name", "email", "phone_number", "birthday", "birthday_doy",
+                   "additional_data", "user_id", "seq")
+
+# Межі чанків залежать лише від кількості рядків, тому результат не залежить від кількості процесів
+CHUNK_ROWS = 100_000
+
+# Поштові домени з приблизною часткою адрес
+EMAIL_DOMAINS = (("gmail.com", 40), ("ukr.net", 18), ("outlook.com", 12), ("yahoo.com", 8), ("i.ua", 6),
+                 ("meta.ua", 4), ("icloud.com", 7), ("proton.me", 5))
+
+NOTES = (None,) * 9 + ("Work", "Family", "Met at the conference", "Neighbour", "University friend",
+                       "Call after 18:00", "Prefers email", "Old number, check Telegram")
+
+PASSWORD = "password"
+
+# Частка контактів з українськими іменами
+UK_SHARE = 0.6
+
+TRANSLITERATION = str.maketrans({**dict(UkInternetProvider.replacements), "ь": "", "Ь": "", "'": ""})
+
+
+def zipf_weights(size: int, exponent: float = 1.0) -> list:
+    """
+    The zipf_weights function returns Zipf weights, so a few names are common and most are rare.
+
+    :param size: int: The number of names
+    :param exponent: float: The skew of the distribution
+    :return: A list of weights
+    :doc-Author: BGU
+    """
+    return [1 / rank ** exponent for rank in range(1, size + 1)]
+
+
+def weighted_pool(uk_names: tuple, en_names: dict, rng: random.Random) -> tuple:
+    """
+    The weighted_pool function merges Ukrainian and English names with their ASCII spelling for emails.
+    English names keep the census frequencies of Faker, Ukrainian names get Zipf weights in a seeded order.
+
+    :param uk_names: tuple: The Ukrainian names
+    :param en_names: dict: The English names and their frequencies
+    :param rng: random.Random: The generator of the dataset
+    :return: A tuple of (name, ascii name) pairs and their cumulative weights
+    :doc-Author: BGU
+    """
+    uk_names = list(uk_names)
+    rng.shuffle(uk_names)
+    uk_weights = zipf_weights(len(uk_names))
+    en_total = sum(en_names.values())
+    uk_total = sum(uk_weights)
+    names = [(name, name.translate(TRANSLITERATION)) for name in uk_names] + [(name, name) for name in en_names]
+    weights = [weight / uk_total * UK_SHARE for weight in uk_weights] + \
+              [weight / en_total * (1 - UK_SHARE) for weight in en_names.values()]
+    return names, list(itertools.accumulate(weights))
+
+
+def name_pools(seed: int) -> dict:
+    """
+    The name_pools function builds the name pools from the Faker name lists once.
+    Rows are sampled from the pools, which is orders of magnitude faster than calling Faker per row.
+
+    :param seed: int: The seed of the dataset
+    :return: A dictionary of pools and their cumulative weights
+    :doc-Author: BGU
+    """
+    rng = random.Random(seed)
+    first_names, first_weights = weighted_pool(UkProvider.first_names, EnProvider.first_names, rng)
+    last_names, last_weights = weighted_pool(UkProvider.last_names, EnProvider.last_names, rng)
+    return {
+        "first_names": first_names,
+        "first_weights": first_weights,
+        "last_names": last_names,
+        "last_weights": last_weights,
+        "domains": [domain for domain, _ in EMAIL_DOMAINS],
+        "domain_weights": list(itertools.accumulate(weight for _, weight in EMAIL_DOMAINS)),
+    }
+
+
+def random_birthday(rng: random.Random, reference_year: int):
+    """
+    The random_birthday function draws a birthday with ages around 38 years and uniform days of the year.
+    About 3% of contacts have no birthday.
+
+    :param rng: random.Random: The generator of the chunk
+    :param reference_year: int: The year the ages are counted from
+    :return: A date or None
+    :doc-Author: BGU
+    """
+    if rng.random() < 0.03:
+        return None
+    age = min(max(int(rng.gauss(38, 16)), 1), 95)
+    first_day = date(reference_year - age, 1, 1)
+    return first_day + timedelta(days=rng.randrange((date(first_day.year + 1, 1, 1) - first_day).days))
+
+
+def generate_chunk(pools: dict, seed: int, first_user: int, last_user: int, contacts_per_user: int,
+                   reference_year: int, hashed_password: str) -> tuple:
+    """
+    The generate_chunk function generates the users first_user..last_user - 1 and their contacts.
+    Ids are derived from the user number and the generator is seeded by the chunk, so output is deterministic.
+
+    :param pools: dict: The name pools
+    :param seed: int: The seed of the dataset
+    :param first_user: int: The zero-based number of the first user
+    :param last_user: int: The number after the last user
+    :param contacts_per_user: int: The number of contacts of each user
+    :param reference_year: int: The year the ages are counted from
+    :param hashed_password: str: The bcrypt hash shared by all users
+    :return: A tuple of user rows and contact rows
+    :doc-Author: BGU
+    """
+    rng = random.Random(f"{seed}:{first_user}")
+    users, contacts = [], []
+    for number in range(first_user, last_user):
+        user_id = number + 1
+        _, first_name = rng.choices(pools["first_names"], cum_weights=pools["first_weights"])[0]
+        _, last_name = rng.choices(pools["last_names"], cum_weights=pools["last_weights"])[0]
+        username = f"{first_name[0]}{last_name}{user_id}".lower()
+        users.append((user_id, username, f"user{user_id}@example.com", hashed_password, True, 0))
+        first_names = rng.choices(pools["first_names"], cum_weights=pools["first_weights"], k=contacts_per_user)
+        last_names = rng.choices(pools["last_names"], cum_weights=pools["last_weights"], k=contacts_per_user)
+        domains = rng.choices(pools["domains"], cum_weights=pools["domain_weights"], k=contacts_per_user)
+        for index in range(contacts_per_user):
+            contact_id = number * contacts_per_user + index + 1
+            birthday = random_birthday(rng, reference_year)
+            (first_name, first_ascii), (last_name, last_ascii) = first_names[index], last_names[index]
+            contacts.append((contact_id, first_name, last_name,
+                             f"{first_ascii}.{last_ascii}.{contact_id}@{domains[index]}".lower().replace(" ", ""),
+                             f"+380{rng.randrange(10 ** 9):09d}", birthday, birthday_day_of_year(birthday),
+                             rng.choice(NOTES), user_id, index + 1))
+    return users, contacts
+
+
+def write_sqlite(connection, users: list, contacts: list, batch_size: int):
+    """
+    The write_sqlite function inserts rows with executemany in large batches and one transaction per chunk.
+
+    :param connection: The DBAPI connection
+    :param users: list: The user rows
+    :param contacts: list: The contact rows
+    :param batch_size: int: The number of rows per executemany
+    :return: None
+    :doc-Author: BGU
+    """
+    cursor = connection.cursor()
+    users = [row[:4] + (int(row[4]),) + row[5:] for row in users]
+    contacts = [row[:5] + (row[5] and row[5].isoformat(),) + row[6:] for row in contacts]
+    for table, columns, rows in (("users", USER_COLUMNS, users), ("contacts", CONTACT_COLUMNS, contacts)):
+        statement = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+        for start in range(0, len(rows), batch_size):
+            cursor.executemany(statement, rows[start:start + batch_size])
+    connection.commit()
+
+
+def write_postgresql(connection, users: list, contacts: list, batch_size: int):
+    """
+    The write_postgresql function streams rows into the tables with COPY ... FROM STDIN in CSV format.
+
+    :param connection: The psycopg2 connection
+    :param users: list: The user rows
+    :param contacts: list: The contact rows
+    :param batch_size: int: Unused, COPY streams the whole chunk
+    :return: None
+    :doc-Author: BGU
+    """
+    cursor = connection.cursor()
+    for table, columns, rows in (("users", USER_COLUMNS, users), ("contacts", CONTACT_COLUMNS, contacts)):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        buffer.seek(0)
+        cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+    connection.commit()
+
+
+def write_generic(engine, users: list, contacts: list, batch_size: int):
+    """
+    The write_generic function inserts rows through SQLAlchemy executemany, for other backends.
+
+    :param engine: Engine: The engine
+    :param users: list: The user rows
+    :param contacts: list: The contact rows
+    :param batch_size: int: The number of rows per executemany
+    :return: None
+    :doc-Author: BGU
+    """
+    with engine.begin() as conn:
+        for model, columns, rows in ((User, USER_COLUMNS, users), (Contact, CONTACT_COLUMNS, contacts)):
+            for start in range(0, len(rows), batch_size):
+                conn.execute(insert(model), [dict(zip(columns, row)) for row in rows[start:start + batch_size]])
+
+
+worker_state = {}
+
+
+def init_worker(db_url: str, pools: dict, options: dict):
+    """
+    The init_worker function creates the engine of a worker process and keeps the shared generation state.
+
+    :param db_url: str: The database URL
+    :param pools: dict: The name pools
+    :param options: dict: The generation options
+    :return: None
+    :doc-Author: BGU
+    """
+    engine = create_engine(db_url, connect_args={"timeout": 600} if db_url.startswith("sqlite") else {})
+    worker_state.update(engine=engine, pools=pools, options=options)
+
+
+def load_chunk(bounds: tuple) -> int:
+    """
+    The load_chunk function generates and writes one chunk of users in a worker process.
+
+    :param bounds: tuple: The first and the last (exclusive) user number
+    :return: The number of contacts written
+    :doc-Author: BGU
+    """
+    engine, pools, options = worker_state["engine"], worker_state["pools"], worker_state["options"]
+    users, contacts = generate_chunk(pools, options["seed"], *bounds, options["contacts_per_user"],
+                                     options["reference_year"], options["hashed_password"])
+    dialect = engine.dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        connection = engine.raw_connection()
+        try:
+            if dialect == "sqlite":
+                connection.execute("PRAGMA synchronous = OFF")
+                write_sqlite(connection, users, contacts, options["batch_size"])
+            else:
+                write_postgresql(connection, users, contacts, options["batch_size"])
+        finally:
+            connection.close()
+    else:
+        write_generic(engine, users, contacts, options["batch_size"])
+    return len(contacts)
+
+
+def prepare(engine, reset: bool):
+    """
+    The prepare function creates the schema and drops the contact indexes and the full-text trigger for the load.
+
+    :param engine: Engine: The engine
+    :param reset: bool: Drop and recreate all tables
+    :return: None
+    :doc-Author: BGU
+    """
+    if reset:
+        Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        if conn.scalar(select(func.count()).select_from(User)):
+            raise SystemExit("The users table is not empty, run with --reset")
+        # Індекси будуються один раз після завантаження, а не оновлюються на кожен рядок
+        for index in Contact.__table__.indexes:
+            index.drop(conn, checkfirst=True)
+        if engine.dialect.name == "sqlite":
+            conn.exec_driver_sql("PRAGMA journal_mode = WAL")
+            # Індекс FTS будується одним проходом після завантаження
+            conn.exec_driver_sql("DROP TRIGGER IF EXISTS contacts_fts_ai")
+
+
+def finish(engine):
+    """
+    The finish function rebuilds the contact indexes, the change counters of the users, the full-text index on SQLite
+    and the id sequences on PostgreSQL, then refreshes the planner statistics.
+
+    :param engine: Engine: The engine
+    :return: None
+    :doc-Author: BGU
+    """
+    with engine.begin() as conn:
+        for index in Contact.__table__.indexes:
+            index.create(conn, checkfirst=True)
+        conn.exec_driver_sql("INSERT INTO contact_sequences (user_id, last_seq) "
+                             "SELECT user_id, MAX(seq) FROM contacts GROUP BY user_id")
+        if engine.dialect.name == "sqlite":
+            for statement in SQLITE_FTS_DDL:
+                conn.exec_driver_sql(statement)
+            conn.exec_driver_sql("INSERT INTO contacts_fts(contacts_fts) VALUES ('rebuild')")
+        if engine.dialect.name == "postgresql":
+            for table in ("users", "contacts"):
+                conn.execute(text(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                                  f"(SELECT COALESCE(MAX(id), 1) FROM {table}))"))
+    if engine.dialect.name in ("sqlite", "postgresql"):
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.exec_driver_sql("ANALYZE")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate N users with M contacts each")
+    parser.add_argument("--db-url", default="sqlite:///./dataset.db")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--contacts-per-user", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument("--batch-size", type=int, default=50_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--reference-year", type=int, default=2024,
+                        help="Ages are counted from this year, so the dataset does not change over time")
+    parser.add_argument("--reset", action="store_true", help="Drop and recreate the tables first")
+    args = parser.parse_args()
+
+    engine = create_engine(args.db_url)
+    prepare(engine, args.reset)
+    started = time.perf_counter()
+    pools = name_pools(args.seed)
+    options = {
+        "seed": args.seed,
+        "contacts_per_user": args.contacts_per_user,
+        "reference_year": args.reference_year,
+        "batch_size": args.batch_size,
+        # Один bcrypt-хеш для всіх: хешування мільйонів паролів зайняло б години
+        "hashed_password": get_password_hash(PASSWORD),
+    }
+    chunk_users = max(CHUNK_ROWS // max(args.contacts_per_user, 1), 1)
+    chunks = [(first, min(first + chunk_users, args.users)) for first in range(0, args.users, chunk_users)]
+
+    total = args.users * args.contacts_per_user
+    written = 0
+    with multiprocessing.Pool(args.workers, initializer=init_worker,
+                              initargs=(args.db_url, pools, options)) as pool:
+        for rows in pool.imap_unordered(load_chunk, chunks):
+            written += rows
+            elapsed = time.perf_counter() - started
+            print(f"\r{written:>12,}/{total:,} contacts  {written / elapsed:>10,.0f} rows/s", end="", flush=True)
+    print()
+    finish(engine)
+    elapsed = time.perf_counter() - started
+    print(f"Loaded {args.users:,} users and {written:,} contacts in {elapsed:.1f}s "
+          f"({written / elapsed:,.0f} rows/s); password of every user: {PASSWORD!r}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+import argparse
+import io
+import json
+import platform
+import random
+import sys
+import time
+from datetime import date, timedelta
+from itertools import count
+
+from faker import Faker
+from fastapi.testclient import TestClient
+from PIL import Image
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from main import app
+from src.conf.limiter_config import limiter
+from src.database.db import Base, get_db
+from src.database.models import Contact, User
+from src.repository import contacts as repository
+from src.services.auth import get_password_hash
+from src.services.cache import principal_cache, token_versions
+from src.services.storage import AvatarStorage, get_avatar_storage
+
+BATCH_SIZE = 10_000
+PASSWORD = "benchmark"
+
+
+class NullStorage(AvatarStorage):
+    """
+    Avatar storage that discards the image, so the benchmark measures only the application.
+    """
+
+    async def save(self, key: str, data: bytes, content_type: str, version: str) -> str:
+        return f"/avatars/{key}?v={version}"
+
+
+def percentile(timings: list, q: float) -> float:
+    """
+    The percentile function returns the q-th percentile of sorted timings by the nearest-rank method.
+
+    :param timings: list: Sorted timings
+    :param q: float: The percentile, 0..100
+    :return: The timing at the percentile
+    :doc-Author: BGU
+    """
+    return timings[min(len(timings) - 1, max(int(round(q / 100 * len(timings))) - 1, 0))]
+
+
+def measure(fn, requests: int, warmup: int) -> dict:
+    """
+    The measure function runs fn sequentially and returns its throughput and latency percentiles.
+
+    :param fn: Callable: The operation, called with the iteration number
+    :param requests: int: The number of measured runs
+    :param warmup: int: The number of runs before measuring
+    :return: A dictionary with ops_per_sec, p50_ms, p95_ms and p99_ms
+    :doc-Author: BGU
+    """
+    for i in range(warmup):
+        fn(i)
+    timings = []
+    started = time.perf_counter()
+    for i in range(warmup, warmup + requests):
+        call_started = time.perf_counter()
+        fn(i)
+        timings.append((time.perf_counter() - call_started) * 1000)
+    elapsed = time.perf_counter() - started
+    timings.sort()
+    return {
+        "requests": requests,
+        "ops_per_sec": round(requests / elapsed, 2),
+        "p50_ms": round(percentile(timings, 50), 3),
+        "p95_ms": round(percentile(timings, 95), 3),
+        "p99_ms": round(percentile(timings, 99), 3),
+    }
+
+
+def seed(db, fake: Faker, contacts: int) -> User:
+    """
+    The seed function creates the benchmark user with contacts that have realistic names, emails and birthdays.
+
+    :param db: Session: The database session
+    :param fake: Faker: The seeded Faker instance
+    :param contacts: int: The number of contacts
+    :return: The benchmark user
+    :doc-Author: BGU
+    """
+    user = User(username="bench", email="bench@example.com", hashed_password=get_password_hash(PASSWORD),
+                confirmed=True)
+    db.add(user)
+    db.commit()
+    first_names = [fake.first_name() for _ in range(500)]
+    last_names = [fake.last_name() for _ in range(2000)]
+    for start in range(0, contacts, BATCH_SIZE):
+        batch = []
+        for i in range(start, min(start + BATCH_SIZE, contacts)):
+            first_name, last_name = random.choice(first_names), random.choice(last_names)
+            batch.append({"first_name": first_name, "last_name": last_name,
+                          "email": f"{first_name}.{last_name}.{i}@example.com".lower(),
+                          "phone_number": fake.numerify("+380#########"),
+                          "birthday": fake.date_of_birth(minimum_age=1, maximum_age=90)})
+        repository.bulk_create_contacts(db, batch, user.id)
+    return user
+
+
+def make_image(i: int) -> bytes:
+    """
+    The make_image function encodes a 640x480 JPEG with a color unique to i, so avatars are never deduplicated.
+
+    :param i: int: The iteration number
+    :return: The JPEG bytes
+    :doc-Author: BGU
+    """
+    output = io.BytesIO()
+    Image.new("RGB", (640, 480), (i % 256, i // 256 % 256, i // 65536 % 256)).save(output, format="JPEG")
+    return output.getvalue()
+
+
+def contact_payload(fake: Faker, i: int, prefix: str = "new") -> dict:
+    return {"first_name": fake.first_name(), "last_name": fake.last_name(), "email": f"bench.{prefix}.{i}@example.com",
+            "phone_number": "+380123456789", "birthday": date(1990, 1, 1) + timedelta(days=i % 365)}
+
+
+def contact_json(fake: Faker, i: int, prefix: str = "new") -> dict:
+    payload = contact_payload(fake, i, prefix)
+    return {**payload, "birthday": payload["birthday"].isoformat()}
+
+
+def run(args) -> dict:
+    """
+    The run function seeds the database and measures every route and repository case.
+
+    :param args: Namespace: The command line arguments
+    :return: A dictionary of case -> measurements
+    :doc-Author: BGU
+    """
+    random.seed(args.seed)
+    fake = Faker()
+    Faker.seed(args.seed)
+    connect_args = {"check_same_thread": False} if args.db_url.startswith("sqlite") else {}
+    engine = create_engine(args.db_url, connect_args=connect_args)
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    db_session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    with db_session() as db:
+        user = seed(db, fake, args.contacts)
+        user_id = user.id
+        term = db.query(Contact.last_name).filter(Contact.id == args.contacts // 3).scalar()[:4].lower()
+
+    def override_get_db():
+        db = db_session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_avatar_storage] = lambda: NullStorage()
+    limiter.enabled = False
+    principal_cache.clear()
+    token_versions.clear()
+    client = TestClient(app)
+    credentials = {"username": "bench@example.com", "password": PASSWORD}
+    headers = {"Authorization": f"Bearer {client.post('/auth/auth/token', data=credentials).json()['access_token']}"}
+
+    created, repository_created = [], []
+    created_ids, updated_ids, repository_created_ids, repository_updated_ids = count(), count(), count(), count()
+
+    def call(method: str, url: str, expected: int, **kwargs):
+        kwargs.setdefault("headers", headers)
+        response = client.request(method, url, **kwargs)
+        if response.status_code != expected:
+            raise RuntimeError(f"{method} {url}: {response.status_code} {response.text}")
+        return response
+
+    def create(i: int):
+        created.append(call("POST", "/contacts/contacts/", 201, json=contact_json(fake, i)).json()["id"])
+
+    def repository_create(i: int):
+        with db_session() as db:
+            contact = repository.create_contact(db, contact_payload(fake, i, "repository"), user_id)
+            repository_created.append(contact.id)
+
+    def repository_update(i: int):
+        contact_id = repository_created[next(repository_updated_ids) % len(repository_created)]
+        with db_session() as db:
+            repository.update_contact(db, user_id, contact_id, {"first_name": "John"})
+
+    def repository_delete(i: int):
+        with db_session() as db:
+            repository.delete_contact(db, user_id, repository_created[next(repository_created_ids)])
+
+    def repository_read(fn, *fn_args, **fn_kwargs):
+        def read(i: int):
+            with db_session() as db:
+                fn(db, user_id, *fn_args, **fn_kwargs)
+        return read
+
+    cases = {
+        "route:login": lambda i: call("POST", "/auth/auth/token", 200, data=credentials, headers={}),
+        "route:list": lambda i: call("GET", "/contacts/contacts/", 200, params={"limit": 20, "after": ""}),
+        "route:search": lambda i: call("GET", "/contacts/contacts/search", 200,
+                                       params={"q": term, "limit": 20, "after": ""}),
+        "route:birthdays": lambda i: call("GET", "/contacts/contacts/birthdays", 200, params={"days": 7}),
+        "route:create": create,
+        "route:update": lambda i: call("PUT", f"/contacts/contacts/{created[next(updated_ids) % len(created)]}",
+                                       200, json=contact_json(fake, i, "updated")),
+        "route:delete": lambda i: call("DELETE", f"/contacts/contacts/{created[next(created_ids)]}", 200),
+        "route:avatar": lambda i: call("PATCH", "/users/users/avatar", 200,
+                                       files={"file": ("avatar.jpg", make_image(i), "image/jpeg")}),
+        "repository:get_contacts_page": repository_read(repository.get_contacts_page, limit=20),
+        "repository:search_contacts_page": repository_read(repository.search_contacts_page, q=term, limit=20),
+        "repository:get_upcoming_birthdays": repository_read(repository.get_upcoming_birthdays, days=7),
+        "repository:create_contact": repository_create,
+        "repository:update_contact": repository_update,
+        "repository:delete_contact": repository_delete,
+    }
+    results = {}
+    for name, fn in cases.items():
+        if args.only and not any(part in name for part in args.only):
+            continue
+        # Logins обмежені bcrypt, тому для них вистачає меншої вибірки
+        requests = max(args.requests // 10, 10) if name == "route:login" else args.requests
+        results[name] = measure(fn, requests, args.warmup)
+        print(f"{name:<36} {results[name]['ops_per_sec']:>10.1f} ops/s  p50 {results[name]['p50_ms']:>8.2f}ms  "
+              f"p95 {results[name]['p95_ms']:>8.2f}ms  p99 {results[name]['p99_ms']:>8.2f}ms")
+    app.dependency_overrides.clear()
+    limiter.enabled = True
+    engine.dispose()
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """
+    The compare function lists the cases that regressed against the baseline:
+    ops/sec dropped or p95 grew by more than threshold.
+
+    :param results: dict: The current measurements
+    :param baseline: dict: The stored measurements
+    :param threshold: float: The allowed relative change, 0.2 = 20%
+    :return: A list of regression messages
+    :doc-Author: BGU
+    """
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        if current["ops_per_sec"] < previous["ops_per_sec"] * (1 - threshold):
+            regressions.append(f"{name}: {current['ops_per_sec']} ops/s < baseline {previous['ops_per_sec']} ops/s")
+        if current["p95_ms"] > previous["p95_ms"] * (1 + threshold):
+            regressions.append(f"{name}: p95 {current['p95_ms']} ms > baseline {previous['p95_ms']} ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput and latency of the routes and repository functions")
+    parser.add_argument("--db-url", default="sqlite:///./endpoints_bench.db",
+                        help="SQLite by default, or a local PostgreSQL URL")
+    parser.add_argument("--contacts", type=int, default=10_000)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--only", nargs="*", help="Run only the cases whose name contains one of these")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline", help="Fail if a case regressed against this results file")
+    parser.add_argument("--threshold", type=float, default=0.2)
+    args = parser.parse_args()
+
+    results = run(args)
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "db": args.db_url.split(":", 1)[0],
+        "contacts": args.contacts,
+        "results": results,
+    }
+    with open(args.output, "w") as fh:
+        json.dump(report, fh, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as fh:
+            regressions = compare(results, json.load(fh)["results"], args.threshold)
+        for message in regressions:
+            print(f"REGRESSION {message}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions against {args.baseline} (threshold {args.threshold:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+import argparse
+import random
+import statistics
+import time
+
+from faker import Faker
+from sqlalchemy import create_engine, insert, or_
+from sqlalchemy.orm import sessionmaker
+
+from src.database.db import Base
+from src.database.models import Contact, User
+from src.database.search import SEARCH_FIELDS
+from src.repository.contacts import search_contacts, search_contacts_page
+
+BATCH_SIZE = 10_000
+
+
+def make_rows(fake: Faker, start: int, stop: int, user_id: int):
+    """
+    The make_rows function generates contact rows with realistic names and unique emails.
+
+    :param fake: Faker: The seeded Faker instance
+    :param start: int: The index of the first row
+    :param stop: int: The index after the last row
+    :param user_id: int: The owner of the contacts
+    :return: A list of row dicts
+    :doc-Author: BGU
+    """
+    first_names = [fake.first_name() for _ in range(500)]
+    last_names = [fake.last_name() for _ in range(2000)]
+    rows = []
+    for i in range(start, stop):
+        first_name, last_name = random.choice(first_names), random.choice(last_names)
+        rows.append({"first_name": first_name, "last_name": last_name,
+                     "email": f"{first_name}.{last_name}.{i}@example.com".lower(),
+                     "phone_number": "+380123456789", "user_id": user_id})
+    return rows
+
+
+def grow(db, fake: Faker, current: int, size: int, user_id: int):
+    """
+    The grow function inserts contacts until the table holds size rows.
+
+    :param db: Session: The database session
+    :param fake: Faker: The seeded Faker instance
+    :param current: int: The number of rows already inserted
+    :param size: int: The target number of rows
+    :param user_id: int: The owner of the contacts
+    :return: None
+    :doc-Author: BGU
+    """
+    for start in range(current, size, BATCH_SIZE):
+        db.execute(insert(Contact), make_rows(fake, start, min(start + BATCH_SIZE, size), user_id))
+        db.commit()
+    if db.get_bind().dialect.name == "postgresql":
+        with db.get_bind().connect() as conn:
+            conn.exec_driver_sql("ANALYZE contacts")
+
+
+def measure(fn, repeat: int):
+    """
+    The measure function runs fn repeat times and returns the p50 and p95 latency in milliseconds.
+
+    :param fn: Callable: The function to time
+    :param repeat: int: The number of runs
+    :return: A tuple of p50 and p95
+    :doc-Author: BGU
+    """
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+
+
+def legacy_search(db, user_id: int, q: str, limit: int = None):
+    """
+    The legacy_search function is the previous ILIKE '%term%' scan over every search field.
+
+    :param db: Session: The database session
+    :param user_id: int: The owner of the contacts
+    :param q: str: The search term
+    :param limit: int: Limit the number of contacts returned
+    :return: A list of contacts
+    :doc-Author: BGU
+    """
+    query = db.query(Contact).filter(Contact.user_id == user_id,
+                                     or_(*[getattr(Contact, field).ilike(f"%{q}%") for field in SEARCH_FIELDS]))
+    if limit:
+        query = query.order_by(Contact.id).limit(limit)
+    return query.all()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search latency as the contacts table grows")
+    parser.add_argument("--db-url", default="sqlite:///./search_bench.db")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000, 10_000_000])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    fake = Faker()
+    Faker.seed(args.seed)
+    engine = create_engine(args.db_url)
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    user = User(username="bench", email="bench@example.com", hashed_password="-")
+    db.add(user)
+    db.commit()
+
+    print(f"{'rows':>10} {'query':<28} {'legacy p50':>11} {'legacy p95':>11} {'indexed p50':>12} {'indexed p95':>12}")
+    current = 0
+    for size in sorted(args.sizes):
+        grow(db, fake, current, size, user.id)
+        current = size
+        rare = f".{size // 2}@"
+        common = db.query(Contact.last_name).filter(Contact.id == size // 3).scalar()[:4].lower()
+        cases = [
+            (f"rare q={rare!r}",
+             lambda: legacy_search(db, user.id, rare),
+             lambda: search_contacts(db, user.id, q=rare)),
+            (f"first page q={common!r}",
+             lambda: legacy_search(db, user.id, common, limit=20),
+             lambda: search_contacts_page(db, user.id, q=common, limit=20)),
+        ]
+        for name, legacy, indexed in cases:
+            legacy_p50, legacy_p95 = measure(legacy, args.repeat)
+            indexed_p50, indexed_p95 = measure(indexed, args.repeat)
+            print(f"{size:>10} {name:<28} {legacy_p50:>9.2f}ms {legacy_p95:>9.2f}ms "
+                  f"{indexed_p50:>10.2f}ms {indexed_p95:>10.2f}ms")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
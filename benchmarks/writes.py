@@ -0,0 +1,120 @@
+import argparse
+import statistics
+import time
+from contextlib import contextmanager
+from datetime import date
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from src.database.db import Base
+from src.database.models import User
+from src.repository.contacts import create_contact, delete_contact, update_contact
+from src.schemas import ContactResponse
+
+
+class RoundTripCounter:
+    """
+    Counts the statements and commits sent to the database by an engine.
+    """
+
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self.on_execute)
+        event.listen(engine, "commit", self.on_commit)
+
+    def on_execute(self, *args):
+        self.count += 1
+
+    def on_commit(self, *args):
+        self.count += 1
+
+
+@contextmanager
+def without_returning(engine):
+    """
+    The without_returning function makes the repository take the fallback path for backends without RETURNING.
+
+    :param engine: Engine: The benchmarked engine
+    :return: A context manager
+    :doc-Author: BGU
+    """
+    dialect = engine.dialect
+    saved = dialect.insert_returning, dialect.update_returning, dialect.delete_returning
+    dialect.insert_returning = dialect.update_returning = dialect.delete_returning = False
+    try:
+        yield
+    finally:
+        dialect.insert_returning, dialect.update_returning, dialect.delete_returning = saved
+
+
+def contact_data(i: int) -> dict:
+    return {"first_name": "Ivan", "last_name": "Ivanenko", "email": f"ivan{i}@example.com",
+            "phone_number": "+380123456789", "birthday": date(1990, 1, 1), "additional_data": None}
+
+
+def run(db_factory, counter: RoundTripCounter, user_id: int, repeat: int) -> dict:
+    """
+    The run function creates, updates and deletes contacts the way the endpoints do,
+    serializing every result with ContactResponse, and records round trips and latency per endpoint.
+
+    :param db_factory: sessionmaker: Creates one session per request
+    :param counter: RoundTripCounter: The counter attached to the engine
+    :param user_id: int: The owner of the contacts
+    :param repeat: int: The number of requests per endpoint
+    :return: A dictionary of endpoint -> (round trips per request, p50 ms)
+    :doc-Author: BGU
+    """
+    endpoints = {
+        "POST /contacts/": lambda db, i: create_contact(db, contact_data(i), user_id),
+        "POST /contacts/ (dup)": lambda db, i: create_contact(db, contact_data(i), user_id),
+        "PUT /contacts/{id}": lambda db, i: update_contact(db, user_id, ids[i], {"first_name": "John"}),
+        "DELETE /contacts/{id}": lambda db, i: delete_contact(db, user_id, ids[i]),
+    }
+    ids = {}
+    results = {}
+    for name, endpoint in endpoints.items():
+        trips, timings = 0, []
+        for i in range(repeat):
+            with db_factory() as db:
+                before = counter.count
+                started = time.perf_counter()
+                result = endpoint(db, i)
+                if result is not None:
+                    ContactResponse.model_validate(result)
+                    ids.setdefault(i, result.id)
+                timings.append((time.perf_counter() - started) * 1000)
+                trips += counter.count - before
+        results[name] = (trips / repeat, statistics.median(timings))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Database round trips per contact write endpoint")
+    parser.add_argument("--db-url", default="sqlite:///./writes_bench.db")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    engine = create_engine(args.db_url)
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    db_factory = sessionmaker(bind=engine)
+    with db_factory() as db:
+        user = User(username="bench", email="bench@example.com", hashed_password="-")
+        db.add(user)
+        db.commit()
+        user_id = user.id
+    counter = RoundTripCounter(engine)
+
+    with without_returning(engine):
+        before = run(db_factory, counter, user_id, args.repeat)
+    after = run(db_factory, counter, user_id, args.repeat)
+
+    print(f"{'endpoint':<24} {'trips before':>12} {'trips after':>12} {'p50 before':>11} {'p50 after':>11}")
+    for name in before:
+        print(f"{name:<24} {before[name][0]:>12.1f} {after[name][0]:>12.1f} "
+              f"{before[name][1]:>9.3f}ms {after[name][1]:>9.3f}ms")
+
+
+if __name__ == "__main__":
+    main()
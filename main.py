@@ -1,30 +1,69 @@
+import logging
+import os
 import re
 from ipaddress import ip_address
 from typing import Callable
 from pathlib import Path
 
+from anyio import to_thread
 from fastapi import FastAPI, Depends, HTTPException, Request, status
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.staticfiles import StaticFiles
 from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from sqlalchemy import text
-from src.routes import contacts, auth, users
-from src.database.db import get_db
+from starlette.concurrency import run_in_threadpool
+from src.routes import contacts, auth, users, internal
+from src.conf.config import config
+from src.database.db import get_db, engine, async_engine
+from src.database.profiler import SQLProfilerMiddleware
+from src.services.auth import is_internal_token
+from src.services.avatar import upload_too_large
+from src.services.compression import CompressionMiddleware
+from src.services.email import dispatcher
+from src.services.events import event_hub
+from src.services.hashing import hashing_executor
+from src.services.metrics import MetricsMiddleware, instrument_engine, mark_worker_dead, record_rate_limited, \
+    render_metrics
 
 
 from src.conf.limiter_config import limiter
 
+logger = logging.getLogger(__name__)
+
 app = FastAPI()
 
+
+async def rate_limit_exceeded_handler(request: Request, exc: RateLimitExceeded):
+    """
+    The rate_limit_exceeded_handler function counts the rejected request and returns the slowapi 429 response.
+
+    :param request: Request: The rejected request
+    :param exc: RateLimitExceeded: The limit that was hit
+    :return: A response object
+    :doc-Author: BGU
+    """
+    record_rate_limited(request)
+    return _rate_limit_exceeded_handler(request, exc)
+
+
 app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+app.add_exception_handler(RateLimitExceeded, rate_limit_exceeded_handler)
 
 # Підключення маршрутів
 app.include_router(auth.router, prefix="/auth")
 app.include_router(users.router, prefix="/users")
 app.include_router(contacts.router, prefix="/contacts")
+app.include_router(internal.router)
+AVATAR_PATH = app.url_path_for("update_avatar")
+
+# Локальне сховище аватарів роздається самим застосунком
+if config.AVATAR_STORAGE == "local":
+    Path(config.AVATAR_LOCAL_DIR).mkdir(parents=True, exist_ok=True)
+    app.mount(config.AVATAR_LOCAL_URL, StaticFiles(directory=config.AVATAR_LOCAL_DIR), name="avatars")
 
 origins = ["*"]
 
@@ -36,6 +75,52 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(
+    SQLProfilerMiddleware,
+    sample_rate=config.SQL_PROFILE_SAMPLE_RATE,
+    allow_header=config.SQL_PROFILE_HEADER,
+    top=config.SQL_PROFILE_TOP,
+    repeat_threshold=config.SQL_PROFILE_REPEAT_THRESHOLD,
+    authorize=is_internal_token,
+)
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=config.COMPRESSION_MINIMUM_SIZE,
+    gzip_level=config.COMPRESSION_GZIP_LEVEL,
+    brotli_quality=config.COMPRESSION_BROTLI_QUALITY,
+)
+instrument_engine(engine)
+if async_engine is not None:
+    instrument_engine(async_engine.sync_engine)
+
+@app.on_event("startup")
+async def startup():
+    """
+    The startup function starts the background workers of the application
+    and sizes the threadpool that runs sync database calls, so it matches the connection pool.
+
+    :return: None
+    :doc-Author: BGU
+    """
+    to_thread.current_default_thread_limiter().total_tokens = config.THREADPOOL_SIZE
+    await dispatcher.start()
+    await event_hub.broker.start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """
+    The shutdown function drains the email queue and stops the background executors of the application.
+
+    :return: None
+    :doc-Author: BGU
+    """
+    await event_hub.broker.stop()
+    await dispatcher.stop()
+    hashing_executor.shutdown()
+    mark_worker_dead(os.getpid())
+
+
 user_agent_ban_list = [r"Googlebot", r"Python-urllib"]
 
 
@@ -49,9 +134,7 @@ async def user_agent_ban_middleware(request: Request, call_next: Callable):
     :return: A response object
     :doc-Author: BGU
     """
-    print(request.headers.get("Authorization"))
-    user_agent = request.headers.get("user-agent")
-    print(user_agent)
+    user_agent = request.headers.get("user-agent") or ""
     for ban_pattern in user_agent_ban_list:
         if re.search(ban_pattern, user_agent):
             return JSONResponse(
@@ -62,6 +145,31 @@ async def user_agent_ban_middleware(request: Request, call_next: Callable):
     return response
 
 
+@app.middleware("http")
+async def avatar_size_middleware(request: Request, call_next: Callable):
+    """
+    The avatar_size_middleware function rejects avatar uploads whose Content-Length exceeds the size cap
+    before the body is read.
+
+    :param request: Request: Get the request object
+    :param call_next: Callable: Call the next middleware in the chain
+    :return: A response object
+    :doc-Author: BGU
+    """
+    if request.url.path == AVATAR_PATH and upload_too_large(request.headers.get("content-length"),
+                                                            config.AVATAR_MAX_BYTES):
+        return JSONResponse(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            content={"detail": f"Avatar is larger than {config.AVATAR_MAX_BYTES} bytes"},
+        )
+    return await call_next(request)
+
+
+# Метрики додаються останніми, після middleware-декораторів вище, щоб охоплювати весь ланцюжок,
+# зокрема відмови 403 і 413, які повертаються ще до маршрутизації
+app.add_middleware(MetricsMiddleware)
+
+
 @app.get("/")
 def index():
     """
@@ -73,8 +181,20 @@ def index():
     return {"message": "Contacts Application"}
 
 
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """
+    The metrics function returns the application metrics in the Prometheus text format.
+
+    :return: A text response
+    :doc-Author: BGU
+    """
+    payload, media_type = render_metrics()
+    return Response(content=payload, media_type=media_type)
+
+
 @app.get("/healthchecker")
-def healthchecker(db: Session = Depends(get_db)):
+async def healthchecker(db: Session = Depends(get_db)):
     """
     The healthchecker function is used to check if the database is up and running.
 
@@ -84,7 +204,10 @@ def healthchecker(db: Session = Depends(get_db)):
     """
     try:
         # Make request
-        result = db.execute(text("SELECT 1"))
+        if isinstance(db, AsyncSession):
+            result = await db.execute(text("SELECT 1"))
+        else:
+            result = await run_in_threadpool(db.execute, text("SELECT 1"))
         result = result.fetchone()
         if result is None:
             raise HTTPException(
@@ -92,5 +215,5 @@ def healthchecker(db: Session = Depends(get_db)):
             )
         return {"message": "Welcome to FastAPI!"}
     except Exception as e:
-        print(e)
+        logger.error("Database healthcheck failed: %s", e)
         raise HTTPException(status_code=500, detail="Error connecting to the database")
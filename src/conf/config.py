@@ -6,13 +6,59 @@ load_dotenv()
 
 class Settings(BaseSettings):
     DATABASE_URL: str = os.environ.get('DB_URL')
+    DB_ASYNC: bool = (os.environ.get('DB_ASYNC') or 'true').lower() == 'true'
+    DB_POOL_SIZE: int = int(os.environ.get('DB_POOL_SIZE') or 5)
+    DB_MAX_OVERFLOW: int = int(os.environ.get('DB_MAX_OVERFLOW') or 10)
+    DB_POOL_TIMEOUT: float = float(os.environ.get('DB_POOL_TIMEOUT') or 30)
+    DB_POOL_RECYCLE: int = int(os.environ.get('DB_POOL_RECYCLE') or 1800)
+    DB_POOL_PRE_PING: bool = (os.environ.get('DB_POOL_PRE_PING') or 'true').lower() == 'true'
+    DB_POOL_AUTOSIZE: bool = (os.environ.get('DB_POOL_AUTOSIZE') or 'false').lower() == 'true'
+    DB_MAX_CONNECTIONS: int = int(os.environ.get('DB_MAX_CONNECTIONS') or 100)
+    WEB_CONCURRENCY: int = int(os.environ.get('WEB_CONCURRENCY') or 1)
+    THREADPOOL_SIZE: int = int(os.environ.get('THREADPOOL_SIZE') or 40)
+    SQL_SLOW_QUERY_MS: float = float(os.environ.get('SQL_SLOW_QUERY_MS') or 200)
+    SQL_PROFILE_SAMPLE_RATE: float = float(os.environ.get('SQL_PROFILE_SAMPLE_RATE') or 0)
+    # X-SQL-Profile враховується лише разом із правильним X-Internal-Token
+    SQL_PROFILE_HEADER: bool = (os.environ.get('SQL_PROFILE_HEADER') or 'false').lower() == 'true'
+    SQL_PROFILE_TOP: int = int(os.environ.get('SQL_PROFILE_TOP') or 5)
+    SQL_PROFILE_REPEAT_THRESHOLD: int = int(os.environ.get('SQL_PROFILE_REPEAT_THRESHOLD') or 3)
     MAIL_USERNAME: str = os.environ.get('MAIL_USERNAME')
     MAIL_PASSWORD: str = os.environ.get('MAIL_PASSWORD')
     MAIL_FROM: str = os.environ.get('MAIL_FROM')
     MAIL_PORT: int = int(os.environ.get('MAIL_PORT'))
     MAIL_SERVER: str = os.environ.get('MAIL_SERVER')
+    MAIL_POOL_SIZE: int = int(os.environ.get('MAIL_POOL_SIZE') or 2)
+    MAIL_QUEUE_SIZE: int = int(os.environ.get('MAIL_QUEUE_SIZE') or 1000)
+    MAIL_MAX_RETRIES: int = int(os.environ.get('MAIL_MAX_RETRIES') or 3)
     CLD_NAME: str = os.environ.get('CLD_NAME')
     CLD_API_KEY: int = int(os.environ.get('CLD_API_KEY'))
     CLD_API_SECRET: str = os.environ.get('CLD_API_SECRET')
+    AVATAR_STORAGE: str = os.environ.get('AVATAR_STORAGE') or 'cloudinary'
+    AVATAR_MAX_BYTES: int = int(os.environ.get('AVATAR_MAX_BYTES') or 5 * 1024 * 1024)
+    AVATAR_LOCAL_DIR: str = os.environ.get('AVATAR_LOCAL_DIR') or 'static/avatars'
+    AVATAR_LOCAL_URL: str = os.environ.get('AVATAR_LOCAL_URL') or '/static/avatars'
+    IMPORT_BATCH_SIZE: int = int(os.environ.get('IMPORT_BATCH_SIZE') or 1000)
+    HASH_WORKERS: int = int(os.environ.get('HASH_WORKERS') or os.cpu_count() or 1)
+    HASH_QUEUE_SIZE: int = int(os.environ.get('HASH_QUEUE_SIZE') or 64)
+    EXPORT_BATCH_SIZE: int = int(os.environ.get('EXPORT_BATCH_SIZE') or 1000)
+    PRINCIPAL_CACHE_SIZE: int = int(os.environ.get('PRINCIPAL_CACHE_SIZE') or 10000)
+    PRINCIPAL_CACHE_TTL: int = int(os.environ.get('PRINCIPAL_CACHE_TTL') or 60)
+    # Відкликані токени приймаються іншими воркерами до стільки секунд, якщо брокер подій лише локальний
+    TOKEN_VERSION_CACHE_TTL: int = int(os.environ.get('TOKEN_VERSION_CACHE_TTL') or 5)
+    COMPRESSION_MINIMUM_SIZE: int = int(os.environ.get('COMPRESSION_MINIMUM_SIZE') or 500)
+    COMPRESSION_GZIP_LEVEL: int = int(os.environ.get('COMPRESSION_GZIP_LEVEL') or 6)
+    COMPRESSION_BROTLI_QUALITY: int = int(os.environ.get('COMPRESSION_BROTLI_QUALITY') or 4)
+    EVENTS_BUFFER_SIZE: int = int(os.environ.get('EVENTS_BUFFER_SIZE') or 100)
+    EVENTS_HEARTBEAT: float = float(os.environ.get('EVENTS_HEARTBEAT') or 15)
+    RATE_LIMIT_STORAGE_URI: str = os.environ.get('RATE_LIMIT_STORAGE_URI') or 'memory://'
+    RATE_LIMIT_STRATEGY: str = os.environ.get('RATE_LIMIT_STRATEGY') or 'moving-window'
+    RATE_LIMIT_SYNC_INTERVAL: float = float(os.environ.get('RATE_LIMIT_SYNC_INTERVAL') or 0.5)
+    BATCH_MAX_SIZE: int = int(os.environ.get('BATCH_MAX_SIZE') or 100)
+    QUERY_CACHE_USERS: int = int(os.environ.get('QUERY_CACHE_USERS') or 10000)
+    QUERY_CACHE_PER_USER: int = int(os.environ.get('QUERY_CACHE_PER_USER') or 32)
+    QUERY_CACHE_TTL: int = int(os.environ.get('QUERY_CACHE_TTL') or 60)
+    QUERY_CACHE_REDIS_URL: str = os.environ.get('QUERY_CACHE_REDIS_URL')
+    # Без токена службові ендпоінти /internal вимкнені
+    INTERNAL_API_TOKEN: str = os.environ.get('INTERNAL_API_TOKEN')
 
 config = Settings()
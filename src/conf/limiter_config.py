@@ -1,5 +1,12 @@
 from slowapi import Limiter
 from slowapi.util import get_remote_address
 
+from src.conf.config import config
+# Імпорт реєструє схеми sqlite:// та batched+redis:// у limits
+from src.services import rate_limit  # noqa: F401
+
 # Ініціалізація Limiter
-limiter = Limiter(key_func=get_remote_address)
+# memory:// лічить у кожному воркері окремо, sqlite:///шлях ділить ліміти між воркерами одного хоста,
+# batched+redis://хост — між хостами; redis:// лишається точним сховищем limits з round trip на кожен запит
+limiter = Limiter(key_func=get_remote_address, storage_uri=config.RATE_LIMIT_STORAGE_URI,
+                  strategy=config.RATE_LIMIT_STRATEGY)
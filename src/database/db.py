@@ -1,22 +1,73 @@
 import os
+from functools import wraps
+from typing import Callable
+
 from sqlalchemy import create_engine
+from sqlalchemy.engine import URL, make_url
 from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import DeclarativeMeta, declarative_base
 from sqlalchemy.orm import sessionmaker
+from starlette.concurrency import run_in_threadpool
 from dotenv import load_dotenv
 
+from src.conf.config import config
+from src.database.pool import PoolMonitor, pool_options
+from src.database.profiler import SQLProfiler
+
 load_dotenv()
 db_url = os.environ.get('DB_URL')
 
+# Async-драйвери для відповідних sync-драйверів
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def get_async_url(url: str) -> URL:
+    """
+    The get_async_url function converts a sync database URL into the URL of its async driver.
+
+    :param url: str: The sync database URL
+    :return: A URL object with an async driver
+    :doc-Author: BGU
+    """
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend in ASYNC_DRIVERS:
+        return url.set(drivername=ASYNC_DRIVERS[backend])
+    return url
+
+
 # Підключення до бази даних
-engine = create_engine(db_url)
+engine = create_engine(db_url, **pool_options(db_url, config, serves_requests=not config.DB_ASYNC))
 db_Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+pool_monitor = PoolMonitor("sync")
+pool_monitor.attach(engine.pool)
+
+async_engine = create_async_engine(
+    get_async_url(db_url), **pool_options(db_url, config, is_async=True)
+) if config.DB_ASYNC else None
+async_pool_monitor = PoolMonitor("async")
+if async_engine is not None:
+    async_pool_monitor.attach(async_engine.sync_engine.pool)
+
+# Повільні запити логуються завжди, решта профілю збирається лише для вибраних запитів
+sql_profiler = SQLProfiler(slow_query_seconds=config.SQL_SLOW_QUERY_MS / 1000)
+sql_profiler.install(engine)
+if async_engine is not None:
+    sql_profiler.install(async_engine.sync_engine)
+async_db_Session = async_sessionmaker(
+    async_engine, autoflush=False, expire_on_commit=False
+) if config.DB_ASYNC else None
 
 Base: DeclarativeMeta = declarative_base()
 
-def get_db():
+
+def get_sync_db():
     """
-    The get_db function returns a database session
+    The get_sync_db function returns a sync database session
     :return: A session object
     :doc-Author: BGU
     """
@@ -27,6 +78,67 @@ def get_db():
         db.close()
 
 
+async def get_async_db():
+    """
+    The get_async_db function returns an async database session
+    :return: An async session object
+    :doc-Author: BGU
+    """
+    async with async_db_Session() as db:
+        yield db
+
+
+async def get_db():
+    """
+    The get_db function returns a database session.
+    It is an AsyncSession when DB_ASYNC is enabled and a sync Session otherwise.
+    :return: A session object
+    :doc-Author: BGU
+    """
+    if config.DB_ASYNC:
+        async with async_db_Session() as db:
+            yield db
+    else:
+        db = db_Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+
+def with_sync_fallback(sync_fn: Callable):
+    """
+    The with_sync_fallback decorator lets an async repository function also accept a sync Session.
+    In that case the sync version of the function is run in the threadpool,
+    so the event loop is never blocked by the sync driver.
+
+    :param sync_fn: Callable: The sync version of the repository function
+    :return: A decorator
+    :doc-Author: BGU
+    """
+    def decorator(async_fn: Callable):
+        @wraps(async_fn)
+        async def wrapper(db, *args, **kwargs):
+            if isinstance(db, AsyncSession):
+                return await async_fn(db, *args, **kwargs)
+            return await run_in_threadpool(sync_fn, db, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def pool_stats() -> dict:
+    """
+    The pool_stats function returns the state and counters of the connection pools.
+
+    :return: A dictionary of metrics per engine
+    :doc-Author: BGU
+    """
+    stats = {"sync": pool_monitor.stats(engine.pool)}
+    if async_engine is not None:
+        stats["async"] = async_pool_monitor.stats(async_engine.sync_engine.pool)
+    return stats
+
+
 def create_database_tables():
     """
     The create_database_tables function creates all tables in the database
@@ -37,5 +149,3 @@ def create_database_tables():
         Base.metadata.create_all(bind=engine)
     except Exception as e:
         print(f"Error creating database tables: {e}")
-
-
@@ -1,4 +1,7 @@
-from sqlalchemy import Column, String, Integer, Date, ForeignKey, Boolean
+from datetime import date
+from typing import Optional
+
+from sqlalchemy import Column, String, Integer, Date, DateTime, ForeignKey, Boolean, Index, event
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from src.database.db import Base
@@ -11,11 +14,51 @@ class Contact(Base):
     email = Column(String, unique=True, index=True)
     phone_number = Column(String, index=True)
     birthday = Column(Date)
+    birthday_doy = Column(Integer, nullable=True)
     additional_data = Column(String, nullable=True, index=True, default=None)
     user_id = Column(Integer, ForeignKey('users.id'))
+    # Номер останньої зміни контакту в послідовності користувача (ContactSequence)
+    seq = Column(Integer, default=0, server_default="0", nullable=False)
 
     user = relationship("User")
 
+    __table_args__ = (
+        # Індекси для keyset-пагінації за (user_id, id) та (user_id, last_name, id)
+        Index("ix_contacts_user_id_id", "user_id", "id"),
+        Index("ix_contacts_user_id_last_name_id", "user_id", "last_name", "id"),
+        Index("ix_contacts_user_id_birthday_doy", "user_id", "birthday_doy"),
+        Index("ix_contacts_user_id_seq", "user_id", "seq"),
+    )
+
+
+def birthday_day_of_year(birthday: Optional[date]) -> Optional[int]:
+    """
+    The birthday_day_of_year function returns the day of year of a birthday counted in a leap year,
+    so Feb 29 is always 60 and Mar 1 is always 61.
+
+    :param birthday: Optional[date]: The birthday
+    :return: The day of year from 1 to 366
+    :doc-Author: BGU
+    """
+    if birthday is None:
+        return None
+    return date(2000, birthday.month, birthday.day).timetuple().tm_yday
+
+
+@event.listens_for(Contact, "before_insert")
+@event.listens_for(Contact, "before_update")
+def set_birthday_doy(mapper, connection, target: Contact):
+    """
+    The set_birthday_doy function keeps birthday_doy in sync with birthday on every ORM write.
+
+    :param mapper: Mapper: The Contact mapper
+    :param connection: Connection: The connection of the flush
+    :param target: Contact: The contact being written
+    :return: None
+    :doc-Author: BGU
+    """
+    target.birthday_doy = birthday_day_of_year(target.birthday)
+
 class User(Base):
     __tablename__ = "users"
     id = Column(Integer, primary_key=True, index=True)
@@ -23,5 +66,34 @@ class User(Base):
     email = Column(String, unique=True, nullable=False, index=True)
     hashed_password = Column(String, nullable=False)
     avatar = Column(String, nullable=True)
+    avatar_hash = Column(String(64), nullable=True)
+    token_version = Column(Integer, default=0, server_default="0", nullable=False)
     confirmed = Column(Boolean, default=False, nullable=True)
 
+
+class ContactSequence(Base):
+    """
+    The last change number of a user's contacts. Every create, update and delete takes the next number.
+    last_seq and updated_at are the version of the user's contact collection for conditional GET.
+    """
+    __tablename__ = "contact_sequences"
+    user_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    last_seq = Column(Integer, default=0, server_default="0", nullable=False)
+    # timestamptz на PostgreSQL: now() у часовому поясі сесії зберігається як момент часу, а не локальний час
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class ContactTombstone(Base):
+    """
+    A deleted contact, kept so that clients syncing with /contacts/changes learn about the deletion.
+    """
+    __tablename__ = "contact_tombstones"
+    id = Column(Integer, primary_key=True)
+    contact_id = Column(Integer, nullable=False)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    seq = Column(Integer, nullable=False)
+    deleted_at = Column(DateTime, server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        Index("ix_contact_tombstones_user_id_seq", "user_id", "seq"),
+    )
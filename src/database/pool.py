@@ -0,0 +1,189 @@
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+
+class PoolMonitor:
+    """
+    Collects checkout wait times and connection lifecycle counters of one engine's pool.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.checkouts = 0
+        self.checkins = 0
+        self.connects = 0
+        self.closes = 0
+        self.invalidations = 0
+        self.soft_invalidations = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def attach(self, pool):
+        """
+        The attach method listens to the events of a pool. Listeners survive engine.dispose(),
+        because a recreated pool shares the dispatch of the old one.
+
+        :param pool: Pool: The pool of the engine
+        :return: None
+        :doc-Author: BGU
+        """
+        pool.monitor = self
+        event.listen(pool, "checkout", self.on_checkout)
+        event.listen(pool, "checkin", self.on_checkin)
+        event.listen(pool, "connect", self.on_connect)
+        event.listen(pool, "close", self.on_close)
+        event.listen(pool, "invalidate", self.on_invalidate)
+        event.listen(pool, "soft_invalidate", self.on_soft_invalidate)
+
+    def on_checkout(self, *args):
+        self.checkouts += 1
+
+    def on_checkin(self, *args):
+        self.checkins += 1
+
+    def on_connect(self, *args):
+        self.connects += 1
+
+    def on_close(self, *args):
+        self.closes += 1
+
+    def on_invalidate(self, *args):
+        self.invalidations += 1
+
+    def on_soft_invalidate(self, *args):
+        self.soft_invalidations += 1
+
+    def record_wait(self, seconds: float, timed_out: bool = False):
+        """
+        The record_wait method records how long one checkout waited for a connection.
+
+        :param seconds: float: The wait time
+        :param timed_out: bool: The checkout failed with a pool timeout
+        :return: None
+        :doc-Author: BGU
+        """
+        self.wait_seconds_total += seconds
+        self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+        if timed_out:
+            self.timeouts += 1
+
+    def stats(self, pool) -> dict:
+        """
+        The stats method returns the current state of the pool and the collected counters.
+
+        :param pool: Pool: The current pool of the engine
+        :return: A dictionary of metrics
+        :doc-Author: BGU
+        """
+        waits = self.checkouts + self.timeouts
+        stats = {"pool": type(pool).__name__}
+        if isinstance(pool, QueuePool):
+            stats.update({
+                "size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "checked_in": pool.checkedin(),
+                "overflow": max(pool.overflow(), 0),
+                "max_overflow": pool._max_overflow,
+                "timeout": pool.timeout(),
+            })
+        stats.update({
+            "checkouts": self.checkouts,
+            "checkins": self.checkins,
+            "connects": self.connects,
+            "closes": self.closes,
+            "invalidations": self.invalidations,
+            "soft_invalidations": self.soft_invalidations,
+            "timeouts": self.timeouts,
+            "wait_seconds_total": round(self.wait_seconds_total, 6),
+            "wait_seconds_max": round(self.wait_seconds_max, 6),
+            "wait_seconds_avg": round(self.wait_seconds_total / waits, 6) if waits else 0.0,
+        })
+        return stats
+
+
+class MonitoredPoolMixin:
+    """
+    Times every checkout of the pool, including the wait for a free connection, the connect and the pre-ping.
+    """
+
+    monitor = None
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except PoolTimeoutError:
+            if self.monitor is not None:
+                self.monitor.record_wait(time.perf_counter() - started, timed_out=True)
+            raise
+        if self.monitor is not None:
+            self.monitor.record_wait(time.perf_counter() - started)
+        return connection
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.monitor = self.monitor
+        return pool
+
+
+class MonitoredQueuePool(MonitoredPoolMixin, QueuePool):
+    pass
+
+
+class MonitoredAsyncQueuePool(MonitoredPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def autosize_pool(workers: int, threads: int, max_connections: int) -> tuple:
+    """
+    The autosize_pool function splits the connection budget of the database between the workers of the application.
+    Each worker keeps one connection per thread that may use it and can overflow up to its share of the budget.
+
+    :param workers: int: The number of worker processes
+    :param threads: int: The number of threads per worker
+    :param max_connections: int: The number of connections the database allows the application
+    :return: A tuple of pool_size and max_overflow
+    :doc-Author: BGU
+    """
+    budget = max(max_connections // max(workers, 1), 1)
+    pool_size = max(min(threads, budget), 1)
+    return pool_size, budget - pool_size
+
+
+def pool_options(url: str, settings, is_async: bool = False, serves_requests: bool = True) -> dict:
+    """
+    The pool_options function builds the create_engine pool arguments from the settings.
+    In-memory SQLite keeps the default single-connection pool of SQLAlchemy.
+    With DB_POOL_AUTOSIZE the engine that serves requests gets the whole budget of the worker,
+    the other engine keeps one connection for maintenance tasks.
+
+    :param url: str: The database URL
+    :param settings: Settings: The application settings
+    :param is_async: bool: The options are for the async engine
+    :param serves_requests: bool: The engine is the one used by get_db
+    :return: A dictionary of create_engine keyword arguments
+    :doc-Author: BGU
+    """
+    url = make_url(url)
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        return {}
+    if settings.DB_POOL_AUTOSIZE and not serves_requests:
+        pool_size, max_overflow = 1, 0
+    elif settings.DB_POOL_AUTOSIZE:
+        pool_size, max_overflow = autosize_pool(settings.WEB_CONCURRENCY, settings.THREADPOOL_SIZE,
+                                                settings.DB_MAX_CONNECTIONS)
+    else:
+        pool_size, max_overflow = settings.DB_POOL_SIZE, settings.DB_MAX_OVERFLOW
+    return {
+        "poolclass": MonitoredAsyncQueuePool if is_async else MonitoredQueuePool,
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
@@ -0,0 +1,189 @@
+import logging
+import random
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Callable, Optional
+
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "x-sql-profile"
+INTERNAL_TOKEN_HEADER = "x-internal-token"
+
+# Обрізаємо параметри в лозі, щоб не писати великі значення повністю
+MAX_LOGGED_PARAMETERS_LENGTH = 500
+
+
+class QueryProfile:
+    """
+    Statements executed while serving one request.
+    """
+
+    def __init__(self, top: int = 5, repeat_threshold: int = 3):
+        self.top = top
+        self.repeat_threshold = repeat_threshold
+        self.count = 0
+        self.seconds = 0.0
+        self.slowest = []
+        self.statements = Counter()
+
+    def record(self, statement: str, parameters, seconds: float):
+        """
+        The record method adds one executed statement to the profile.
+
+        :param statement: str: The SQL statement
+        :param parameters: The bound parameters
+        :param seconds: float: The execution time
+        :return: None
+        :doc-Author: BGU
+        """
+        self.count += 1
+        self.seconds += seconds
+        self.statements[statement] += 1
+        if len(self.slowest) < self.top or seconds > self.slowest[-1][0]:
+            self.slowest.append((seconds, statement, parameters))
+            self.slowest.sort(key=lambda item: item[0], reverse=True)
+            del self.slowest[self.top:]
+
+    def repeated(self) -> list:
+        """
+        The repeated method returns the statements executed at least repeat_threshold times, likely an N+1 pattern.
+
+        :return: A list of (statement, count)
+        :doc-Author: BGU
+        """
+        return [(statement, count) for statement, count in self.statements.most_common()
+                if count >= self.repeat_threshold]
+
+    def summary(self) -> dict:
+        """
+        The summary method returns the statement count, total time, slowest statements and N+1 candidates.
+
+        :return: A dictionary
+        :doc-Author: BGU
+        """
+        return {
+            "queries": self.count,
+            "seconds": round(self.seconds, 6),
+            "slowest": [{"seconds": round(seconds, 6), "statement": statement}
+                        for seconds, statement, _ in self.slowest],
+            "repeated": [{"count": count, "statement": statement} for statement, count in self.repeated()],
+        }
+
+
+current_profile: ContextVar[Optional[QueryProfile]] = ContextVar("current_profile", default=None)
+
+
+class SQLProfiler:
+    """
+    Times every statement of an engine, logs the slow ones with their parameters
+    and records the statements of profiled requests.
+    """
+
+    def __init__(self, slow_query_seconds: float):
+        self.slow_query_seconds = slow_query_seconds
+
+    def install(self, engine):
+        """
+        The install method listens to the cursor events of an engine. For an AsyncEngine pass its sync_engine.
+
+        :param engine: Engine: The engine to profile
+        :return: None
+        :doc-Author: BGU
+        """
+        event.listen(engine, "before_cursor_execute", self.before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", self.after_cursor_execute)
+
+    def before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        context.profiler_started = time.perf_counter()
+
+    def after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        seconds = time.perf_counter() - context.profiler_started
+        profile = current_profile.get()
+        if profile is not None:
+            profile.record(statement, parameters, seconds)
+        if self.slow_query_seconds and seconds >= self.slow_query_seconds:
+            logger.warning("Slow query %.1f ms: %s; parameters: %.*s", seconds * 1000, statement,
+                           MAX_LOGGED_PARAMETERS_LENGTH, repr(parameters))
+
+
+class SQLProfilerMiddleware:
+    """
+    Pure ASGI middleware that profiles a request when it sends the X-SQL-Profile header or is sampled.
+    The summary is logged and returned in the X-SQL-Queries, X-SQL-Time-Ms and Server-Timing headers.
+    The headers are added only when allow_header is set and authorize accepts the X-Internal-Token of the request,
+    sampled requests are only logged, so anonymous clients cannot read the query timings.
+    """
+
+    def __init__(self, app, sample_rate: float = 0.0, allow_header: bool = False, top: int = 5,
+                 repeat_threshold: int = 3, authorize: Optional[Callable[[Optional[str]], bool]] = None):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.allow_header = allow_header
+        self.top = top
+        self.repeat_threshold = repeat_threshold
+        self.authorize = authorize
+
+    def requested(self, scope) -> bool:
+        """
+        The requested method tells whether an internal caller asked for the profile in the response headers.
+
+        :param scope: dict: The ASGI scope of the request
+        :return: True if the request sent X-SQL-Profile and authorize accepts its X-Internal-Token
+        :doc-Author: BGU
+        """
+        if not self.allow_header:
+            return False
+        headers = dict(scope["headers"])
+        if headers.get(PROFILE_HEADER.encode(), b"") in (b"", b"0"):
+            return False
+        return self.authorize is None or self.authorize(headers.get(INTERNAL_TOKEN_HEADER.encode(), b"").decode())
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        requested = self.requested(scope)
+        # Вибіркові запити лише логуються, заголовки з таймінгами отримує тільки службовий виклик
+        if not requested and not (self.sample_rate > 0 and random.random() < self.sample_rate):
+            await self.app(scope, receive, send)
+            return
+        profile = QueryProfile(self.top, self.repeat_threshold)
+        token = current_profile.set(profile)
+
+        async def send_with_profile(message):
+            if requested and message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers += [
+                    (b"x-sql-queries", str(profile.count).encode()),
+                    (b"x-sql-time-ms", f"{profile.seconds * 1000:.3f}".encode()),
+                    (b"server-timing", f'db;dur={profile.seconds * 1000:.3f};desc="{profile.count} queries"'.encode()),
+                ]
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_profile)
+        finally:
+            current_profile.reset(token)
+            log_profile(scope, profile)
+
+
+def log_profile(scope, profile: QueryProfile):
+    """
+    The log_profile function logs the summary of a profiled request and warns about likely N+1 statements.
+
+    :param scope: dict: The ASGI scope of the request
+    :param profile: QueryProfile: The collected profile
+    :return: None
+    :doc-Author: BGU
+    """
+    summary = profile.summary()
+    logger.info("SQL profile %s %s: %s queries in %.1f ms; slowest: %s", scope["method"], scope["path"],
+                summary["queries"], summary["seconds"] * 1000,
+                "; ".join(f"{item['seconds'] * 1000:.1f} ms {item['statement']}" for item in summary["slowest"]))
+    for item in summary["repeated"]:
+        logger.warning("Possible N+1 in %s %s: %s identical statements: %s", scope["method"], scope["path"],
+                       item["count"], item["statement"])
@@ -0,0 +1,80 @@
+from sqlalchemy import DDL, event, func, or_, select, table, column, literal_column
+
+from src.database.models import Contact
+
+# Поля, за якими працює повнотекстовий пошук
+SEARCH_FIELDS = ("first_name", "last_name", "email")
+
+# Триграмні індекси не працюють для коротших запитів
+MIN_INDEXED_QUERY_LENGTH = 3
+
+contacts_fts = table("contacts_fts", column("rowid"), column("rank"))
+
+SQLITE_FTS_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS contacts_fts USING fts5("
+    "first_name, last_name, email, content='contacts', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS contacts_fts_ai AFTER INSERT ON contacts BEGIN "
+    "INSERT INTO contacts_fts(rowid, first_name, last_name, email) "
+    "VALUES (new.id, new.first_name, new.last_name, new.email); END",
+    "CREATE TRIGGER IF NOT EXISTS contacts_fts_ad AFTER DELETE ON contacts BEGIN "
+    "INSERT INTO contacts_fts(contacts_fts, rowid, first_name, last_name, email) "
+    "VALUES ('delete', old.id, old.first_name, old.last_name, old.email); END",
+    "CREATE TRIGGER IF NOT EXISTS contacts_fts_au AFTER UPDATE ON contacts BEGIN "
+    "INSERT INTO contacts_fts(contacts_fts, rowid, first_name, last_name, email) "
+    "VALUES ('delete', old.id, old.first_name, old.last_name, old.email); "
+    "INSERT INTO contacts_fts(rowid, first_name, last_name, email) "
+    "VALUES (new.id, new.first_name, new.last_name, new.email); END",
+]
+
+POSTGRESQL_TRGM_DDL = ["CREATE EXTENSION IF NOT EXISTS pg_trgm"] + [
+    f"CREATE INDEX IF NOT EXISTS ix_contacts_{field}_trgm ON contacts USING gin ({field} gin_trgm_ops)"
+    for field in SEARCH_FIELDS
+]
+
+for statement in SQLITE_FTS_DDL:
+    event.listen(Contact.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+event.listen(Contact.__table__, "before_drop",
+             DDL("DROP TABLE IF EXISTS contacts_fts").execute_if(dialect="sqlite"))
+for statement in POSTGRESQL_TRGM_DDL:
+    event.listen(Contact.__table__, "after_create", DDL(statement).execute_if(dialect="postgresql"))
+
+
+def fts_phrase(q: str) -> str:
+    """
+    The fts_phrase function quotes a search term as a single FTS5 phrase,
+    so operators typed by the user are matched literally.
+
+    :param q: str: The search term
+    :return: An FTS5 query string
+    :doc-Author: BGU
+    """
+    return '"' + q.replace('"', '""') + '"'
+
+
+def apply_text_search(query, dialect: str, q: str, ranked: bool = True):
+    """
+    The apply_text_search function filters a contacts query by a term found in any name or email field.
+    SQLite uses the contacts_fts trigram table, PostgreSQL uses the pg_trgm GIN indexes,
+    other backends and terms shorter than 3 characters fall back to ILIKE.
+
+    :param query: A Query or Select over Contact
+    :param dialect: str: The database dialect name
+    :param q: str: The search term
+    :param ranked: bool: Order the results by relevance
+    :return: The filtered query
+    :doc-Author: BGU
+    """
+    if dialect == "sqlite" and len(q) >= MIN_INDEXED_QUERY_LENGTH:
+        match = literal_column("contacts_fts").op("MATCH")(fts_phrase(q))
+        if ranked:
+            hits = select(contacts_fts.c.rowid.label("id"), contacts_fts.c.rank.label("rank")).where(match).subquery()
+            return query.join(hits, hits.c.id == Contact.id).order_by(hits.c.rank, Contact.id)
+        return query.where(Contact.id.in_(select(contacts_fts.c.rowid).where(match)))
+
+    query = query.where(or_(*[getattr(Contact, field).ilike(f"%{q}%") for field in SEARCH_FIELDS]))
+    if not ranked:
+        return query
+    if dialect == "postgresql":
+        score = func.greatest(*[func.similarity(getattr(Contact, field), q) for field in SEARCH_FIELDS])
+        return query.order_by(score.desc(), Contact.id)
+    return query.order_by(Contact.id)
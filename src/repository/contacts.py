@@ -1,31 +1,99 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import extract, or_, and_
+from sqlalchemy import delete, func, insert, or_, select, tuple_, update
+from sqlalchemy.dialects import postgresql, sqlite
 from typing import Optional
-from datetime import datetime, timedelta
-from src.database.models import Contact
+import calendar
+import heapq
+from itertools import islice
+from datetime import date, datetime, timedelta
+from src.database.models import Contact, ContactSequence, ContactTombstone, birthday_day_of_year
+from src.database.search import apply_text_search
+from src.services.cache import contact_queries
+from src.services.events import event_hub
+
+# Поля контакту, які повертає API (ContactResponse)
+CONTACT_COLUMNS = (Contact.id, Contact.first_name, Contact.last_name, Contact.email, Contact.phone_number,
+                   Contact.birthday, Contact.additional_data, Contact.user_id)
+
+# Імена полів, які можна запросити через ?fields=
+CONTACT_FIELDS = tuple(column.key for column in CONTACT_COLUMNS)
+
+# Ключі сортування для keyset-пагінації; id завжди останній, щоб порядок був однозначним
+CONTACT_SORT_KEYS = {
+    "id": (Contact.id,),
+    "last_name": (Contact.last_name, Contact.id),
+}
+
+# Діалекти, що підтримують INSERT ... ON CONFLICT DO NOTHING
+UPSERT_INSERTS = {
+    "sqlite": sqlite.insert,
+    "postgresql": postgresql.insert,
+}
 
 
 def create_contact(db: Session, contact_data: dict, user_id: int):
     """
     The create_contact function creates a new contact in the database.
+    On SQLite and PostgreSQL the write is one INSERT ... ON CONFLICT (email) DO NOTHING RETURNING statement,
+    other backends check the email with a SELECT first. The change number is reserved before the write
+    and rolled back when the email already exists.
 
     :param db: Session: Pass the database session to the function
     :param contact_data: dict: Pass the contact data to the function
     :param user_id: int: Identify the user who created the contact
-    :return: A contact object
+    :return: A contact row, or None if the email already exists
     :doc-Author: BGU
     """
     contact_data["user_id"] = user_id
+    if supports_upsert(db):
+        # Номер зміни записується тим самим INSERT ... RETURNING; якщо email зайнятий, відкат повертає номер
+        contact_data["seq"] = next_change_seq(db, user_id)
+        new_contact = db.execute(insert_contact_statement(db, contact_data)).first()
+        if new_contact is None:
+            db.rollback()
+            return None
+        db.commit()
+        publish_change(user_id, contact_data["seq"], new_contact.id, new_contact)
+        return new_contact
     existing_contact = db.query(Contact).filter(Contact.email == contact_data["email"]).first()
     if existing_contact:
         return None  # або кинути виняток, або повернути існуючий контакт
+    contact_data["seq"] = next_change_seq(db, user_id)
     new_contact = Contact(**contact_data)
     db.add(new_contact)
     db.commit()
     db.refresh(new_contact)
+    publish_change(user_id, new_contact.seq, new_contact.id, new_contact)
     return new_contact
 
 
+def bulk_create_contacts(db: Session, contacts_data: list[dict], user_id: int) -> set:
+    """
+    The bulk_create_contacts function inserts a batch of contacts with one duplicate check and one executemany INSERT.
+    Contacts whose email already exists are skipped, including those created concurrently between the check
+    and the INSERT: ON CONFLICT (email) DO NOTHING skips them and they leave gaps in the change numbers.
+
+    :param db: Session: Pass the database session to the function
+    :param contacts_data: list[dict]: The contacts to insert, with unique emails
+    :param user_id: int: Identify the user who created the contacts
+    :return: The set of emails that already existed
+    :doc-Author: BGU
+    """
+    emails = [contact_data["email"] for contact_data in contacts_data]
+    existing = {email for email, in db.query(Contact.email).filter(Contact.email.in_(emails)).all()}
+    rows = bulk_rows(contacts_data, user_id, existing)
+    if rows:
+        number_changes(rows, next_change_seq(db, user_id, len(rows)))
+        statement = bulk_insert_statement(db)
+        if statement is None:
+            db.execute(insert(Contact), rows)
+        else:
+            existing |= set(emails) - existing - set(db.scalars(statement, rows).all())
+        db.commit()
+        publish_resync(user_id, rows[-1]["seq"])
+    return existing
+
+
 def get_contacts(db: Session, user_id: int, skip: int = 0, limit: int = 10):
     """
     The get_contacts function returns a list of contacts for a given user.
@@ -42,6 +110,50 @@ def get_contacts(db: Session, user_id: int, skip: int = 0, limit: int = 10):
         return None
     return db_contacts
 
+
+def get_contacts_page(db: Session, user_id: int, after: Optional[list] = None, limit: int = 10, sort: str = "id"):
+    """
+    The get_contacts_page function returns one keyset page of contacts for a given user.
+
+    :param db: Session: Pass the database session to the function
+    :param user_id: int: Specify the user ID of the contact
+    :param after: Optional[list]: The sort key values of the last contact of the previous page
+    :param limit: int: Limit the number of contacts returned
+    :param sort: str: The sort key, one of CONTACT_SORT_KEYS
+    :return: A list of contacts and the sort key values to continue after (None on the last page)
+    :doc-Author: BGU
+    """
+    db_contacts = (db.query(Contact).filter(Contact.user_id == user_id, *keyset_criteria(sort, after))
+                   .order_by(*CONTACT_SORT_KEYS[sort]).limit(limit + 1).all())
+    return split_page(db_contacts, limit, sort)
+
+
+def stream_contacts(db: Session, user_id: int, batch_size: int = 1000):
+    """
+    The stream_contacts function yields all contacts of a user in batches of rows, read through a server-side cursor.
+
+    :param db: Session: Pass the database session to the function
+    :param user_id: int: Specify the user ID of the contact
+    :param batch_size: int: The number of rows fetched at once
+    :return: A generator of lists of row mappings
+    :doc-Author: BGU
+    """
+    result = db.execute(export_statement(user_id).execution_options(yield_per=batch_size))
+    for partition in result.mappings().partitions():
+        yield partition
+
+
+def export_statement(user_id: int):
+    """
+    The export_statement function selects the API columns of all contacts of a user, without ORM objects.
+
+    :param user_id: int: Specify the user ID of the contact
+    :return: A Select statement
+    :doc-Author: BGU
+    """
+    return select(*CONTACT_COLUMNS).where(Contact.user_id == user_id).order_by(Contact.id)
+
+
 def get_contact(db: Session, user_id: int, contact_id: int):
     """
     The get_contact function returns the contact with the given contact_id.
@@ -58,44 +170,156 @@ def get_contact(db: Session, user_id: int, contact_id: int):
     return db_contact
 
 
+def get_contact_row(db: Session, user_id: int, contact_id: int, columns: tuple = CONTACT_COLUMNS):
+    """
+    The get_contact_row function returns the selected columns of one contact as a Core row.
+
+    :param db: Session: Pass the database session to the function
+    :param user_id: int: Specify the user ID of the contact
+    :param contact_id: int: Specify the ID of the contact to retrieve
+    :param columns: tuple: The columns to select
+    :return: A row, or None if the contact does not exist
+    :doc-Author: BGU
+    """
+    return db.execute(select(*columns).where(Contact.id == contact_id, Contact.user_id == user_id)).first()
+
+
 def update_contact(db: Session, user_id: int, contact_id: int, updated_data: dict):
     """
     The update_contact function updates a contact in the database.
+    Backends with RETURNING do it in one UPDATE ... RETURNING statement that also writes the change number;
+    the number is rolled back when no contact matched.
 
     :param db: Session: Pass the database session to the function
     :param user_id: int: Specify the user ID of the contact
     :param contact_id: int: Specify the ID of the contact to update
     :param updated_data: dict: Pass the updated data to the function
-    :return: A contact object
+    :return: A contact row or object, or None if it does not exist
     :doc-Author: BGU
     """
+    if supports_returning(db, "update") and updated_data:
+        seq = next_change_seq(db, user_id)
+        statement = update_contact_statement(user_id, contact_id, {**updated_data, "seq": seq})
+        db_contact = db.execute(statement).first()
+        if db_contact is None:
+            # Контакту немає: відкат повертає зарезервований номер зміни
+            db.rollback()
+            return None
+        db.commit()
+        publish_change(user_id, seq, contact_id, db_contact)
+        return db_contact
     db_contact = db.query(Contact).filter(Contact.id == contact_id, Contact.user_id == user_id).first()
     if db_contact is None:
         return None
     for key, value in updated_data.items():
         setattr(db_contact, key, value)
+    if updated_data:
+        db_contact.seq = next_change_seq(db, user_id)
     db.commit()
     db.refresh(db_contact)
+    if updated_data:
+        publish_change(user_id, db_contact.seq, contact_id, db_contact)
     return db_contact
 
 def delete_contact(db: Session, user_id: int, contact_id: int):
     """
     The delete_contact function deletes a contact from the database.
+    Backends with RETURNING do it in one DELETE ... RETURNING statement.
 
     :param db: Session: Pass the database session to the function
     :param user_id: int: Specify the user ID of the contact
     :param contact_id: int: Specify the ID of the contact to delete
-    :return: A contact object
+    :return: A contact row or object, or None if it does not exist
     :doc-Author: BGU
     """
+    if supports_returning(db, "delete"):
+        seq = next_change_seq(db, user_id)
+        db_contact = db.execute(delete_contact_statement(user_id, contact_id)).first()
+        if db_contact is None:
+            db.rollback()
+            return None
+        db.execute(tombstone_statement(user_id, contact_id, seq))
+        db.commit()
+        publish_change(user_id, seq, contact_id)
+        return db_contact
     db_contact = db.query(Contact).filter(Contact.id == contact_id, Contact.user_id == user_id).first()
     if not db_contact:
         return None
     db.delete(db_contact)
+    seq = next_change_seq(db, user_id)
+    db.execute(tombstone_statement(user_id, contact_id, seq))
     db.commit()
+    publish_change(user_id, seq, contact_id)
     return db_contact
 
-def search_contacts(db: Session, user_id: int, first_name: Optional[str] = None, last_name: Optional[str] = None, email: Optional[str] = None):
+
+def get_contacts_by_ids(db: Session, user_id: int, ids: list[int], columns: tuple = CONTACT_COLUMNS) -> dict:
+    """
+    The get_contacts_by_ids function returns the contacts of a user with the given ids in one query.
+
+    :param db: Session: Pass the database session to the function
+    :param user_id: int: Specify the user ID of the contacts
+    :param ids: list[int]: The IDs of the contacts
+    :param columns: tuple: The columns to select, they must include Contact.id
+    :return: A dictionary of rows by id, missing ids are absent
+    :doc-Author: BGU
+    """
+    return {row.id: row for row in db.execute(contacts_by_ids_statement(user_id, ids, columns))}
+
+
+def update_contacts(db: Session, user_id: int, updates: list[dict]) -> tuple:
+    """
+    The update_contacts function applies partial updates to contacts of a user in one transaction.
+    Updates that set the same fields go to the database as one executemany UPDATE.
+    An update whose email belongs to another contact is skipped instead of failing the batch.
+
+    :param db: Session: Pass the database session to the function
+    :param user_id: int: Specify the user ID of the contacts
+    :param updates: list[dict]: The new values of each contact with its "id", ids are unique
+    :return: The rows of the found contacts by id and the set of ids skipped for a taken email
+    :doc-Author: BGU
+    """
+    db.execute(lock_change_seq_statement(user_id))
+    found = set(db.scalars(locked_ids_statement(user_id, [item["id"] for item in updates])))
+    updates = [item for item in updates if item["id"] in found]
+    emails = [item["email"] for item in updates if "email" in item]
+    conflicts = email_conflicts(updates, dict(db.execute(emails_statement(emails)).all()) if emails else {})
+    changed = [item for item in updates if item["id"] not in conflicts and len(item) > 1]
+    if changed:
+        changed = batch_update_rows(changed, next_change_seq(db, user_id, len(changed)))
+        db.execute(batch_update_statement(user_id), changed)
+    rows = get_contacts_by_ids(db, user_id, list(found - conflicts))
+    db.commit()
+    for item in changed:
+        publish_change(user_id, item["seq"], item["id"], rows[item["id"]])
+    return rows, conflicts
+
+
+def delete_contacts(db: Session, user_id: int, ids: list[int]) -> set:
+    """
+    The delete_contacts function deletes contacts of a user and writes their tombstones in one transaction.
+
+    :param db: Session: Pass the database session to the function
+    :param user_id: int: Specify the user ID of the contacts
+    :param ids: list[int]: The IDs of the contacts to delete
+    :return: The set of deleted ids
+    :doc-Author: BGU
+    """
+    db.execute(lock_change_seq_statement(user_id))
+    deleted = list(db.scalars(locked_ids_statement(user_id, ids)))
+    tombstones = []
+    if deleted:
+        db.execute(delete_contacts_statement(user_id, deleted))
+        tombstones = batch_tombstone_rows(user_id, deleted, next_change_seq(db, user_id, len(deleted)))
+        db.execute(insert(ContactTombstone), tombstones)
+    db.commit()
+    for tombstone in tombstones:
+        publish_change(user_id, tombstone["seq"], tombstone["contact_id"])
+    return set(deleted)
+
+
+def search_contacts(db: Session, user_id: int, first_name: Optional[str] = None, last_name: Optional[str] = None,
+                    email: Optional[str] = None, q: Optional[str] = None):
     """
     The search_contacts function searches for contacts in the database.
 
@@ -104,47 +328,710 @@ def search_contacts(db: Session, user_id: int, first_name: Optional[str] = None,
     :param first_name: Optional[str]: Filter contacts by first name
     :param last_name: Optional[str]: Filter contacts by last name
     :param email: Optional[str]: Filter contacts by email
+    :param q: Optional[str]: Search all name and email fields, ordered by relevance
     :return: A list of contacts
     :doc-Author: BGU
     """
-    query = db.query(Contact).filter(Contact.user_id == user_id)
-    if first_name:
-        query = query.filter(Contact.first_name.ilike(f"%{first_name}%"))
-    if last_name:
-        query = query.filter(Contact.last_name.ilike(f"%{last_name}%"))
-    if email:
-        query = query.filter(Contact.email.ilike(f"%{email}%"))
+    query = db.query(Contact).filter(Contact.user_id == user_id, *search_criteria(first_name, last_name, email))
+    if q:
+        query = apply_text_search(query, db.get_bind().dialect.name, q)
     return query.all()
 
 
-def get_upcoming_birthdays(db: Session, user_id: int):
+def search_contacts_page(db: Session, user_id: int, first_name: Optional[str] = None,
+                         last_name: Optional[str] = None, email: Optional[str] = None, q: Optional[str] = None,
+                         after: Optional[list] = None, limit: int = 10, sort: str = "id"):
     """
-    The get_upcoming_birthdays function returns a list of 7 days of upcoming birthdays for the specified user.
+    The search_contacts_page function returns one keyset page of contacts matching the search.
 
     :param db: Session: Pass the database session to the function
     :param user_id: int: Specify the user ID of the contact
-    :return: A list of contacts
+    :param first_name: Optional[str]: Filter contacts by first name
+    :param last_name: Optional[str]: Filter contacts by last name
+    :param email: Optional[str]: Filter contacts by email
+    :param q: Optional[str]: Search all name and email fields
+    :param after: Optional[list]: The sort key values of the last contact of the previous page
+    :param limit: int: Limit the number of contacts returned
+    :param sort: str: The sort key, one of CONTACT_SORT_KEYS
+    :return: A list of contacts and the sort key values to continue after (None on the last page)
+    :doc-Author: BGU
+    """
+    query = db.query(Contact).filter(Contact.user_id == user_id, *search_criteria(first_name, last_name, email),
+                                     *keyset_criteria(sort, after))
+    if q:
+        query = apply_text_search(query, db.get_bind().dialect.name, q, ranked=False)
+    db_contacts = query.order_by(*CONTACT_SORT_KEYS[sort]).limit(limit + 1).all()
+    return split_page(db_contacts, limit, sort)
+
+
+def get_upcoming_birthdays(db: Session, user_id: int, days: int = 7):
+    """
+    The get_upcoming_birthdays function returns a list of upcoming birthdays in the next days for the specified user.
+
+    :param db: Session: Pass the database session to the function
+    :param user_id: int: Specify the user ID of the contact
+    :param days: int: The length of the window in days, up to 365
+    :return: A list of contacts ordered by the upcoming birthday
     :doc-Author: BGU
     """
     today = datetime.now().date()
-    upcoming = today + timedelta(days=7)
-    query = db.query(Contact).filter(Contact.user_id == user_id)
-
-    if today.month == 12 and upcoming.month == 1:
-        # Діапазон перетинає кінець року
-        query = query.filter(or_(
-            and_(extract('month', Contact.birthday) == 12, extract('day', Contact.birthday) >= today.day),
-            and_(extract('month', Contact.birthday) == 1, extract('day', Contact.birthday) <= upcoming.day)
-        ))
-    elif today.month == upcoming.month:
-        # Діапазон у межах одного місяця
-        query = query.filter(extract('month', Contact.birthday) == today.month,
-                             extract('day', Contact.birthday).between(today.day, upcoming.day))
-    else:
-        # Діапазон перетинає місяць, але не рік
-        query = query.filter(or_(
-            and_(extract('month', Contact.birthday) == today.month, extract('day', Contact.birthday) >= today.day),
-            and_(extract('month', Contact.birthday) == upcoming.month, extract('day', Contact.birthday) <= upcoming.day)
-        ))
-
-    return query.all()
\ No newline at end of file
+    query = (db.query(Contact)
+             .filter(Contact.user_id == user_id, upcoming_birthdays_criteria(today, days))
+             .order_by(*upcoming_birthdays_order(today)))
+    return query.all()
+
+
+def get_contacts_rows(db: Session, user_id: int, skip: int = 0, limit: int = 10, columns: tuple = CONTACT_COLUMNS):
+    """
+    The get_contacts_rows function returns the API columns of a user's contacts as Core rows, without ORM objects.
+
+    :param db: Session: Pass the database session to the function
+    :param user_id: int: Specify the user ID of the contact
+    :param skip: int: Skip a certain number of contacts
+    :param limit: int: Limit the number of contacts returned
+    :param columns: tuple: The columns to select, see projection
+    :return: A list of rows, or None if there are none
+    :doc-Author: BGU
+    """
+    rows = db.execute(select(*columns).where(Contact.user_id == user_id).offset(skip).limit(limit)).all()
+    if not rows:
+        return None
+    return rows
+
+
+def get_contacts_page_rows(db: Session, user_id: int, after: Optional[list] = None, limit: int = 10,
+                           sort: str = "id", columns: tuple = CONTACT_COLUMNS):
+    """
+    The get_contacts_page_rows function returns one keyset page of contacts as Core rows.
+
+    :param db: Session: Pass the database session to the function
+    :param user_id: int: Specify the user ID of the contact
+    :param after: Optional[list]: The sort key values of the last contact of the previous page
+    :param limit: int: Limit the number of contacts returned
+    :param sort: str: The sort key, one of CONTACT_SORT_KEYS
+    :param columns: tuple: The columns to select, they must include the sort key
+    :return: A list of rows and the sort key values to continue after (None on the last page)
+    :doc-Author: BGU
+    """
+    rows = db.execute(select(*columns).where(Contact.user_id == user_id, *keyset_criteria(sort, after))
+                      .order_by(*CONTACT_SORT_KEYS[sort]).limit(limit + 1)).all()
+    return split_page(rows, limit, sort)
+
+
+def search_contacts_rows(db: Session, user_id: int, first_name: Optional[str] = None,
+                         last_name: Optional[str] = None, email: Optional[str] = None, q: Optional[str] = None,
+                         columns: tuple = CONTACT_COLUMNS):
+    """
+    The search_contacts_rows function searches for contacts and returns all their columns as Core rows.
+
+    :param db: Session: Pass the database session to the function
+    :param user_id: int: Specify the user ID of the contact
+    :param first_name: Optional[str]: Filter contacts by first name
+    :param last_name: Optional[str]: Filter contacts by last name
+    :param email: Optional[str]: Filter contacts by email
+    :param q: Optional[str]: Search all name and email fields, ordered by relevance
+    :param columns: tuple: The columns to select
+    :return: A list of rows
+    :doc-Author: BGU
+    """
+    stmt = select(*columns).where(Contact.user_id == user_id,
+                                                *search_criteria(first_name, last_name, email))
+    if q:
+        stmt = apply_text_search(stmt, db.get_bind().dialect.name, q)
+    return db.execute(stmt).all()
+
+
+def search_contacts_page_rows(db: Session, user_id: int, first_name: Optional[str] = None,
+                              last_name: Optional[str] = None, email: Optional[str] = None, q: Optional[str] = None,
+                              after: Optional[list] = None, limit: int = 10, sort: str = "id",
+                              columns: tuple = CONTACT_COLUMNS):
+    """
+    The search_contacts_page_rows function returns one keyset page of the search as Core rows.
+
+    :param db: Session: Pass the database session to the function
+    :param user_id: int: Specify the user ID of the contact
+    :param first_name: Optional[str]: Filter contacts by first name
+    :param last_name: Optional[str]: Filter contacts by last name
+    :param email: Optional[str]: Filter contacts by email
+    :param q: Optional[str]: Search all name and email fields
+    :param after: Optional[list]: The sort key values of the last contact of the previous page
+    :param limit: int: Limit the number of contacts returned
+    :param sort: str: The sort key, one of CONTACT_SORT_KEYS
+    :param columns: tuple: The columns to select, they must include the sort key
+    :return: A list of rows and the sort key values to continue after (None on the last page)
+    :doc-Author: BGU
+    """
+    stmt = select(*columns).where(Contact.user_id == user_id, *search_criteria(first_name, last_name, email),
+                                          *keyset_criteria(sort, after))
+    if q:
+        stmt = apply_text_search(stmt, db.get_bind().dialect.name, q, ranked=False)
+    rows = db.execute(stmt.order_by(*CONTACT_SORT_KEYS[sort]).limit(limit + 1)).all()
+    return split_page(rows, limit, sort)
+
+
+def get_upcoming_birthdays_rows(db: Session, user_id: int, days: int = 7, columns: tuple = CONTACT_COLUMNS):
+    """
+    The get_upcoming_birthdays_rows function returns all columns of the contacts with upcoming birthdays as Core rows.
+
+    :param db: Session: Pass the database session to the function
+    :param user_id: int: Specify the user ID of the contact
+    :param days: int: The length of the window in days, up to 365
+    :param columns: tuple: The columns to select
+    :return: A list of rows ordered by the upcoming birthday
+    :doc-Author: BGU
+    """
+    today = datetime.now().date()
+    return db.execute(select(*columns)
+                      .where(Contact.user_id == user_id, upcoming_birthdays_criteria(today, days))
+                      .order_by(*upcoming_birthdays_order(today))).all()
+
+
+def bulk_rows(contacts_data: list[dict], user_id: int, existing: set) -> list[dict]:
+    """
+    The bulk_rows function prepares contacts for a Core INSERT, which bypasses the ORM write events.
+
+    :param contacts_data: list[dict]: The contacts to insert
+    :param user_id: int: Identify the user who created the contacts
+    :param existing: set: Emails to skip
+    :return: A list of row dicts
+    :doc-Author: BGU
+    """
+    return [{**contact_data, "user_id": user_id, "birthday_doy": birthday_day_of_year(contact_data.get("birthday"))}
+            for contact_data in contacts_data if contact_data["email"] not in existing]
+
+
+def get_changes(db: Session, user_id: int, since: int = 0, limit: int = 100):
+    """
+    The get_changes function returns the contact changes of a user after the change number since.
+    Contacts and tombstones are each read from their (user_id, seq) index.
+
+    :param db: Session: Pass the database session to the function
+    :param user_id: int: Specify the user ID of the contacts
+    :param since: int: The last change number the client has seen
+    :param limit: int: Limit the number of changes returned
+    :return: A list of ("upsert" | "delete", row) ordered by seq and whether more changes follow
+    :doc-Author: BGU
+    """
+    upserts, deletes = changes_statements(user_id, since, limit)
+    return merge_changes(db.execute(upserts).all(), db.execute(deletes).all(), limit)
+
+
+def get_contacts_version(db: Session, user_id: int):
+    """
+    The get_contacts_version function returns the version of the user's contact collection:
+    the last change number and the time of the last change. It is one primary key lookup.
+
+    :param db: Session: Pass the database session to the function
+    :param user_id: int: Specify the user ID of the contacts
+    :return: A row with last_seq and updated_at, or None if the user has never changed a contact
+    :doc-Author: BGU
+    """
+    return db.execute(contacts_version_statement(user_id)).first()
+
+
+def get_versioned_contact_row(db: Session, user_id: int, contact_id: int, columns: tuple = CONTACT_COLUMNS):
+    """
+    The get_versioned_contact_row function returns a contact as a Core row together with its version:
+    the change number of the row and the time of the last change of the collection.
+
+    :param db: Session: Pass the database session to the function
+    :param user_id: int: Specify the user ID of the contact
+    :param contact_id: int: Specify the ID of the contact
+    :param columns: tuple: The columns to select
+    :return: A row with the columns, seq and updated_at, or None if it does not exist
+    :doc-Author: BGU
+    """
+    return db.execute(versioned_contact_statement(user_id, contact_id, columns)).first()
+
+
+def next_change_seq(db: Session, user_id: int, count: int = 1) -> int:
+    """
+    The next_change_seq function reserves count change numbers of a user and returns the last one.
+    The counter row stays locked until the transaction commits, so the changes of a user commit in seq order
+    and a client that has seen a number never misses a smaller one committed later.
+    Writers reserve the number before they write the contact and roll back when the write matched no row.
+
+    :param db: Session: Pass the database session to the function
+    :param user_id: int: Specify the user ID of the contacts
+    :param count: int: The number of changes
+    :return: The last reserved change number
+    :doc-Author: BGU
+    """
+    if supports_upsert(db):
+        return db.execute(change_seq_statement(db, user_id, count)).scalar_one()
+    updated = db.execute(update(ContactSequence).where(ContactSequence.user_id == user_id)
+                         .values(last_seq=ContactSequence.last_seq + count, updated_at=func.now()))
+    if updated.rowcount == 0:
+        db.execute(insert(ContactSequence).values(user_id=user_id, last_seq=count))
+        return count
+    return db.execute(select(ContactSequence.last_seq).where(ContactSequence.user_id == user_id)).scalar_one()
+
+
+def supports_upsert(db) -> bool:
+    """
+    The supports_upsert function checks whether the database of the session supports
+    INSERT ... ON CONFLICT together with RETURNING.
+
+    :param db: Session: The database session
+    :return: True for SQLite 3.35+ and PostgreSQL
+    :doc-Author: BGU
+    """
+    return db.get_bind().dialect.name in UPSERT_INSERTS and supports_returning(db, "insert")
+
+
+def supports_returning(db, statement: str) -> bool:
+    """
+    The supports_returning function checks whether the database of the session supports RETURNING
+    for the given kind of statement.
+
+    :param db: Session: The database session
+    :param statement: str: One of "insert", "update", "delete"
+    :return: True if RETURNING is supported
+    :doc-Author: BGU
+    """
+    return getattr(db.get_bind().dialect, f"{statement}_returning", False) is True
+
+
+def bulk_insert_statement(db):
+    """
+    The bulk_insert_statement function builds an executemany INSERT ... ON CONFLICT (email) DO NOTHING RETURNING email,
+    so the contacts created by a concurrent request are skipped instead of failing the whole batch.
+
+    :param db: Session: The database session
+    :return: An Insert statement, or None if the backend supports neither ON CONFLICT nor RETURNING
+    :doc-Author: BGU
+    """
+    if not supports_upsert(db):
+        return None
+    return (UPSERT_INSERTS[db.get_bind().dialect.name](Contact)
+            .on_conflict_do_nothing(index_elements=[Contact.email]).returning(Contact.email))
+
+
+def insert_contact_statement(db, contact_data: dict):
+    """
+    The insert_contact_statement function builds INSERT ... ON CONFLICT (email) DO NOTHING RETURNING for a contact.
+
+    :param db: Session: The database session
+    :param contact_data: dict: The contact data with user_id
+    :return: An Insert statement, or None if the backend supports neither ON CONFLICT nor RETURNING
+    :doc-Author: BGU
+    """
+    if not supports_upsert(db):
+        return None
+    row = bulk_rows([contact_data], contact_data["user_id"], set())[0]
+    return (UPSERT_INSERTS[db.get_bind().dialect.name](Contact).values(**row)
+            .on_conflict_do_nothing(index_elements=[Contact.email]).returning(*CONTACT_COLUMNS))
+
+
+def update_contact_statement(user_id: int, contact_id: int, updated_data: dict):
+    """
+    The update_contact_statement function builds UPDATE ... RETURNING for a contact of a user.
+    A Core UPDATE bypasses the ORM write events, so birthday_doy is set here.
+
+    :param user_id: int: Specify the user ID of the contact
+    :param contact_id: int: Specify the ID of the contact to update
+    :param updated_data: dict: The new values
+    :return: An Update statement
+    :doc-Author: BGU
+    """
+    values = dict(updated_data)
+    if "birthday" in values:
+        values["birthday_doy"] = birthday_day_of_year(values["birthday"])
+    return (update(Contact).where(Contact.id == contact_id, Contact.user_id == user_id)
+            .values(**values).returning(*CONTACT_COLUMNS))
+
+
+def delete_contact_statement(user_id: int, contact_id: int):
+    """
+    The delete_contact_statement function builds DELETE ... RETURNING for a contact of a user.
+
+    :param user_id: int: Specify the user ID of the contact
+    :param contact_id: int: Specify the ID of the contact to delete
+    :return: A Delete statement
+    :doc-Author: BGU
+    """
+    return delete(Contact).where(Contact.id == contact_id, Contact.user_id == user_id).returning(*CONTACT_COLUMNS)
+
+
+def projection(fields: Optional[tuple], sort: Optional[str] = None) -> tuple:
+    """
+    The projection function returns the columns to select for the requested fields.
+    A keyset page also selects its sort key, which the cursor is built from.
+
+    :param fields: Optional[tuple]: The requested field names, None for the default columns
+    :param sort: Optional[str]: The sort key of a keyset page, one of CONTACT_SORT_KEYS
+    :return: A tuple of columns
+    :doc-Author: BGU
+    """
+    if not fields:
+        return CONTACT_COLUMNS
+    keys = set(fields)
+    if sort:
+        keys.update(column.key for column in CONTACT_SORT_KEYS[sort])
+    return tuple(column for column in CONTACT_COLUMNS if column.key in keys)
+
+
+def change_seq_statement(db, user_id: int, count: int = 1):
+    """
+    The change_seq_statement function builds the INSERT ... ON CONFLICT DO UPDATE ... RETURNING
+    that advances the change counter of a user, creating it on the first change.
+
+    :param db: Session: The database session
+    :param user_id: int: Specify the user ID of the contacts
+    :param count: int: The number of changes
+    :return: An Insert statement returning the last reserved number
+    :doc-Author: BGU
+    """
+    return (UPSERT_INSERTS[db.get_bind().dialect.name](ContactSequence).values(user_id=user_id, last_seq=count)
+            .on_conflict_do_update(index_elements=[ContactSequence.user_id],
+                                   set_={"last_seq": ContactSequence.last_seq + count, "updated_at": func.now()})
+            .returning(ContactSequence.last_seq))
+
+
+def contacts_version_statement(user_id: int):
+    """
+    The contacts_version_statement function selects the version of the user's contact collection.
+
+    :param user_id: int: Specify the user ID of the contacts
+    :return: A Select statement
+    :doc-Author: BGU
+    """
+    return select(ContactSequence.last_seq, ContactSequence.updated_at).where(ContactSequence.user_id == user_id)
+
+
+def versioned_contact_statement(user_id: int, contact_id: int, columns: tuple = CONTACT_COLUMNS):
+    """
+    The versioned_contact_statement function selects a contact of a user with its change number
+    and the time of the last change of the collection.
+
+    :param user_id: int: Specify the user ID of the contact
+    :param contact_id: int: Specify the ID of the contact
+    :param columns: tuple: The columns to select
+    :return: A Select statement
+    :doc-Author: BGU
+    """
+    return (select(*columns, Contact.seq, ContactSequence.updated_at)
+            .outerjoin(ContactSequence, ContactSequence.user_id == Contact.user_id)
+            .where(Contact.id == contact_id, Contact.user_id == user_id))
+
+
+def number_changes(rows: list[dict], last_seq: int):
+    """
+    The number_changes function gives the rows of a batch consecutive change numbers ending with last_seq.
+
+    :param rows: list[dict]: The row dicts of the batch
+    :param last_seq: int: The last reserved change number
+    :return: None
+    :doc-Author: BGU
+    """
+    for seq, row in enumerate(rows, start=last_seq - len(rows) + 1):
+        row["seq"] = seq
+
+
+def tombstone_statement(user_id: int, contact_id: int, seq: int):
+    """
+    The tombstone_statement function builds the INSERT of the tombstone of a deleted contact.
+
+    :param user_id: int: Specify the user ID of the contact
+    :param contact_id: int: Specify the ID of the deleted contact
+    :param seq: int: The change number of the deletion
+    :return: An Insert statement
+    :doc-Author: BGU
+    """
+    return insert(ContactTombstone).values(contact_id=contact_id, user_id=user_id, seq=seq)
+
+
+def contacts_by_ids_statement(user_id: int, ids: list[int], columns: tuple = CONTACT_COLUMNS):
+    """
+    The contacts_by_ids_statement function selects the contacts of a user with the given ids.
+
+    :param user_id: int: Specify the user ID of the contacts
+    :param ids: list[int]: The IDs of the contacts
+    :param columns: tuple: The columns to select
+    :return: A Select statement
+    :doc-Author: BGU
+    """
+    return select(*columns).where(Contact.user_id == user_id, Contact.id.in_(ids))
+
+
+def lock_change_seq_statement(user_id: int):
+    """
+    The lock_change_seq_statement function locks the change counter of a user before a batch locks its contact rows.
+    Single writes reserve the change number before they touch the contact, so all writers take the counter first
+    and concurrent writes of a user cannot deadlock (FOR UPDATE is skipped on SQLite).
+
+    :param user_id: int: Specify the user ID of the contacts
+    :return: A Select statement
+    :doc-Author: BGU
+    """
+    return select(ContactSequence.last_seq).where(ContactSequence.user_id == user_id).with_for_update()
+
+
+def locked_ids_statement(user_id: int, ids: list[int]):
+    """
+    The locked_ids_statement function selects which of the ids are contacts of the user and locks their rows
+    until the batch commits (FOR UPDATE is skipped on SQLite, whose writers are serialized anyway).
+
+    :param user_id: int: Specify the user ID of the contacts
+    :param ids: list[int]: The IDs of the contacts
+    :return: A Select statement
+    :doc-Author: BGU
+    """
+    return select(Contact.id).where(Contact.user_id == user_id, Contact.id.in_(ids)).with_for_update()
+
+
+def emails_statement(emails: list[str]):
+    """
+    The emails_statement function selects the owners of the given emails among all contacts.
+
+    :param emails: list[str]: The emails to look up
+    :return: A Select statement of (email, id)
+    :doc-Author: BGU
+    """
+    return select(Contact.email, Contact.id).where(Contact.email.in_(emails))
+
+
+def email_conflicts(updates: list[dict], owners: dict) -> set:
+    """
+    The email_conflicts function finds the updates that would break the unique email:
+    the email belongs to another contact, or an earlier update of the batch sets it.
+
+    :param updates: list[dict]: The updates with "id"
+    :param owners: dict: email -> id of the contact that has it now
+    :return: The set of conflicting ids
+    :doc-Author: BGU
+    """
+    conflicts, claimed = set(), set()
+    for item in updates:
+        email = item.get("email")
+        if email is None:
+            continue
+        if owners.get(email, item["id"]) != item["id"] or email in claimed:
+            conflicts.add(item["id"])
+        else:
+            claimed.add(email)
+    return conflicts
+
+
+def batch_update_statement(user_id: int):
+    """
+    The batch_update_statement function builds an ORM bulk UPDATE by primary key, restricted to the user's contacts.
+    It is executed with a list of row dicts; SQLAlchemy sends consecutive rows with the same keys as one executemany.
+
+    :param user_id: int: Specify the user ID of the contacts
+    :return: An Update statement
+    :doc-Author: BGU
+    """
+    return update(Contact).where(Contact.user_id == user_id).execution_options(synchronize_session=None)
+
+
+def batch_update_rows(updates: list[dict], last_seq: int) -> list[dict]:
+    """
+    The batch_update_rows function prepares partial updates for batch_update_statement:
+    it groups the rows by their keys, numbers the changes and sets birthday_doy.
+
+    :param updates: list[dict]: The updates with "id"
+    :param last_seq: int: The last reserved change number
+    :return: A list of row dicts
+    :doc-Author: BGU
+    """
+    # Групуємо до нумерації, щоб події виходили в порядку номерів змін
+    rows = sorted((dict(item) for item in updates), key=lambda row: sorted(row))
+    number_changes(rows, last_seq)
+    for row in rows:
+        if "birthday" in row:
+            row["birthday_doy"] = birthday_day_of_year(row["birthday"])
+    return rows
+
+
+def delete_contacts_statement(user_id: int, ids: list[int]):
+    """
+    The delete_contacts_statement function builds one DELETE of the contacts of a user with the given ids.
+
+    :param user_id: int: Specify the user ID of the contacts
+    :param ids: list[int]: The IDs of the contacts to delete
+    :return: A Delete statement
+    :doc-Author: BGU
+    """
+    return delete(Contact).where(Contact.user_id == user_id, Contact.id.in_(ids))
+
+
+def batch_tombstone_rows(user_id: int, ids: list[int], last_seq: int) -> list[dict]:
+    """
+    The batch_tombstone_rows function prepares the tombstones of deleted contacts with consecutive change numbers.
+
+    :param user_id: int: Specify the user ID of the contacts
+    :param ids: list[int]: The IDs of the deleted contacts
+    :param last_seq: int: The last reserved change number
+    :return: A list of row dicts
+    :doc-Author: BGU
+    """
+    rows = [{"contact_id": contact_id, "user_id": user_id} for contact_id in ids]
+    number_changes(rows, last_seq)
+    return rows
+
+
+def changes_statements(user_id: int, since: int, limit: int) -> tuple:
+    """
+    The changes_statements function selects up to limit + 1 changed contacts and tombstones after since.
+
+    :param user_id: int: Specify the user ID of the contacts
+    :param since: int: The last change number the client has seen
+    :param limit: int: Limit the number of changes returned
+    :return: A tuple of the contacts and the tombstones Select statements
+    :doc-Author: BGU
+    """
+    upserts = (select(*CONTACT_COLUMNS, Contact.seq).where(Contact.user_id == user_id, Contact.seq > since)
+               .order_by(Contact.seq).limit(limit + 1))
+    deletes = (select(ContactTombstone.contact_id.label("id"), ContactTombstone.seq)
+               .where(ContactTombstone.user_id == user_id, ContactTombstone.seq > since)
+               .order_by(ContactTombstone.seq).limit(limit + 1))
+    return upserts, deletes
+
+
+def merge_changes(upserts: list, deletes: list, limit: int) -> tuple:
+    """
+    The merge_changes function merges changed contacts and tombstones, each ordered by seq, into one list.
+
+    :param upserts: list: Contact rows ordered by seq
+    :param deletes: list: Tombstone rows ordered by seq
+    :param limit: int: Limit the number of changes returned
+    :return: A list of ("upsert" | "delete", row) and whether more changes follow
+    :doc-Author: BGU
+    """
+    changes = list(islice(heapq.merge((("upsert", row) for row in upserts), (("delete", row) for row in deletes),
+                                      key=lambda change: change[1].seq), limit + 1))
+    return changes[:limit], len(changes) > limit
+
+
+def publish_change(user_id: int, seq: int, contact_id: int, contact=None):
+    """
+    The publish_change function pushes a committed change to the event streams of the user
+    in the shape of ContactChange, so a client applies pushed and fetched changes the same way.
+    The cached queries of the user are dropped first, so a client reacting to the event reads the change.
+
+    :param user_id: int: Specify the user ID of the contact
+    :param seq: int: The change number
+    :param contact_id: int: Specify the ID of the changed contact
+    :param contact: The contact row or object, None for a deletion
+    :return: None
+    :doc-Author: BGU
+    """
+    contact_queries.invalidate_user(user_id)
+    event_hub.publish(user_id, "change", {
+        "seq": seq, "op": "delete" if contact is None else "upsert", "id": contact_id,
+        "contact": None if contact is None else {field: getattr(contact, field) for field in CONTACT_FIELDS},
+    }, seq)
+
+
+def publish_resync(user_id: int, seq: int):
+    """
+    The publish_resync function tells the event streams of the user to fetch GET /contacts/changes.
+    Batches are not pushed contact by contact, an executemany INSERT does not return the new ids.
+    The cached queries of the user are dropped first.
+
+    :param user_id: int: Specify the user ID of the contacts
+    :param seq: int: The last change number of the batch
+    :return: None
+    :doc-Author: BGU
+    """
+    contact_queries.invalidate_user(user_id)
+    event_hub.publish(user_id, "resync", {"seq": seq})
+
+
+def keyset_criteria(sort: str, after: Optional[list]):
+    """
+    The keyset_criteria function builds the filter criteria that continue a listing after a cursor.
+
+    :param sort: str: The sort key, one of CONTACT_SORT_KEYS
+    :param after: Optional[list]: The sort key values of the last contact of the previous page
+    :return: A list of filter criteria
+    :doc-Author: BGU
+    """
+    if not after:
+        return []
+    return [tuple_(*CONTACT_SORT_KEYS[sort]) > tuple_(*after)]
+
+
+def split_page(db_contacts: list, limit: int, sort: str):
+    """
+    The split_page function cuts a list fetched with limit + 1 rows into a page and the values to continue after.
+
+    :param db_contacts: list: Contacts or rows fetched with limit + 1
+    :param limit: int: The page size
+    :param sort: str: The sort key, one of CONTACT_SORT_KEYS
+    :return: A list of contacts and the sort key values to continue after (None on the last page)
+    :doc-Author: BGU
+    """
+    if len(db_contacts) <= limit:
+        return db_contacts, None
+    page = db_contacts[:limit]
+    return page, [getattr(page[-1], column.key) for column in CONTACT_SORT_KEYS[sort]]
+
+
+def search_criteria(first_name: Optional[str] = None, last_name: Optional[str] = None, email: Optional[str] = None):
+    """
+    The search_criteria function builds the filter criteria used to search contacts.
+
+    :param first_name: Optional[str]: Filter contacts by first name
+    :param last_name: Optional[str]: Filter contacts by last name
+    :param email: Optional[str]: Filter contacts by email
+    :return: A list of filter criteria
+    :doc-Author: BGU
+    """
+    criteria = []
+    if first_name:
+        criteria.append(Contact.first_name.ilike(f"%{first_name}%"))
+    if last_name:
+        criteria.append(Contact.last_name.ilike(f"%{last_name}%"))
+    if email:
+        criteria.append(Contact.email.ilike(f"%{email}%"))
+    return criteria
+
+
+def birthday_windows(today: date, days: int = 7):
+    """
+    The birthday_windows function converts a window of days into ranges of birthday_doy.
+    The window is split in two ranges when it crosses the end of the year.
+    In a non-leap year Feb 29 birthdays are celebrated on Feb 28.
+
+    :param today: date: The first day of the window
+    :param days: int: The length of the window in days, up to 365
+    :return: A list of (first, last) birthday_doy ranges
+    :doc-Author: BGU
+    """
+    if days >= 365:
+        return [(1, 366)]
+    upcoming = today + timedelta(days=days)
+    start = birthday_day_of_year(today)
+    end = birthday_day_of_year(upcoming)
+    if not calendar.isleap(upcoming.year) and (upcoming.month, upcoming.day) == (2, 28):
+        end += 1
+    if upcoming.year == today.year:
+        return [(start, end)]
+    # Діапазон перетинає кінець року
+    return [(start, 366), (1, end)]
+
+
+def upcoming_birthdays_criteria(today: date, days: int = 7):
+    """
+    The upcoming_birthdays_criteria function builds the filter for birthdays in the next days.
+    It compares only birthday_doy, so the (user_id, birthday_doy) index serves it as a range scan.
+
+    :param today: date: The first day of the window
+    :param days: int: The length of the window in days, up to 365
+    :return: A filter criterion
+    :doc-Author: BGU
+    """
+    return or_(*[Contact.birthday_doy.between(first, last) for first, last in birthday_windows(today, days)])
+
+
+def upcoming_birthdays_order(today: date):
+    """
+    The upcoming_birthdays_order function orders birthdays starting from today and wrapping over the new year.
+
+    :param today: date: The first day of the window
+    :return: A list of order by clauses
+    :doc-Author: BGU
+    """
+    return [Contact.birthday_doy < birthday_day_of_year(today), Contact.birthday_doy, Contact.id]
@@ -0,0 +1,567 @@
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import iterate_in_threadpool
+from typing import Optional
+from datetime import datetime
+from src.database.db import with_sync_fallback
+from src.database.models import Contact, ContactSequence, ContactTombstone
+from src.database.search import apply_text_search
+from src.repository import contacts
+from src.services.cache import cached_query, contact_queries, until_midnight
+from src.repository.contacts import (CONTACT_COLUMNS, CONTACT_SORT_KEYS, batch_tombstone_rows, batch_update_rows,
+                                     batch_update_statement, bulk_insert_statement, bulk_rows, change_seq_statement,
+                                     changes_statements, contacts_by_ids_statement, contacts_version_statement,
+                                     delete_contact_statement, delete_contacts_statement, email_conflicts,
+                                     emails_statement, lock_change_seq_statement, locked_ids_statement,
+                                     export_statement, insert_contact_statement, keyset_criteria, merge_changes,
+                                     number_changes, publish_change, publish_resync, search_criteria, split_page,
+                                     supports_returning, supports_upsert, tombstone_statement,
+                                     upcoming_birthdays_criteria, upcoming_birthdays_order, update_contact_statement,
+                                     versioned_contact_statement)
+
+
+@with_sync_fallback(contacts.create_contact)
+async def create_contact(db: AsyncSession, contact_data: dict, user_id: int):
+    """
+    The create_contact function creates a new contact in the database.
+
+    :param db: AsyncSession: Pass the database session to the function
+    :param contact_data: dict: Pass the contact data to the function
+    :param user_id: int: Identify the user who created the contact
+    :return: A contact row, or None if the email already exists
+    :doc-Author: BGU
+    """
+    contact_data["user_id"] = user_id
+    if supports_upsert(db):
+        # Номер зміни записується тим самим INSERT ... RETURNING; якщо email зайнятий, відкат повертає номер
+        contact_data["seq"] = await next_change_seq(db, user_id)
+        new_contact = (await db.execute(insert_contact_statement(db, contact_data))).first()
+        if new_contact is None:
+            await db.rollback()
+            return None
+        await db.commit()
+        publish_change(user_id, contact_data["seq"], new_contact.id, new_contact)
+        return new_contact
+    existing_contact = await db.scalar(select(Contact).where(Contact.email == contact_data["email"]))
+    if existing_contact:
+        return None
+    contact_data["seq"] = await next_change_seq(db, user_id)
+    new_contact = Contact(**contact_data)
+    db.add(new_contact)
+    await db.commit()
+    await db.refresh(new_contact)
+    publish_change(user_id, new_contact.seq, new_contact.id, new_contact)
+    return new_contact
+
+
+@with_sync_fallback(contacts.bulk_create_contacts)
+async def bulk_create_contacts(db: AsyncSession, contacts_data: list[dict], user_id: int) -> set:
+    """
+    The bulk_create_contacts function inserts a batch of contacts with one duplicate check and one executemany INSERT.
+    Contacts whose email already exists are skipped, including those created concurrently between the check
+    and the INSERT: ON CONFLICT (email) DO NOTHING skips them and they leave gaps in the change numbers.
+
+    :param db: AsyncSession: Pass the database session to the function
+    :param contacts_data: list[dict]: The contacts to insert, with unique emails
+    :param user_id: int: Identify the user who created the contacts
+    :return: The set of emails that already existed
+    :doc-Author: BGU
+    """
+    emails = [contact_data["email"] for contact_data in contacts_data]
+    existing = set((await db.scalars(select(Contact.email).where(Contact.email.in_(emails)))).all())
+    rows = bulk_rows(contacts_data, user_id, existing)
+    if rows:
+        number_changes(rows, await next_change_seq(db, user_id, len(rows)))
+        statement = bulk_insert_statement(db)
+        if statement is None:
+            await db.execute(insert(Contact), rows)
+        else:
+            existing |= set(emails) - existing - set((await db.scalars(statement, rows)).all())
+        await db.commit()
+        publish_resync(user_id, rows[-1]["seq"])
+    return existing
+
+
+@with_sync_fallback(contacts.get_contacts)
+async def get_contacts(db: AsyncSession, user_id: int, skip: int = 0, limit: int = 10):
+    """
+    The get_contacts function returns a list of contacts for a given user.
+
+    :param db: AsyncSession: Pass the database session to the function
+    :param user_id: int: Specify the user ID of the contact
+    :param skip: int: Skip a certain number of contacts
+    :param limit: int: Limit the number of contacts returned
+    :return: A list of contacts
+    :doc-Author: BGU
+    """
+    result = await db.scalars(select(Contact).where(Contact.user_id == user_id).offset(skip).limit(limit))
+    db_contacts = result.all()
+    if not db_contacts:
+        return None
+    return db_contacts
+
+
+@with_sync_fallback(contacts.get_contacts_page)
+async def get_contacts_page(db: AsyncSession, user_id: int, after: Optional[list] = None, limit: int = 10,
+                            sort: str = "id"):
+    """
+    The get_contacts_page function returns one keyset page of contacts for a given user.
+
+    :param db: AsyncSession: Pass the database session to the function
+    :param user_id: int: Specify the user ID of the contact
+    :param after: Optional[list]: The sort key values of the last contact of the previous page
+    :param limit: int: Limit the number of contacts returned
+    :param sort: str: The sort key, one of CONTACT_SORT_KEYS
+    :return: A list of contacts and the sort key values to continue after (None on the last page)
+    :doc-Author: BGU
+    """
+    result = await db.scalars(
+        select(Contact).where(Contact.user_id == user_id, *keyset_criteria(sort, after))
+        .order_by(*CONTACT_SORT_KEYS[sort]).limit(limit + 1)
+    )
+    return split_page(result.all(), limit, sort)
+
+
+async def stream_contacts(db: AsyncSession, user_id: int, batch_size: int = 1000):
+    """
+    The stream_contacts function yields all contacts of a user in batches of rows, read through a server-side cursor.
+    With a sync Session each batch is fetched in the threadpool.
+
+    :param db: AsyncSession: Pass the database session to the function
+    :param user_id: int: Specify the user ID of the contact
+    :param batch_size: int: The number of rows fetched at once
+    :return: An async generator of lists of row mappings
+    :doc-Author: BGU
+    """
+    if not isinstance(db, AsyncSession):
+        async for partition in iterate_in_threadpool(contacts.stream_contacts(db, user_id, batch_size)):
+            yield partition
+        return
+    result = await db.stream(export_statement(user_id).execution_options(yield_per=batch_size))
+    async for partition in result.mappings().partitions():
+        yield partition
+
+
+@with_sync_fallback(contacts.get_contact)
+async def get_contact(db: AsyncSession, user_id: int, contact_id: int):
+    """
+    The get_contact function returns the contact with the given contact_id.
+
+    :param db: AsyncSession: Pass the database session to the function
+    :param user_id: int: Specify the user ID of the contact
+    :param contact_id: int: Specify the ID of the contact to retrieve
+    :return: A contact object
+    :doc-Author: BGU
+    """
+    return await db.scalar(select(Contact).where(Contact.id == contact_id, Contact.user_id == user_id))
+
+
+@with_sync_fallback(contacts.get_contact_row)
+async def get_contact_row(db: AsyncSession, user_id: int, contact_id: int, columns: tuple = CONTACT_COLUMNS):
+    """
+    The get_contact_row function returns the selected columns of one contact as a Core row.
+
+    :param db: AsyncSession: Pass the database session to the function
+    :param user_id: int: Specify the user ID of the contact
+    :param contact_id: int: Specify the ID of the contact to retrieve
+    :param columns: tuple: The columns to select
+    :return: A row, or None if the contact does not exist
+    :doc-Author: BGU
+    """
+    result = await db.execute(select(*columns).where(Contact.id == contact_id, Contact.user_id == user_id))
+    return result.first()
+
+
+@with_sync_fallback(contacts.update_contact)
+async def update_contact(db: AsyncSession, user_id: int, contact_id: int, updated_data: dict):
+    """
+    The update_contact function updates a contact in the database.
+
+    :param db: AsyncSession: Pass the database session to the function
+    :param user_id: int: Specify the user ID of the contact
+    :param contact_id: int: Specify the ID of the contact to update
+    :param updated_data: dict: Pass the updated data to the function
+    :return: A contact row or object, or None if it does not exist
+    :doc-Author: BGU
+    """
+    if supports_returning(db, "update") and updated_data:
+        seq = await next_change_seq(db, user_id)
+        statement = update_contact_statement(user_id, contact_id, {**updated_data, "seq": seq})
+        db_contact = (await db.execute(statement)).first()
+        if db_contact is None:
+            # Контакту немає: відкат повертає зарезервований номер зміни
+            await db.rollback()
+            return None
+        await db.commit()
+        publish_change(user_id, seq, contact_id, db_contact)
+        return db_contact
+    db_contact = await db.scalar(select(Contact).where(Contact.id == contact_id, Contact.user_id == user_id))
+    if db_contact is None:
+        return None
+    for key, value in updated_data.items():
+        setattr(db_contact, key, value)
+    if updated_data:
+        db_contact.seq = await next_change_seq(db, user_id)
+    await db.commit()
+    await db.refresh(db_contact)
+    if updated_data:
+        publish_change(user_id, db_contact.seq, contact_id, db_contact)
+    return db_contact
+
+
+@with_sync_fallback(contacts.delete_contact)
+async def delete_contact(db: AsyncSession, user_id: int, contact_id: int):
+    """
+    The delete_contact function deletes a contact from the database.
+
+    :param db: AsyncSession: Pass the database session to the function
+    :param user_id: int: Specify the user ID of the contact
+    :param contact_id: int: Specify the ID of the contact to delete
+    :return: A contact row or object, or None if it does not exist
+    :doc-Author: BGU
+    """
+    if supports_returning(db, "delete"):
+        seq = await next_change_seq(db, user_id)
+        db_contact = (await db.execute(delete_contact_statement(user_id, contact_id))).first()
+        if db_contact is None:
+            await db.rollback()
+            return None
+        await db.execute(tombstone_statement(user_id, contact_id, seq))
+        await db.commit()
+        publish_change(user_id, seq, contact_id)
+        return db_contact
+    db_contact = await db.scalar(select(Contact).where(Contact.id == contact_id, Contact.user_id == user_id))
+    if not db_contact:
+        return None
+    await db.delete(db_contact)
+    seq = await next_change_seq(db, user_id)
+    await db.execute(tombstone_statement(user_id, contact_id, seq))
+    await db.commit()
+    publish_change(user_id, seq, contact_id)
+    return db_contact
+
+
+@with_sync_fallback(contacts.get_contacts_by_ids)
+async def get_contacts_by_ids(db: AsyncSession, user_id: int, ids: list[int],
+                              columns: tuple = CONTACT_COLUMNS) -> dict:
+    """
+    The get_contacts_by_ids function returns the contacts of a user with the given ids in one query.
+
+    :param db: AsyncSession: Pass the database session to the function
+    :param user_id: int: Specify the user ID of the contacts
+    :param ids: list[int]: The IDs of the contacts
+    :param columns: tuple: The columns to select, they must include Contact.id
+    :return: A dictionary of rows by id, missing ids are absent
+    :doc-Author: BGU
+    """
+    return {row.id: row for row in await db.execute(contacts_by_ids_statement(user_id, ids, columns))}
+
+
+@with_sync_fallback(contacts.update_contacts)
+async def update_contacts(db: AsyncSession, user_id: int, updates: list[dict]) -> tuple:
+    """
+    The update_contacts function applies partial updates to contacts of a user in one transaction.
+
+    :param db: AsyncSession: Pass the database session to the function
+    :param user_id: int: Specify the user ID of the contacts
+    :param updates: list[dict]: The new values of each contact with its "id", ids are unique
+    :return: The rows of the found contacts by id and the set of ids skipped for a taken email
+    :doc-Author: BGU
+    """
+    await db.execute(lock_change_seq_statement(user_id))
+    found = set(await db.scalars(locked_ids_statement(user_id, [item["id"] for item in updates])))
+    updates = [item for item in updates if item["id"] in found]
+    emails = [item["email"] for item in updates if "email" in item]
+    owners = dict((await db.execute(emails_statement(emails))).all()) if emails else {}
+    conflicts = email_conflicts(updates, owners)
+    changed = [item for item in updates if item["id"] not in conflicts and len(item) > 1]
+    if changed:
+        changed = batch_update_rows(changed, await next_change_seq(db, user_id, len(changed)))
+        await db.execute(batch_update_statement(user_id), changed)
+    rows = await get_contacts_by_ids(db, user_id, list(found - conflicts))
+    await db.commit()
+    for item in changed:
+        publish_change(user_id, item["seq"], item["id"], rows[item["id"]])
+    return rows, conflicts
+
+
+@with_sync_fallback(contacts.delete_contacts)
+async def delete_contacts(db: AsyncSession, user_id: int, ids: list[int]) -> set:
+    """
+    The delete_contacts function deletes contacts of a user and writes their tombstones in one transaction.
+
+    :param db: AsyncSession: Pass the database session to the function
+    :param user_id: int: Specify the user ID of the contacts
+    :param ids: list[int]: The IDs of the contacts to delete
+    :return: The set of deleted ids
+    :doc-Author: BGU
+    """
+    await db.execute(lock_change_seq_statement(user_id))
+    deleted = list(await db.scalars(locked_ids_statement(user_id, ids)))
+    tombstones = []
+    if deleted:
+        await db.execute(delete_contacts_statement(user_id, deleted))
+        tombstones = batch_tombstone_rows(user_id, deleted, await next_change_seq(db, user_id, len(deleted)))
+        await db.execute(insert(ContactTombstone), tombstones)
+    await db.commit()
+    for tombstone in tombstones:
+        publish_change(user_id, tombstone["seq"], tombstone["contact_id"])
+    return set(deleted)
+
+
+@with_sync_fallback(contacts.search_contacts)
+async def search_contacts(db: AsyncSession, user_id: int, first_name: Optional[str] = None,
+                          last_name: Optional[str] = None, email: Optional[str] = None, q: Optional[str] = None):
+    """
+    The search_contacts function searches for contacts in the database.
+
+    :param db: AsyncSession: Pass the database session to the function
+    :param user_id: int: Specify the user ID of the contact
+    :param first_name: Optional[str]: Filter contacts by first name
+    :param last_name: Optional[str]: Filter contacts by last name
+    :param email: Optional[str]: Filter contacts by email
+    :param q: Optional[str]: Search all name and email fields, ordered by relevance
+    :return: A list of contacts
+    :doc-Author: BGU
+    """
+    stmt = select(Contact).where(Contact.user_id == user_id, *search_criteria(first_name, last_name, email))
+    if q:
+        stmt = apply_text_search(stmt, db.get_bind().dialect.name, q)
+    result = await db.scalars(stmt)
+    return result.all()
+
+
+@with_sync_fallback(contacts.search_contacts_page)
+async def search_contacts_page(db: AsyncSession, user_id: int, first_name: Optional[str] = None,
+                               last_name: Optional[str] = None, email: Optional[str] = None, q: Optional[str] = None,
+                               after: Optional[list] = None, limit: int = 10, sort: str = "id"):
+    """
+    The search_contacts_page function returns one keyset page of contacts matching the search.
+
+    :param db: AsyncSession: Pass the database session to the function
+    :param user_id: int: Specify the user ID of the contact
+    :param first_name: Optional[str]: Filter contacts by first name
+    :param last_name: Optional[str]: Filter contacts by last name
+    :param email: Optional[str]: Filter contacts by email
+    :param q: Optional[str]: Search all name and email fields
+    :param after: Optional[list]: The sort key values of the last contact of the previous page
+    :param limit: int: Limit the number of contacts returned
+    :param sort: str: The sort key, one of CONTACT_SORT_KEYS
+    :return: A list of contacts and the sort key values to continue after (None on the last page)
+    :doc-Author: BGU
+    """
+    stmt = select(Contact).where(Contact.user_id == user_id, *search_criteria(first_name, last_name, email),
+                                 *keyset_criteria(sort, after))
+    if q:
+        stmt = apply_text_search(stmt, db.get_bind().dialect.name, q, ranked=False)
+    result = await db.scalars(stmt.order_by(*CONTACT_SORT_KEYS[sort]).limit(limit + 1))
+    return split_page(result.all(), limit, sort)
+
+
+@with_sync_fallback(contacts.get_upcoming_birthdays)
+async def get_upcoming_birthdays(db: AsyncSession, user_id: int, days: int = 7):
+    """
+    The get_upcoming_birthdays function returns a list of upcoming birthdays in the next days for the specified user.
+
+    :param db: AsyncSession: Pass the database session to the function
+    :param user_id: int: Specify the user ID of the contact
+    :param days: int: The length of the window in days, up to 365
+    :return: A list of contacts ordered by the upcoming birthday
+    :doc-Author: BGU
+    """
+    today = datetime.now().date()
+    result = await db.scalars(
+        select(Contact).where(Contact.user_id == user_id, upcoming_birthdays_criteria(today, days))
+        .order_by(*upcoming_birthdays_order(today))
+    )
+    return result.all()
+
+
+@cached_query(contact_queries, "contacts")
+@with_sync_fallback(contacts.get_contacts_rows)
+async def get_contacts_rows(db: AsyncSession, user_id: int, skip: int = 0, limit: int = 10,
+                            columns: tuple = CONTACT_COLUMNS):
+    """
+    The get_contacts_rows function returns the API columns of a user's contacts as Core rows, without ORM objects.
+    With version=<change number of the user> the result is served from contact_queries.
+
+    :param db: AsyncSession: Pass the database session to the function
+    :param user_id: int: Specify the user ID of the contact
+    :param skip: int: Skip a certain number of contacts
+    :param limit: int: Limit the number of contacts returned
+    :param columns: tuple: The columns to select, see projection
+    :return: A list of rows, or None if there are none
+    :doc-Author: BGU
+    """
+    result = await db.execute(select(*columns).where(Contact.user_id == user_id).offset(skip).limit(limit))
+    rows = result.all()
+    if not rows:
+        return None
+    return rows
+
+
+@cached_query(contact_queries, "contacts_page")
+@with_sync_fallback(contacts.get_contacts_page_rows)
+async def get_contacts_page_rows(db: AsyncSession, user_id: int, after: Optional[list] = None, limit: int = 10,
+                                 sort: str = "id", columns: tuple = CONTACT_COLUMNS):
+    """
+    The get_contacts_page_rows function returns one keyset page of contacts as Core rows.
+    With version=<change number of the user> the result is served from contact_queries.
+
+    :param db: AsyncSession: Pass the database session to the function
+    :param user_id: int: Specify the user ID of the contact
+    :param after: Optional[list]: The sort key values of the last contact of the previous page
+    :param limit: int: Limit the number of contacts returned
+    :param sort: str: The sort key, one of CONTACT_SORT_KEYS
+    :param columns: tuple: The columns to select, they must include the sort key
+    :return: A list of rows and the sort key values to continue after (None on the last page)
+    :doc-Author: BGU
+    """
+    result = await db.execute(
+        select(*columns).where(Contact.user_id == user_id, *keyset_criteria(sort, after))
+        .order_by(*CONTACT_SORT_KEYS[sort]).limit(limit + 1)
+    )
+    return split_page(result.all(), limit, sort)
+
+
+@with_sync_fallback(contacts.search_contacts_rows)
+async def search_contacts_rows(db: AsyncSession, user_id: int, first_name: Optional[str] = None,
+                               last_name: Optional[str] = None, email: Optional[str] = None, q: Optional[str] = None,
+                               columns: tuple = CONTACT_COLUMNS):
+    """
+    The search_contacts_rows function searches for contacts and returns all their columns as Core rows.
+
+    :param db: AsyncSession: Pass the database session to the function
+    :param user_id: int: Specify the user ID of the contact
+    :param first_name: Optional[str]: Filter contacts by first name
+    :param last_name: Optional[str]: Filter contacts by last name
+    :param email: Optional[str]: Filter contacts by email
+    :param q: Optional[str]: Search all name and email fields, ordered by relevance
+    :param columns: tuple: The columns to select
+    :return: A list of rows
+    :doc-Author: BGU
+    """
+    stmt = select(*columns).where(Contact.user_id == user_id,
+                                                *search_criteria(first_name, last_name, email))
+    if q:
+        stmt = apply_text_search(stmt, db.get_bind().dialect.name, q)
+    result = await db.execute(stmt)
+    return result.all()
+
+
+@with_sync_fallback(contacts.search_contacts_page_rows)
+async def search_contacts_page_rows(db: AsyncSession, user_id: int, first_name: Optional[str] = None,
+                                    last_name: Optional[str] = None, email: Optional[str] = None,
+                                    q: Optional[str] = None, after: Optional[list] = None, limit: int = 10,
+                                    sort: str = "id", columns: tuple = CONTACT_COLUMNS):
+    """
+    The search_contacts_page_rows function returns one keyset page of the search as Core rows.
+
+    :param db: AsyncSession: Pass the database session to the function
+    :param user_id: int: Specify the user ID of the contact
+    :param first_name: Optional[str]: Filter contacts by first name
+    :param last_name: Optional[str]: Filter contacts by last name
+    :param email: Optional[str]: Filter contacts by email
+    :param q: Optional[str]: Search all name and email fields
+    :param after: Optional[list]: The sort key values of the last contact of the previous page
+    :param limit: int: Limit the number of contacts returned
+    :param sort: str: The sort key, one of CONTACT_SORT_KEYS
+    :param columns: tuple: The columns to select, they must include the sort key
+    :return: A list of rows and the sort key values to continue after (None on the last page)
+    :doc-Author: BGU
+    """
+    stmt = select(*columns).where(Contact.user_id == user_id, *search_criteria(first_name, last_name, email),
+                                          *keyset_criteria(sort, after))
+    if q:
+        stmt = apply_text_search(stmt, db.get_bind().dialect.name, q, ranked=False)
+    result = await db.execute(stmt.order_by(*CONTACT_SORT_KEYS[sort]).limit(limit + 1))
+    return split_page(result.all(), limit, sort)
+
+
+@cached_query(contact_queries, "birthdays", until=until_midnight)
+@with_sync_fallback(contacts.get_upcoming_birthdays_rows)
+async def get_upcoming_birthdays_rows(db: AsyncSession, user_id: int, days: int = 7,
+                                      columns: tuple = CONTACT_COLUMNS):
+    """
+    The get_upcoming_birthdays_rows function returns all columns of the contacts with upcoming birthdays as Core rows.
+    With version=<change number of the user> the result is served from contact_queries until local midnight at most.
+
+    :param db: AsyncSession: Pass the database session to the function
+    :param user_id: int: Specify the user ID of the contact
+    :param days: int: The length of the window in days, up to 365
+    :param columns: tuple: The columns to select
+    :return: A list of rows ordered by the upcoming birthday
+    :doc-Author: BGU
+    """
+    today = datetime.now().date()
+    result = await db.execute(
+        select(*columns).where(Contact.user_id == user_id, upcoming_birthdays_criteria(today, days))
+        .order_by(*upcoming_birthdays_order(today))
+    )
+    return result.all()
+
+
+@with_sync_fallback(contacts.get_changes)
+async def get_changes(db: AsyncSession, user_id: int, since: int = 0, limit: int = 100):
+    """
+    The get_changes function returns the contact changes of a user after the change number since.
+
+    :param db: AsyncSession: Pass the database session to the function
+    :param user_id: int: Specify the user ID of the contacts
+    :param since: int: The last change number the client has seen
+    :param limit: int: Limit the number of changes returned
+    :return: A list of ("upsert" | "delete", row) ordered by seq and whether more changes follow
+    :doc-Author: BGU
+    """
+    upserts, deletes = changes_statements(user_id, since, limit)
+    return merge_changes((await db.execute(upserts)).all(), (await db.execute(deletes)).all(), limit)
+
+
+@with_sync_fallback(contacts.get_contacts_version)
+async def get_contacts_version(db: AsyncSession, user_id: int):
+    """
+    The get_contacts_version function returns the version of the user's contact collection.
+
+    :param db: AsyncSession: Pass the database session to the function
+    :param user_id: int: Specify the user ID of the contacts
+    :return: A row with last_seq and updated_at, or None if the user has never changed a contact
+    :doc-Author: BGU
+    """
+    return (await db.execute(contacts_version_statement(user_id))).first()
+
+
+@with_sync_fallback(contacts.get_versioned_contact_row)
+async def get_versioned_contact_row(db: AsyncSession, user_id: int, contact_id: int,
+                                    columns: tuple = CONTACT_COLUMNS):
+    """
+    The get_versioned_contact_row function returns a contact as a Core row together with its version.
+
+    :param db: AsyncSession: Pass the database session to the function
+    :param user_id: int: Specify the user ID of the contact
+    :param contact_id: int: Specify the ID of the contact
+    :param columns: tuple: The columns to select
+    :return: A row with the columns, seq and updated_at, or None if it does not exist
+    :doc-Author: BGU
+    """
+    return (await db.execute(versioned_contact_statement(user_id, contact_id, columns))).first()
+
+
+async def next_change_seq(db: AsyncSession, user_id: int, count: int = 1) -> int:
+    """
+    The next_change_seq function reserves count change numbers of a user and returns the last one.
+    The counter row stays locked until the transaction commits.
+
+    :param db: AsyncSession: Pass the database session to the function
+    :param user_id: int: Specify the user ID of the contacts
+    :param count: int: The number of changes
+    :return: The last reserved change number
+    :doc-Author: BGU
+    """
+    if supports_upsert(db):
+        return (await db.execute(change_seq_statement(db, user_id, count))).scalar_one()
+    updated = await db.execute(update(ContactSequence).where(ContactSequence.user_id == user_id)
+                               .values(last_seq=ContactSequence.last_seq + count, updated_at=func.now()))
+    if updated.rowcount == 0:
+        await db.execute(insert(ContactSequence).values(user_id=user_id, last_seq=count))
+        return count
+    return (await db.execute(select(ContactSequence.last_seq).where(ContactSequence.user_id == user_id))).scalar_one()
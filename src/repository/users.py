@@ -1,6 +1,10 @@
+from typing import Optional
+
+from sqlalchemy import select, update
 from sqlalchemy.orm import Session
 from src.database.models import User
-from src.services.auth import get_password_hash
+from src.services.cache import principal_cache
+from src.services.events import event_hub
 
 def get_user_by_email(db: Session, email: str) -> User:
     """
@@ -43,6 +47,51 @@ def confirm_email(db: Session, email: str):
     if db_user:
         db_user.confirmed = True
         db.commit()
+    principal_cache.invalidate(email)
+
+
+def update_avatar(db: Session, user: User, url: str, avatar_hash: str = None) -> User:
+    """
+    The update_avatar function sets the avatar URL of the given user.
+
+    :param db: Session: Pass the database session to the function
+    :param user: User: The user whose avatar is updated
+    :param url: str: The new avatar URL
+    :param avatar_hash: str: The content hash of the uploaded image
+    :return: A user object
+    :doc-Author: BGU
+    """
+    # Користувач може прийти з кешу автентифікації і бути застарілим, тож оновлюємо лише аватар
+    db.execute(update(User).where(User.id == user.id).values(avatar=url, avatar_hash=avatar_hash))
+    db.commit()
+    principal_cache.invalidate(user.email)
+    return db.scalar(select(User).where(User.id == user.id).execution_options(populate_existing=True))
 
 
+def get_token_version(db: Session, user_id: int) -> Optional[int]:
+    """
+    The get_token_version function returns the current token version of a user.
 
+    :param db: Session: Pass the database session to the function
+    :param user_id: int: The id of the user
+    :return: The token version, or None if the user does not exist
+    :doc-Author: BGU
+    """
+    return db.query(User.token_version).filter(User.id == user_id).scalar()
+
+
+def revoke_tokens(db: Session, user: User) -> User:
+    """
+    The revoke_tokens function increments the token version of a user, so every token issued before is rejected.
+    The cached versions are dropped through the event broker; with the in-process LocalBroker
+    other workers accept the old tokens until TOKEN_VERSION_CACHE_TTL passes.
+
+    :param db: Session: Pass the database session to the function
+    :param user: User: The user whose tokens are revoked
+    :return: A user object
+    :doc-Author: BGU
+    """
+    db.execute(update(User).where(User.id == user.id).values(token_version=User.token_version + 1))
+    db.commit()
+    event_hub.publish(user.id, "revoke", {"email": user.email})
+    return db.scalar(select(User).where(User.id == user.id).execution_options(populate_existing=True))
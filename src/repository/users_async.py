@@ -0,0 +1,108 @@
+from typing import Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.database.db import with_sync_fallback
+from src.database.models import User
+from src.services.cache import principal_cache
+from src.services.events import event_hub
+from src.repository import users
+
+
+@with_sync_fallback(users.get_user_by_email)
+async def get_user_by_email(db: AsyncSession, email: str) -> User:
+    """
+    The get_user_by_email function takes in a database session and an email address, and returns the user with that email address.
+
+    :param db: AsyncSession: Pass the database session to the function
+    :param email: str: Filter the users by email
+    :return: A user object
+    :doc-Author: BGU
+    """
+    return await db.scalar(select(User).where(User.email == email))
+
+
+@with_sync_fallback(users.register_user)
+async def register_user(db: AsyncSession, username: str, email: str, hashed_password: str) -> User:
+    """
+    The register_user function takes in a database session, username, email, and hashed password, and returns a user object.
+
+    :param db: AsyncSession: Pass the database session to the function
+    :param username: str: Get the username from the request
+    :param email: str: Get the email from the request
+    :param hashed_password: str: Hash the password
+    :return: A user object
+    :doc-Author: BGU
+    """
+    db_user = User(username=username, email=email, hashed_password=hashed_password)
+    db.add(db_user)
+    await db.commit()
+    await db.refresh(db_user)
+    return db_user
+
+
+@with_sync_fallback(users.confirm_email)
+async def confirm_email(db: AsyncSession, email: str):
+    """
+    The confirm_email function takes in a database session and an email address, and sets the confirmed field of the user with that email address to True.
+
+    :param db: AsyncSession: Pass the database session to the function
+    :param email: str: Get the email from the request
+    :return: None
+    :doc-Author: BGU
+    """
+    db_user = await get_user_by_email(db, email)
+    if db_user:
+        db_user.confirmed = True
+        await db.commit()
+    principal_cache.invalidate(email)
+
+
+@with_sync_fallback(users.update_avatar)
+async def update_avatar(db: AsyncSession, user: User, url: str, avatar_hash: str = None) -> User:
+    """
+    The update_avatar function sets the avatar URL of the given user.
+
+    :param db: AsyncSession: Pass the database session to the function
+    :param user: User: The user whose avatar is updated
+    :param url: str: The new avatar URL
+    :param avatar_hash: str: The content hash of the uploaded image
+    :return: A user object
+    :doc-Author: BGU
+    """
+    # Користувач може прийти з кешу автентифікації і бути застарілим, тож оновлюємо лише аватар
+    await db.execute(update(User).where(User.id == user.id).values(avatar=url, avatar_hash=avatar_hash))
+    await db.commit()
+    principal_cache.invalidate(user.email)
+    return await db.scalar(select(User).where(User.id == user.id).execution_options(populate_existing=True))
+
+
+@with_sync_fallback(users.get_token_version)
+async def get_token_version(db: AsyncSession, user_id: int) -> Optional[int]:
+    """
+    The get_token_version function returns the current token version of a user.
+
+    :param db: AsyncSession: Pass the database session to the function
+    :param user_id: int: The id of the user
+    :return: The token version, or None if the user does not exist
+    :doc-Author: BGU
+    """
+    return await db.scalar(select(User.token_version).where(User.id == user_id))
+
+
+@with_sync_fallback(users.revoke_tokens)
+async def revoke_tokens(db: AsyncSession, user: User) -> User:
+    """
+    The revoke_tokens function increments the token version of a user, so every token issued before is rejected.
+    The cached versions are dropped through the event broker; with the in-process LocalBroker
+    other workers accept the old tokens until TOKEN_VERSION_CACHE_TTL passes.
+
+    :param db: AsyncSession: Pass the database session to the function
+    :param user: User: The user whose tokens are revoked
+    :return: A user object
+    :doc-Author: BGU
+    """
+    await db.execute(update(User).where(User.id == user.id).values(token_version=User.token_version + 1))
+    await db.commit()
+    event_hub.publish(user.id, "revoke", {"email": user.email})
+    return await db.scalar(select(User).where(User.id == user.id).execution_options(populate_existing=True))
@@ -6,18 +6,19 @@ from sqlalchemy.orm import Session
 from src.conf import messages
 from src.database.db import get_db
 from src.schemas import UserCreate, UserResponse, Token, RefreshToken
-from src.services.auth import create_access_token, verify_password, get_password_hash, secret_key, algorithm, \
-    create_refresh_token, get_email_from_token
+from src.services.auth import create_access_token, verify_password_async, get_password_hash_async, secret_key, \
+    algorithm, create_refresh_token, get_email_from_token, token_claims, get_current_user
 
 from src.services.email import send_email
-from src.repository.users import get_user_by_email, register_user, confirm_email
+from src.database.models import User
+from src.repository.users_async import get_user_by_email, register_user, confirm_email, revoke_tokens
 
 
 router = APIRouter(prefix='/auth', tags=['auth'])
 
 
 @router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-def register_user_api(user: UserCreate, bt: BackgroundTasks, request: Request, db: Session = Depends(get_db)):
+async def register_user_api(user: UserCreate, bt: BackgroundTasks, request: Request, db: Session = Depends(get_db)):
     """
     The register_user_api function creates a new user in the database.
 
@@ -28,11 +29,11 @@ def register_user_api(user: UserCreate, bt: BackgroundTasks, request: Request, d
     :return: A user object
     :doc-Author: BGU
     """
-    existing_user = get_user_by_email(db, user.email)
+    existing_user = await get_user_by_email(db, user.email)
     if existing_user:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=messages.ACCOUNT_EXIST)
-    hashed_password = get_password_hash(user.password)
-    new_user = register_user(db, user.username, user.email, hashed_password)
+    hashed_password = await get_password_hash_async(user.password)
+    new_user = await register_user(db, user.username, user.email, hashed_password)
     bt.add_task(send_email, new_user.email, new_user.username, str(request.base_url))
     return new_user
 
@@ -47,13 +48,13 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
     :return: A token
     :doc-Author: BGU
     """
-    user = get_user_by_email(db, form_data.username)
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    user = await get_user_by_email(db, form_data.username)
+    if not user or not await verify_password_async(form_data.password, user.hashed_password):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=messages.INCORRECT_LOGIN)
     if not user.confirmed:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=messages.NOTCONFIRMED)
-    access_token = create_access_token(data={"sub": user.email})
-    refresh_token = create_refresh_token(data={"sub": user.email})
+    access_token = create_access_token(data=token_claims(user))
+    refresh_token = create_refresh_token(data=token_claims(user))
     return {"access_token": access_token, "token_type": "bearer", "refresh_token": refresh_token}
 
 
@@ -79,20 +80,36 @@ async def refresh_access_token(refresh_token: RefreshToken, db: Session = Depend
             raise credentials_exception
 
         # Перевірка, чи користувач існує в базі даних
-        user = get_user_by_email(db, email)
+        user = await get_user_by_email(db, email)
         if not user:
             raise credentials_exception
+        # Відкликані refresh токени мають застарілу версію
+        if payload.get("ver", user.token_version) != user.token_version:
+            raise credentials_exception
 
     except JWTError:
         raise credentials_exception
 
     # Створення нового access токена
-    access_token = create_access_token(data={"sub": email})
+    access_token = create_access_token(data=token_claims(user))
     return {"access_token": access_token, "token_type": "bearer"}
 
 
+@router.post("/revoke", status_code=status.HTTP_204_NO_CONTENT)
+async def revoke_tokens_api(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    """
+    The revoke_tokens_api function signs the user out everywhere: every access and refresh token issued before is rejected.
+
+    :param db: Session: Pass the database session to the function
+    :param current_user: User: Get the current user from the database
+    :return: None
+    :doc-Author: BGU
+    """
+    await revoke_tokens(db, current_user)
+
+
 @router.get('/confirmed_email/{token}')
-def confirmed_email(token: str, db: Session = Depends(get_db)):
+async def confirmed_email(token: str, db: Session = Depends(get_db)):
     """
     The confirmed_email function is used to confirm a user's email address.
 
@@ -102,10 +119,10 @@ def confirmed_email(token: str, db: Session = Depends(get_db)):
     :doc-Author: BGU
     """
     email = get_email_from_token(token)
-    user = get_user_by_email(db, email)  # Перевірка, чи користувач існує в базі даних
+    user = await get_user_by_email(db, email)  # Перевірка, чи користувач існує в базі даних
     if not user:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=messages.VERIFICATION_ERROR)
     if user.confirmed:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=messages.ALREADY_CONFIRMED)
-    confirm_email(db, email)
+    await confirm_email(db, email)
     return {"message": messages.CONFIRMED}
\ No newline at end of file
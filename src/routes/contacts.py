@@ -1,119 +1,362 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request
+from datetime import datetime
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import Optional
+from starlette.concurrency import run_in_threadpool
+from typing import Literal, Optional, Union
 
 from src.conf.limiter_config import limiter
 from src.database.db import get_db
-from src.database.models import User
-from src.repository import contacts
-from src.schemas import ContactResponse, ContactUpdate, ContactSchema
-from src.services.auth import get_current_user
+from src.repository import contacts_async
+from src.repository.contacts import CONTACT_FIELDS, CONTACT_SORT_KEYS, projection
+from src.conf.config import config
+from src.schemas import (BatchResult, ContactBatchUpdate, ContactIds, ContactResponse, ContactUpdate, ContactSchema,
+                         ContactPage, ContactChanges, ImportReport)
+from src.services.auth import Principal, get_current_principal
+from src.services.conditional import (collection_validators, is_not_modified, make_etag, not_modified_response,
+                                      validators)
+from src.services.events import EventHub, get_event_hub
+from src.services.exporter import EXPORT_FORMATS, export_contacts
+from src.services.importer import CSV_CONTENT_TYPES, NDJSON_CONTENT_TYPES, import_contacts
+from src.services.pagination import encode_cursor, decode_cursor
+from src.services.rate_limit import batch_cost, rate_limit_key
+from src.services.serialization import (batch_results, changes_response, page_response, parse_fields, row_response,
+                                        rows_response)
 
 router = APIRouter(prefix="/contacts", tags=['contacts'])
 
+# Ліміт пакетних маршрутів рахується в контактах, тож повний пакет ще проходить
+BATCH_RATE_LIMIT = f"{config.BATCH_MAX_SIZE}/minute"
+
+
+def contact_ids(request: Request, batch: ContactIds) -> list[int]:
+    """
+    The contact_ids dependency parses the IDs of a batch and records its size for batch_cost.
+
+    :param request: Request: The incoming request
+    :param batch: ContactIds: The request body
+    :return: The IDs of the batch
+    :doc-Author: BGU
+    """
+    request.state.batch_size = len(batch.ids)
+    return batch.ids
+
+
+def contact_patches(request: Request, batch: ContactBatchUpdate) -> list[dict]:
+    """
+    The contact_patches dependency parses the partial updates of a batch and records its size for batch_cost.
+
+    :param request: Request: The incoming request
+    :param batch: ContactBatchUpdate: The request body
+    :return: The updates with only the fields sent, and the id
+    :doc-Author: BGU
+    """
+    request.state.batch_size = len(batch.items)
+    return [item.model_dump(exclude_unset=True) for item in batch.items]
+
 
 @router.post("/", response_model=ContactResponse, status_code=status.HTTP_201_CREATED)
-@limiter.limit("10/minute", key_func=lambda request: request.client.host)
-def create_contact(request: Request, contact: ContactSchema, db: Session = Depends(get_db),
-                   current_user: User = Depends(get_current_user)):
+@limiter.limit("10/minute", key_func=rate_limit_key)
+async def create_contact(request: Request, contact: ContactSchema, db: Session = Depends(get_db),
+                         current_user: Principal = Depends(get_current_principal)):
     """
     The create_contact function creates a new contact in the database.
 
     :param request: Request: Get the base url of the application
     :param contact: ContactSchema: Get the data from the request body
     :param db: Session: Pass the database session to the repository
-    :param current_user: User: Get the current user from the database
+    :param current_user: Principal: Get the current user from the access token
     :return: A contact object
     :doc-Author: BGU
     """
-    new_contact = contacts.create_contact(db, contact.model_dump(), current_user.id)
+    new_contact = await contacts_async.create_contact(db, contact.model_dump(), current_user.id)
     if new_contact is None:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Email already exists")
     return new_contact
 
 
-@router.get("/", response_model=list[ContactResponse])
-@limiter.limit("10/minute", key_func=lambda request: request.client.host)
-def get_contacts(request: Request, skip: int = 0, limit: int = 10, db: Session = Depends(get_db),
-                 current_user: User = Depends(get_current_user)):
+@router.post("/import", response_model=ImportReport)
+@limiter.limit("10/minute", key_func=rate_limit_key)
+async def import_contacts_api(request: Request, db: Session = Depends(get_db),
+                              current_user: Principal = Depends(get_current_principal)):
+    """
+    The import_contacts_api function imports contacts from a CSV or NDJSON request body.
+    The body is parsed as it streams in and inserted in batches of IMPORT_BATCH_SIZE.
+
+    :param request: Request: Get the body stream and its content type
+    :param db: Session: Pass the database session to the repository
+    :param current_user: Principal: Get the current user from the access token
+    :return: An import report with per-row errors and throughput
+    :doc-Author: BGU
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type not in CSV_CONTENT_TYPES + NDJSON_CONTENT_TYPES:
+        raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                            detail="Expected text/csv or application/x-ndjson body")
+    return await import_contacts(db, request.stream(), content_type, current_user.id, config.IMPORT_BATCH_SIZE)
+
+
+@router.get("/", response_model=Union[list[ContactResponse], ContactPage])
+@limiter.limit("10/minute", key_func=rate_limit_key)
+async def get_contacts(request: Request, skip: int = 0, limit: int = 10, after: Optional[str] = None,
+                       sort: Literal["id", "last_name"] = "id", fields: Optional[str] = None,
+                       db: Session = Depends(get_db), current_user: Principal = Depends(get_current_principal)):
     """
     The get_contacts function returns a list of contacts.
+    When the after cursor is passed (empty for the first page) it returns a keyset page with next_cursor.
+    A request with the current ETag or Last-Modified gets 304 after one version lookup, without the listing query.
+    Otherwise the listing is served from the query cache, keyed by the same version.
 
     :param request: Request: Get the base url of the application
     :param skip: int: Skip a number of contacts
     :param limit: int: Limit the number of contacts returned
+    :param after: Optional[str]: The next_cursor of the previous page
+    :param sort: str: Sort key of the keyset page
+    :param fields: Optional[str]: Comma-separated fields to return, only these columns are selected
     :param db: Session: Pass the database session to the repository
-    :param current_user: User: Get the current user from the database
-    :return: A list of contacts
+    :param current_user: Principal: Get the current user from the access token
+    :return: A list of contacts or a page of contacts
     :doc-Author: BGU
     """
-    db_contacts = contacts.get_contacts(db, current_user.id, skip, limit)
-    if db_contacts is None:
+    fields = parse_fields(fields)
+    # Версію читаємо до списку: запис між ними дасть старий ETag до нових даних, і клієнт лише перезапитає
+    version = await contacts_async.get_contacts_version(db, current_user.id)
+    headers = collection_validators(current_user.id, version)
+    if is_not_modified(request, headers):
+        return not_modified_response(headers)
+    last_seq = version.last_seq if version is not None else 0
+    if after is not None:
+        rows, next_after = await contacts_async.get_contacts_page_rows(db, current_user.id,
+                                                                       decode_cursor(after, sort, CONTACT_SORT_KEYS[sort]), limit, sort,
+                                                                       projection(fields, sort), version=last_seq)
+        return page_response(rows, encode_cursor(sort, next_after) if next_after else None, fields, headers)
+    rows = await contacts_async.get_contacts_rows(db, current_user.id, skip, limit, projection(fields),
+                                                  version=last_seq)
+    if rows is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Contacts not found")
-    return db_contacts
+    return rows_response(rows, fields, headers)
 
 
 @router.get("/search")
-@limiter.limit("10/minute", key_func=lambda request: request.client.host)
-def search_contacts(request: Request, first_name: Optional[str] = None, last_name: Optional[str] = None, email: Optional[str] = None,
-                    db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+@limiter.limit("10/minute", key_func=rate_limit_key)
+async def search_contacts(request: Request, first_name: Optional[str] = None, last_name: Optional[str] = None, email: Optional[str] = None,
+                          q: Optional[str] = None, after: Optional[str] = None, limit: int = 10, sort: Literal["id", "last_name"] = "id",
+                          fields: Optional[str] = None, db: Session = Depends(get_db),
+                          current_user: Principal = Depends(get_current_principal)):
     """
     The search_contacts function searches for contacts in the database.
+    When the after cursor is passed (empty for the first page) it returns a keyset page with next_cursor.
 
     :param request: Request: Get the base url of the application
     :param first_name: Optional[str]: Filter contacts by first name
     :param last_name: Optional[str]: Filter contacts by last name
     :param email: Optional[str]: Filter contacts by email
+    :param q: Optional[str]: Search all name and email fields, ordered by relevance
+    :param after: Optional[str]: The next_cursor of the previous page
+    :param limit: int: Limit the number of contacts returned in a page
+    :param sort: str: Sort key of the keyset page
+    :param fields: Optional[str]: Comma-separated fields to return, only these columns are selected
     :param db: Session: Pass the database session to the repository
-    :param current_user: User: Get the current user from the database
-    :return: A list of contacts
+    :param current_user: Principal: Get the current user from the access token
+    :return: A list of contacts or a page of contacts
     :doc-Author: BGU
     """
-    db_contact = contacts.search_contacts(db, current_user.id, first_name, last_name, email)
-    if db_contact is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Contact not found")
-    return db_contact
+    fields = parse_fields(fields)
+    if after is not None:
+        rows, next_after = await contacts_async.search_contacts_page_rows(db, current_user.id, first_name,
+                                                                          last_name, email, q,
+                                                                          decode_cursor(after, sort, CONTACT_SORT_KEYS[sort]), limit, sort,
+                                                                          projection(fields, sort))
+        return page_response(rows, encode_cursor(sort, next_after) if next_after else None, fields)
+    rows = await contacts_async.search_contacts_rows(db, current_user.id, first_name, last_name, email, q,
+                                                     projection(fields))
+    return rows_response(rows, fields)
 
 
 @router.get("/birthdays")
-@limiter.limit("10/minute", key_func=lambda request: request.client.host)
-def upcoming_birthdays(request: Request, db: Session = Depends(get_db),
-                       current_user: User = Depends(get_current_user)):
+@limiter.limit("10/minute", key_func=rate_limit_key)
+async def upcoming_birthdays(request: Request, days: int = Query(7, ge=0, le=365), fields: Optional[str] = None,
+                             db: Session = Depends(get_db), current_user: Principal = Depends(get_current_principal)):
     """
     The upcoming_birthdays function returns a list of upcoming birthdays for the specified user.
+    The window moves every day, so the ETag includes the date as well as the collection version.
 
     :param request: Request: Get the base url of the application
+    :param days: int: The length of the window in days, up to 365
+    :param fields: Optional[str]: Comma-separated fields to return, only these columns are selected
     :param db: Session: Pass the database session to the repository
-    :param current_user: User: Get the current user from the database
+    :param current_user: Principal: Get the current user from the access token
     :return: A list of upcoming birthdays
     :doc-Author: BGU
     """
-    return contacts.get_upcoming_birthdays(db, current_user.id)
+    fields = parse_fields(fields)
+    version = await contacts_async.get_contacts_version(db, current_user.id)
+    headers = collection_validators(current_user.id, version, datetime.now().date().isoformat())
+    if is_not_modified(request, headers):
+        return not_modified_response(headers)
+    rows = await contacts_async.get_upcoming_birthdays_rows(db, current_user.id, days,
+                                                            projection(fields),
+                                                            version=version.last_seq if version is not None else 0)
+    return rows_response(rows, fields, headers)
+
+
+@router.get("/changes", response_model=ContactChanges)
+@limiter.limit("10/minute", key_func=rate_limit_key)
+async def get_changes(request: Request, since: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=1000),
+                      db: Session = Depends(get_db), current_user: Principal = Depends(get_current_principal)):
+    """
+    The get_changes function returns the contacts created, updated and deleted after the change number since.
+    A client starts with since=0 and passes next_since of the response until has_more is false.
+
+    :param request: Request: Get the base url of the application
+    :param since: int: The next_since of the previous response
+    :param limit: int: Limit the number of changes returned
+    :param db: Session: Pass the database session to the repository
+    :param current_user: Principal: Get the current user from the access token
+    :return: The changes ordered by seq
+    :doc-Author: BGU
+    """
+    changes, has_more = await contacts_async.get_changes(db, current_user.id, since, limit)
+    return changes_response(changes, since, has_more)
+
+
+@router.get("/stream")
+@limiter.limit("10/minute", key_func=rate_limit_key)
+async def stream_changes(request: Request, last_event_id: Optional[int] = Header(None, ge=0),
+                         db: Session = Depends(get_db), current_user: Principal = Depends(get_current_principal),
+                         hub: EventHub = Depends(get_event_hub)):
+    """
+    The stream_changes function pushes the contact changes of the user as Server-Sent Events instead of polling.
+    A change event has the ContactChange shape and its seq as the id; on a resync event the client
+    fetches GET /contacts/changes after the last id it has applied.
+
+    :param request: Request: Get the base url of the application
+    :param last_event_id: Optional[int]: The Last-Event-ID header of a reconnecting EventSource
+    :param db: Session: The database session of the authentication
+    :param current_user: Principal: Get the current user from the access token
+    :param hub: EventHub: The event hub of the worker
+    :return: A text/event-stream response
+    :doc-Author: BGU
+    """
+    # Потік живе годинами, тож з'єднання, взяте на автентифікацію, одразу повертаємо в пул
+    if isinstance(db, AsyncSession):
+        await db.close()
+    else:
+        await run_in_threadpool(db.close)
+    return StreamingResponse(hub.stream(current_user.id, last_event_id, config.EVENTS_HEARTBEAT,
+                                        current_user.expires_at),
+                             media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@router.get("/export")
+@limiter.limit("10/minute", key_func=rate_limit_key)
+async def export_contacts_api(request: Request, format: Literal["ndjson", "csv", "vcf"] = "ndjson",
+                              db: Session = Depends(get_db), current_user: Principal = Depends(get_current_principal)):
+    """
+    The export_contacts_api function streams all contacts of the user as NDJSON, CSV or vCard.
+
+    :param request: Request: Get the base url of the application
+    :param format: str: The export format
+    :param db: Session: Pass the database session to the repository
+    :param current_user: Principal: Get the current user from the access token
+    :return: A streaming response
+    :doc-Author: BGU
+    """
+    media_type, extension = EXPORT_FORMATS[format]
+    return StreamingResponse(export_contacts(db, current_user.id, format, config.EXPORT_BATCH_SIZE),
+                             media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="contacts.{extension}"'})
+
+
+@router.post("/batch-get", response_model=BatchResult)
+@limiter.limit(BATCH_RATE_LIMIT, key_func=rate_limit_key, cost=batch_cost)
+async def batch_get_contacts(request: Request, ids: list[int] = Depends(contact_ids), db: Session = Depends(get_db),
+                             current_user: Principal = Depends(get_current_principal)):
+    """
+    The batch_get_contacts function returns the contacts with the given ids in one query.
+
+    :param request: Request: Get the base url of the application
+    :param ids: list[int]: The IDs from the request body
+    :param db: Session: Pass the database session to the repository
+    :param current_user: Principal: Get the current user from the access token
+    :return: A result per id: ok with the contact, or not_found
+    :doc-Author: BGU
+    """
+    rows = await contacts_async.get_contacts_by_ids(db, current_user.id, ids)
+    return batch_results(ids, rows, rows)
+
+
+@router.patch("/batch", response_model=BatchResult)
+@limiter.limit(BATCH_RATE_LIMIT, key_func=rate_limit_key, cost=batch_cost)
+async def batch_update_contacts(request: Request, updates: list[dict] = Depends(contact_patches),
+                                db: Session = Depends(get_db),
+                                current_user: Principal = Depends(get_current_principal)):
+    """
+    The batch_update_contacts function applies partial updates to contacts in one transaction.
+    Only the fields sent are changed; an update whose email is taken is skipped with status conflict.
+
+    :param request: Request: Get the base url of the application
+    :param updates: list[dict]: The updates from the request body
+    :param db: Session: Pass the database session to the repository
+    :param current_user: Principal: Get the current user from the access token
+    :return: A result per id: ok with the updated contact, not_found or conflict
+    :doc-Author: BGU
+    """
+    rows, conflicts = await contacts_async.update_contacts(db, current_user.id, updates)
+    return batch_results([item["id"] for item in updates], rows, rows, conflicts)
+
+
+@router.delete("/batch", response_model=BatchResult)
+@limiter.limit(BATCH_RATE_LIMIT, key_func=rate_limit_key, cost=batch_cost)
+async def batch_delete_contacts(request: Request, ids: list[int] = Depends(contact_ids), db: Session = Depends(get_db),
+                                current_user: Principal = Depends(get_current_principal)):
+    """
+    The batch_delete_contacts function deletes the contacts with the given ids in one transaction.
+
+    :param request: Request: Get the base url of the application
+    :param ids: list[int]: The IDs from the request body
+    :param db: Session: Pass the database session to the repository
+    :param current_user: Principal: Get the current user from the access token
+    :return: A result per id: ok or not_found
+    :doc-Author: BGU
+    """
+    deleted = await contacts_async.delete_contacts(db, current_user.id, ids)
+    return batch_results(ids, deleted)
 
 
 @router.get("/{contact_id}", response_model=ContactResponse)
-@limiter.limit("10/minute", key_func=lambda request: request.client.host)
-def get_contact(request: Request, contact_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+@limiter.limit("10/minute", key_func=rate_limit_key)
+async def get_contact(request: Request, contact_id: int, fields: Optional[str] = None, db: Session = Depends(get_db),
+                      current_user: Principal = Depends(get_current_principal)):
     """
     The get_contact function returns a contact object from the database.
 
     :param request: Request: Get the base url of the application
     :param contact_id: int: Specify the id of the contact
+    :param fields: Optional[str]: Comma-separated fields to return, only these columns are selected
     :param db: Session: Pass the database session to the repository
-    :param current_user: User: Get the current user from the database
+    :param current_user: Principal: Get the current user from the access token
     :return: A contact object
     :doc-Author: BGU
     """
-    db_contact = contacts.get_contact(db, current_user.id, contact_id)
-    if db_contact is None:
+    fields = parse_fields(fields)
+    row = await contacts_async.get_versioned_contact_row(db, current_user.id, contact_id, projection(fields))
+    if row is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Contact not found")
-    return db_contact
+    # Версія рядка — його номер зміни; Last-Modified колекції не раніший за зміну рядка
+    headers = validators(make_etag(current_user.id, contact_id, row.seq), row.updated_at)
+    if is_not_modified(request, headers):
+        return not_modified_response(headers)
+    return row_response(row, fields or CONTACT_FIELDS, headers)
 
 
 @router.put("/{contact_id}", response_model=ContactResponse)
-@limiter.limit("10/minute", key_func=lambda request: request.client.host)
-def update_contact(request: Request, contact_id: int, updated_contact: ContactUpdate, db: Session = Depends(get_db),
-                   current_user: User = Depends(get_current_user)):
+@limiter.limit("10/minute", key_func=rate_limit_key)
+async def update_contact(request: Request, contact_id: int, updated_contact: ContactUpdate, db: Session = Depends(get_db),
+                         current_user: Principal = Depends(get_current_principal)):
     """
     The update_contact function updates a contact in the database.
 
@@ -121,32 +364,32 @@ def update_contact(request: Request, contact_id: int, updated_contact: ContactUp
     :param contact_id: int: Specify the id of the contact
     :param updated_contact: ContactUpdate: Update the contact
     :param db: Session: Pass the database session to the repository
-    :param current_user: User: Get the current user from the database
+    :param current_user: Principal: Get the current user from the access token
     :return: A contact object
     :doc-Author: BGU
     """
-    db_contact = contacts.update_contact(db, current_user.id, contact_id,
-                                         updated_contact.model_dump(exclude_unset=True))
+    db_contact = await contacts_async.update_contact(db, current_user.id, contact_id,
+                                                     updated_contact.model_dump(exclude_unset=True))
     if db_contact is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Contact not found")
     return db_contact
 
 
 @router.delete("/{contact_id}", response_model=ContactResponse)
-@limiter.limit("10/minute", key_func=lambda request: request.client.host)
-def delete_contact(request: Request, contact_id: int, db: Session = Depends(get_db),
-                   current_user: User = Depends(get_current_user)):
+@limiter.limit("10/minute", key_func=rate_limit_key)
+async def delete_contact(request: Request, contact_id: int, db: Session = Depends(get_db),
+                         current_user: Principal = Depends(get_current_principal)):
     """
     The delete_contact function deletes a contact from the database.
 
     :param request: Request: Get the base url of the application
     :param contact_id: int: Specify the id of the contact
     :param db: Session: Pass the database session to the repository
-    :param current_user: User: Get the current user from the database
+    :param current_user: Principal: Get the current user from the access token
     :return: A contact object
     :doc-Author: BGU
     """
-    db_contact = contacts.delete_contact(db, current_user.id, contact_id)
+    db_contact = await contacts_async.delete_contact(db, current_user.id, contact_id)
     if db_contact is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Contact not found")
     return db_contact
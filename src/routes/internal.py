@@ -0,0 +1,65 @@
+from fastapi import APIRouter, Depends
+
+from src.database.db import pool_stats
+from src.services.auth import require_internal
+from src.services.cache import contact_queries, principal_cache
+from src.services.email import dispatcher
+from src.services.hashing import hashing_executor
+
+# Службова статистика доступна лише з токеном X-Internal-Token
+router = APIRouter(prefix="/internal", tags=["internal"], dependencies=[Depends(require_internal)])
+
+
+@router.get("/hashing")
+async def hashing_stats():
+    """
+    The hashing_stats function returns the queue depth and latency counters of the bcrypt pool.
+
+    :return: A dictionary of metrics
+    :doc-Author: BGU
+    """
+    return hashing_executor.stats()
+
+
+@router.get("/email")
+async def email_stats():
+    """
+    The email_stats function returns the queue and latency counters of the email dispatcher.
+
+    :return: A dictionary of metrics
+    :doc-Author: BGU
+    """
+    return dispatcher.stats()
+
+
+@router.get("/principals")
+async def principal_cache_stats():
+    """
+    The principal_cache_stats function returns the size and hit/miss counters of the authenticated user cache.
+
+    :return: A dictionary of metrics
+    :doc-Author: BGU
+    """
+    return principal_cache.stats()
+
+
+@router.get("/queries")
+async def query_cache_stats():
+    """
+    The query_cache_stats function returns the size and hit/miss counters of the contact query cache.
+
+    :return: A dictionary of metrics
+    :doc-Author: BGU
+    """
+    return contact_queries.stats()
+
+
+@router.get("/pool")
+async def pool_stats_api():
+    """
+    The pool_stats_api function returns the size, checkout wait times and lifecycle counters of the connection pools.
+
+    :return: A dictionary of metrics
+    :doc-Author: BGU
+    """
+    return pool_stats()
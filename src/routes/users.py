@@ -1,39 +1,39 @@
-import cloudinary
-import cloudinary.uploader
 from fastapi import UploadFile, File, Depends, APIRouter, HTTPException, status, Request
 from sqlalchemy.orm import Session
 
 from src.conf.limiter_config import limiter
 from src.database.db import get_db
 from src.database.models import User
+from src.repository import users_async
 from src.schemas import UserResponse
 from src.conf.config import config
 from src.services.auth import get_current_user
+from src.services.avatar import read_upload, content_hash, process_avatar
+from src.services.rate_limit import rate_limit_key
+from src.services.storage import AvatarStorage, get_avatar_storage
 
 router = APIRouter(prefix="/users", tags=["users"])
 
-cloudinary.config(
-    cloud_name=config.CLD_NAME,
-    api_key=config.CLD_API_KEY,
-    api_secret=config.CLD_API_SECRET,
-)
-
 
 @router.patch("/avatar", response_model=UserResponse)
-@limiter.limit("10/minute", key_func=lambda request: request.client.host)
+@limiter.limit("10/minute", key_func=rate_limit_key)
 async def update_avatar(
     request: Request,
     file: UploadFile = File(...),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
+    storage: AvatarStorage = Depends(get_avatar_storage),
 ):
     """
     The update_avatar function updates the avatar of a user.
+    The image is resized to 250x250 in the threadpool and replaces the previous avatar of the user,
+    the content hash busts the caches of the old one. Re-uploading the same image does not touch the storage.
 
     :param request: Request: Get the base url of the application
     :param file: UploadFile: Upload the avatar
     :param db: Session: Pass the database session to the repository
     :param current_user: User: Get the current user from the database
+    :param storage: AvatarStorage: The avatar storage backend
     :return: A user object
     :doc-Author: BGU
     """
@@ -44,15 +44,12 @@ async def update_avatar(
             status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid file type"
         )
 
-    public_id = f"Web16_BGU/{current_user.email}"
-    result = cloudinary.uploader.upload(file.file, public_id=public_id, overwrite=True)
-
-    # Створюємо URL з визначеними параметрами
-    res_url = cloudinary.CloudinaryImage(public_id).build_url(
-        width=250, height=250, crop="fill", version=result.get("version")
-    )
-    current_user.avatar = res_url
-    db.commit()
-    db.refresh(current_user)
+    data = await read_upload(file, config.AVATAR_MAX_BYTES)
+    avatar_hash = content_hash(data)
+    # Те саме зображення вже завантажене: пропускаємо обробку і сховище
+    if avatar_hash == current_user.avatar_hash and current_user.avatar:
+        return current_user
 
-    return current_user
+    png = await process_avatar(data)
+    res_url = await storage.save(f"{current_user.id}.png", png, "image/png", avatar_hash[:16])
+    return await users_async.update_avatar(db, current_user, res_url, avatar_hash)
@@ -1,8 +1,36 @@
 import re
-from pydantic import BaseModel, EmailStr, constr, validator, field_validator
-from typing import Optional
+from pydantic import BaseModel, EmailStr, Field, constr, validator, field_validator
+from typing import Literal, Optional
 from datetime import date
 
+from src.conf.config import config
+
+
+def check_phone_number(v: str) -> str:
+    """
+    The check_phone_number function validates that the phone number is valid.
+
+    :param v: str: The phone number to be validated
+    :return: The validated phone number
+    :doc-Author: BGU
+    """
+    if not re.match(r"^\+?1?\d{9,15}$", v):
+        raise ValueError("Invalid phone number format")
+    return v
+
+
+def check_unique_ids(ids: list[int]) -> list[int]:
+    """
+    The check_unique_ids function rejects a batch that names a contact twice.
+
+    :param ids: list[int]: The IDs of the batch
+    :return: The IDs
+    :doc-Author: BGU
+    """
+    if len(set(ids)) != len(ids):
+        raise ValueError("Duplicate contact ids")
+    return ids
+
 
 class ContactSchema(BaseModel):
     first_name: str
@@ -23,15 +51,50 @@ class ContactSchema(BaseModel):
         :return: The validated phone number
         :doc-Author: BGU
         """
-        if not re.match(r"^\+?1?\d{9,15}$", v):
-            raise ValueError("Invalid phone number format")
-        return v
+        return check_phone_number(v)
 
 
 class ContactUpdate(ContactSchema):
     pass
 
 
+class ContactPatch(BaseModel):
+    """
+    A partial update of one contact in a batch; only the fields sent are changed.
+    """
+    id: int
+    first_name: str = None
+    last_name: str = None
+    email: EmailStr = None
+    phone_number: str = None
+    birthday: Optional[date] = None
+    additional_data: Optional[str] = None
+
+    @field_validator("phone_number")
+    @classmethod
+    def validate_phone_number(cls, v):
+        return check_phone_number(v)
+
+
+class ContactIds(BaseModel):
+    ids: list[int] = Field(min_length=1, max_length=config.BATCH_MAX_SIZE)
+
+    @field_validator("ids")
+    @classmethod
+    def validate_ids(cls, v):
+        return check_unique_ids(v)
+
+
+class ContactBatchUpdate(BaseModel):
+    items: list[ContactPatch] = Field(min_length=1, max_length=config.BATCH_MAX_SIZE)
+
+    @field_validator("items")
+    @classmethod
+    def validate_items(cls, v):
+        check_unique_ids([item.id for item in v])
+        return v
+
+
 class ContactResponse(BaseModel):
     id: int
     first_name: str
@@ -46,6 +109,48 @@ class ContactResponse(BaseModel):
         from_attributes = True
 
 
+class ContactPage(BaseModel):
+    items: list[ContactResponse]
+    next_cursor: Optional[str] = None
+
+
+class ContactChange(BaseModel):
+    seq: int
+    op: Literal["upsert", "delete"]
+    id: int
+    contact: Optional[ContactResponse] = None
+
+
+class ContactChanges(BaseModel):
+    changes: list[ContactChange]
+    next_since: int
+    has_more: bool
+
+
+class BatchItemResult(BaseModel):
+    id: int
+    status: Literal["ok", "not_found", "conflict"]
+    contact: Optional[ContactResponse] = None
+
+
+class BatchResult(BaseModel):
+    results: list[BatchItemResult]
+
+
+class ImportRowError(BaseModel):
+    row: int
+    error: str
+
+
+class ImportReport(BaseModel):
+    total: int
+    imported: int
+    failed: int
+    errors: list[ImportRowError]
+    seconds: float
+    rows_per_second: float
+
+
 class UserCreate(BaseModel):
     username: str
     email: EmailStr
@@ -1,20 +1,28 @@
 import os
+import secrets
+import time
 from datetime import datetime, timedelta
+from typing import NamedTuple, Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 
-from fastapi import HTTPException, Depends, status
+from fastapi import HTTPException, Depends, Request, status
 from sqlalchemy.orm import Session
+from src.conf.config import config
 from src.database.db import get_db
 from src.database.models import User
+from src.repository import users_async
+from src.services.cache import principal_cache, token_versions
+from src.services.hashing import hashing_executor
 
-from fastapi.security import OAuth2PasswordBearer
+from fastapi.security import APIKeyHeader, OAuth2PasswordBearer
 
 from dotenv import load_dotenv
 
 load_dotenv()
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/auth/token")
+internal_token_scheme = APIKeyHeader(name="X-Internal-Token", auto_error=False)
 
 # Налаштування для хешування паролів
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -23,6 +31,18 @@ secret_key = os.environ.get('SECRET_KEY_JWT')
 algorithm = os.environ.get('ALGORITHM')
 
 
+class Principal(NamedTuple):
+    """
+    The authenticated user as described by the claims of an access token.
+    """
+    id: int
+    email: str
+    confirmed: bool
+    version: int
+    # Час закінчення токена (Unix time), після нього довгі потоки закриваються
+    expires_at: Optional[float] = None
+
+
 def verify_password(plain_password, hashed_password):
     """
     The verify_password function takes in a plain text password and a hashed password
@@ -47,6 +67,31 @@ def get_password_hash(password):
     return pwd_context.hash(password)
 
 
+async def verify_password_async(plain_password, hashed_password):
+    """
+    The verify_password_async function runs verify_password in the bounded hashing pool,
+    so bcrypt never blocks the event loop.
+
+    :param plain_password: The password that the user entered
+    :param hashed_password: The hashed password stored in the database
+    :return: A boolean value
+    :doc-Author: BGU
+    """
+    return await hashing_executor.run(verify_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password):
+    """
+    The get_password_hash_async function runs get_password_hash in the bounded hashing pool,
+    so bcrypt never blocks the event loop.
+
+    :param password: The password to be hashed
+    :return: The hashed password
+    :doc-Author: BGU
+    """
+    return await hashing_executor.run(get_password_hash, password)
+
+
 def authenticate_user(db: Session, email: str, password: str):
     """
     The authenticate_user function takes in an email and password, and returns a user object if the user exists in the database.
@@ -65,6 +110,17 @@ def authenticate_user(db: Session, email: str, password: str):
     return user
 
 
+def token_claims(user: User) -> dict:
+    """
+    The token_claims function returns the claims that identify a user in access and refresh tokens.
+
+    :param user: User: The authenticated user
+    :return: A dictionary of claims
+    :doc-Author: BGU
+    """
+    return {"sub": user.email, "uid": user.id, "confirmed": bool(user.confirmed), "ver": user.token_version}
+
+
 def create_access_token(data: dict, expires_delta: timedelta = None):
     """
     The create_access_token function takes in a data dictionary and an optional expires_delta
@@ -105,10 +161,25 @@ def create_refresh_token(data: dict, expires_delta: timedelta = None):
     return encoded_jwt
 
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+def snapshot_user(user: User) -> dict:
+    """
+    The snapshot_user function copies the column values of a user, so it can be cached across sessions.
+
+    :param user: User: The user loaded from the database
+    :return: A dictionary of column values
+    :doc-Author: BGU
+    """
+    return {column.key: getattr(user, column.key) for column in User.__table__.columns}
+
+
+async def get_current_user(request: Request, token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
     """
     The get_current_user function is used to get the current user from the token.
+    Users are cached by email until the token expires or PRINCIPAL_CACHE_TTL passes,
+    the repository invalidates the entry whenever the user row changes.
+    The subject of the token is kept in request.state.token_subject for the rate limit key.
 
+    :param request: Request: The incoming request
     :param token: str: Get the token from the request
     :param db: Session: Pass the database session to the function
     :return: A user object
@@ -127,10 +198,60 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
     except JWTError:
         raise credentials_exception
 
-    user = db.query(User).filter(User.email == email).first()
-    if user is None:
+    values = principal_cache.get(email)
+    if values is None:
+        user = await users_async.get_user_by_email(db, email)
+        if user is None:
+            raise credentials_exception
+        values = snapshot_user(user)
+        expires_at = time.monotonic() + payload["exp"] - time.time() if "exp" in payload else None
+        principal_cache.set(email, values, expires_at)
+    if payload.get("ver", values["token_version"]) != values["token_version"]:
         raise credentials_exception
-    return user
+    request.state.token_subject = email
+    # Кожен запит отримує власний екземпляр, не прив'язаний до сесії
+    return User(**values)
+
+
+async def get_current_principal(request: Request, token: str = Depends(oauth2_scheme),
+                                db: Session = Depends(get_db)) -> Principal:
+    """
+    The get_current_principal function returns the current user from the claims of the token, without loading the user.
+    Only the token version is compared with the cached version of the user, so a revoked token is rejected.
+    Tokens issued before the claims were added are resolved through get_current_user.
+    The subject of the token is kept in request.state.token_subject for the rate limit key.
+
+    :param request: Request: The incoming request
+    :param token: str: Get the token from the request
+    :param db: Session: Pass the database session to the function
+    :return: A Principal
+    :doc-Author: BGU
+    """
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    try:
+        payload = jwt.decode(token, secret_key, algorithms=[algorithm])
+    except JWTError:
+        raise credentials_exception
+    if payload.get("sub") is None:
+        raise credentials_exception
+    if "uid" not in payload or "ver" not in payload:
+        user = await get_current_user(request, token, db)
+        return Principal(user.id, user.email, bool(user.confirmed), user.token_version, payload.get("exp"))
+
+    version = token_versions.get(payload["uid"])
+    if version is None:
+        version = await users_async.get_token_version(db, payload["uid"])
+        if version is None:
+            raise credentials_exception
+        token_versions.set(payload["uid"], version)
+    if payload["ver"] != version:
+        raise credentials_exception
+    request.state.token_subject = payload["sub"]
+    return Principal(payload["uid"], payload["sub"], bool(payload.get("confirmed")), version, payload.get("exp"))
 
 
 def create_email_token(data: dict):
@@ -167,3 +288,29 @@ def get_email_from_token(token: str) -> str:
         print(e)
         raise HTTPException(status_code=401, detail="Invalid token for email verification")
 
+
+def is_internal_token(token: Optional[str]) -> bool:
+    """
+    The is_internal_token function checks the token of an internal caller (monitoring, operators)
+    against INTERNAL_API_TOKEN in constant time.
+
+    :param token: Optional[str]: The X-Internal-Token header of the request
+    :return: False if the token is missing or wrong, or no INTERNAL_API_TOKEN is configured
+    :doc-Author: BGU
+    """
+    return bool(config.INTERNAL_API_TOKEN and token) and secrets.compare_digest(token, config.INTERNAL_API_TOKEN)
+
+
+async def require_internal(token: Optional[str] = Depends(internal_token_scheme)):
+    """
+    The require_internal function lets only internal callers through to the service endpoints.
+    Without INTERNAL_API_TOKEN the endpoints are disabled and answer 404.
+
+    :param token: Optional[str]: The X-Internal-Token header of the request
+    :return: None
+    :doc-Author: BGU
+    """
+    if not config.INTERNAL_API_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if not is_internal_token(token):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid internal token")
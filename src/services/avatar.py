@@ -0,0 +1,91 @@
+import hashlib
+import io
+from typing import Optional
+
+from fastapi import HTTPException, UploadFile, status
+from PIL import Image, ImageOps, UnidentifiedImageError
+from starlette.concurrency import run_in_threadpool
+
+AVATAR_SIZE = (250, 250)
+CHUNK_SIZE = 64 * 1024
+# Запас на межі та заголовки multipart-форми поверх самого файлу
+FORM_OVERHEAD = 16 * 1024
+
+
+def upload_too_large(content_length: Optional[str], max_bytes: int) -> bool:
+    """
+    The upload_too_large function tells from the Content-Length header whether the form cannot fit the size cap,
+    so the request is rejected before Starlette spools the body. Chunked requests have no Content-Length,
+    read_upload still caps them, but only after the body is spooled.
+
+    :param content_length: Optional[str]: The Content-Length header of the request
+    :param max_bytes: int: The size cap of the file
+    :return: True if the request is too large
+    :doc-Author: BGU
+    """
+    try:
+        return content_length is not None and int(content_length) > max_bytes + FORM_OVERHEAD
+    except ValueError:
+        return False
+
+
+async def read_upload(file: UploadFile, max_bytes: int) -> bytes:
+    """
+    The read_upload function reads an uploaded file in chunks and stops as soon as it exceeds max_bytes.
+
+    :param file: UploadFile: The uploaded file
+    :param max_bytes: int: The size cap
+    :return: The file content
+    :doc-Author: BGU
+    """
+    chunks = []
+    size = 0
+    while chunk := await file.read(CHUNK_SIZE):
+        size += len(chunk)
+        if size > max_bytes:
+            raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                                detail=f"Avatar is larger than {max_bytes} bytes")
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def content_hash(data: bytes) -> str:
+    """
+    The content_hash function returns the SHA-256 hex digest of the uploaded content.
+
+    :param data: bytes: The file content
+    :return: A hex string
+    :doc-Author: BGU
+    """
+    return hashlib.sha256(data).hexdigest()
+
+
+def resize_avatar(data: bytes) -> bytes:
+    """
+    The resize_avatar function decodes an image, crops it to fill 250x250 and encodes it as PNG.
+
+    :param data: bytes: The file content
+    :return: The PNG bytes
+    :doc-Author: BGU
+    """
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image.draft("RGB", AVATAR_SIZE)
+            image = ImageOps.exif_transpose(image)
+            avatar = ImageOps.fit(image.convert("RGBA"), AVATAR_SIZE, Image.LANCZOS)
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid image")
+    output = io.BytesIO()
+    avatar.save(output, format="PNG", optimize=True)
+    return output.getvalue()
+
+
+async def process_avatar(data: bytes) -> bytes:
+    """
+    The process_avatar function resizes the avatar in the threadpool, off the event loop.
+
+    :param data: bytes: The file content
+    :return: The PNG bytes
+    :doc-Author: BGU
+    """
+    return await run_in_threadpool(resize_avatar, data)
@@ -0,0 +1,480 @@
+import asyncio
+import hashlib
+import inspect
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from datetime import date, datetime, timedelta
+from functools import lru_cache, wraps
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+import orjson
+from sqlalchemy.sql.operators import ColumnOperators
+from starlette.concurrency import run_in_threadpool
+
+from src.conf.config import config
+from src.services.metrics import QUERY_CACHE_LOOKUPS
+
+# Позначає відсутній запис, бо None — звичайний результат запиту
+MISSING = object()
+
+
+class TTLCache:
+    """
+    Bounded in-process LRU cache whose entries expire after ttl seconds or at their own deadline, whichever is first.
+    Repository functions may run in the threadpool, so every operation takes a lock.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        The get method returns the cached value, or None if it is missing or expired.
+
+        :param key: Hashable: The cache key
+        :return: The cached value or None
+        :doc-Author: BGU
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[1] <= time.monotonic():
+                if entry is not None:
+                    del self.entries[key]
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key: Hashable, value: Any, expires_at: Optional[float] = None):
+        """
+        The set method caches a value for ttl seconds, or until expires_at if that is sooner.
+
+        :param key: Hashable: The cache key
+        :param value: Any: The value to cache
+        :param expires_at: Optional[float]: A time.monotonic() deadline of the entry
+        :return: None
+        :doc-Author: BGU
+        """
+        deadline = time.monotonic() + self.ttl
+        if expires_at is not None:
+            deadline = min(deadline, expires_at)
+        with self.lock:
+            self.entries[key] = (value, deadline)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        """
+        The invalidate method drops a cached value.
+
+        :param key: Hashable: The cache key
+        :return: None
+        :doc-Author: BGU
+        """
+        with self.lock:
+            if self.entries.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        """
+        The clear method drops all cached values.
+
+        :return: None
+        :doc-Author: BGU
+        """
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self) -> dict:
+        """
+        The stats method returns the size and hit/miss counters of the cache.
+
+        :return: A dictionary of metrics
+        :doc-Author: BGU
+        """
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+@lru_cache(maxsize=None)
+def cached_row_type(fields: tuple) -> type:
+    """
+    The cached_row_type function returns a named tuple type with the row interface used by the serializers:
+    attribute access, _fields, _asdict() and _mapping.
+
+    :param fields: tuple: The column names of the rows
+    :return: A named tuple class
+    :doc-Author: BGU
+    """
+    return type("CachedRow", (namedtuple("CachedRow", fields),),
+                {"__slots__": (), "_mapping": property(lambda row: row._asdict())})
+
+
+# Типи значень, які JSON не зберігає, та їх відновлення з рядків ISO 8601
+TEMPORAL_TYPES = {"datetime": datetime.fromisoformat, "date": date.fromisoformat}
+
+
+def dump_result(value: Any) -> bytes:
+    """
+    The dump_result function encodes a query result with orjson: None, a list of Core rows,
+    a tuple of results (a keyset page) or plain JSON values. Rows keep their column names and date types.
+
+    :param value: Any: The result of a cached query
+    :return: JSON bytes
+    :doc-Author: BGU
+    """
+    def encode(item):
+        if isinstance(item, list) and item and hasattr(item[0], "_fields"):
+            fields = list(item[0]._fields)
+            types = {}
+            for index in range(len(fields)):
+                sample = next((row[index] for row in item if row[index] is not None), None)
+                if isinstance(sample, datetime):
+                    types[index] = "datetime"
+                elif isinstance(sample, date):
+                    types[index] = "date"
+            return {"fields": fields, "types": types, "rows": [tuple(row) for row in item]}
+        if isinstance(item, tuple):
+            return {"tuple": [encode(part) for part in item]}
+        return {"value": item}
+
+    return orjson.dumps(encode(value), option=orjson.OPT_NON_STR_KEYS)
+
+
+def load_result(data: bytes) -> Any:
+    """
+    The load_result function decodes a result encoded by dump_result, rows come back as CachedRow tuples.
+
+    :param data: bytes: JSON bytes
+    :return: The query result
+    :doc-Author: BGU
+    """
+    def decode(item):
+        if "rows" in item:
+            row_type = cached_row_type(tuple(item["fields"]))
+            parsers = {int(index): TEMPORAL_TYPES[name] for index, name in item["types"].items()}
+            return [row_type(*(parsers[index](value) if index in parsers and value is not None else value
+                               for index, value in enumerate(row))) for row in item["rows"]]
+        if "tuple" in item:
+            return tuple(decode(part) for part in item["tuple"])
+        return item["value"]
+
+    return decode(orjson.loads(data))
+
+
+class RedisQueryBackend:
+    """
+    Shared second level of QueryCache, so workers on several hosts reuse each other's results.
+    Results are stored as JSON (see dump_result), never pickled, so a writable Redis cannot run code in the workers;
+    any client with the redis-py interface works.
+    """
+
+    def __init__(self, client, prefix: str = "query_cache"):
+        self.client = client
+        self.prefix = prefix
+
+    def name(self, user_id: int, key: Hashable) -> str:
+        return f"{self.prefix}:{user_id}:{hashlib.sha1(repr(key).encode()).hexdigest()}"
+
+    def get(self, user_id: int, key: Hashable) -> Any:
+        """
+        The get method returns the shared result, or MISSING.
+
+        :param user_id: int: The user of the result
+        :param key: Hashable: The query key
+        :return: The cached value or MISSING
+        :doc-Author: BGU
+        """
+        data = self.client.get(self.name(user_id, key))
+        return MISSING if data is None else load_result(data)
+
+    def set(self, user_id: int, key: Hashable, value: Any, ttl: float):
+        """
+        The set method shares a result for ttl seconds.
+
+        :param user_id: int: The user of the result
+        :param key: Hashable: The query key
+        :param value: Any: The result to share
+        :param ttl: float: Seconds to keep the result
+        :return: None
+        :doc-Author: BGU
+        """
+        self.client.set(self.name(user_id, key), dump_result(value), px=max(int(ttl * 1000), 1))
+
+
+class QueryCache:
+    """
+    Read-through cache of the query results of each user, with two LRU levels: users, and the queries of a user.
+    Keys include the change number of the user (see get_contacts_version), so a result read before a write
+    is never served after it, in any worker. A write also drops the results of the user in this worker at once.
+    Concurrent misses of one key share one load (single flight).
+    """
+
+    def __init__(self, maxsize: int, per_user: int, ttl: float, shared: Optional[RedisQueryBackend] = None):
+        self.maxsize = maxsize
+        self.per_user = per_user
+        self.ttl = ttl
+        self.shared = shared
+        # id користувача -> OrderedDict(ключ запиту -> (результат, дедлайн time.monotonic()))
+        self.users = OrderedDict()
+        # Завантаження, що виконуються зараз; їх чекають лише в циклі подій, тож блокування не потрібне
+        self.loading = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.invalidations = 0
+
+    def get(self, user_id: int, key: Hashable) -> Any:
+        """
+        The get method returns the cached result of a query, or MISSING if it is missing or expired.
+
+        :param user_id: int: The user of the result
+        :param key: Hashable: The query key
+        :return: The cached value or MISSING
+        :doc-Author: BGU
+        """
+        with self.lock:
+            queries = self.users.get(user_id)
+            entry = None if queries is None else queries.get(key)
+            if entry is None:
+                return MISSING
+            if entry[1] <= time.monotonic():
+                del queries[key]
+                return MISSING
+            self.users.move_to_end(user_id)
+            queries.move_to_end(key)
+            return entry[0]
+
+    def set(self, user_id: int, key: Hashable, value: Any, expires_at: Optional[float] = None):
+        """
+        The set method caches the result of a query for ttl seconds, or until expires_at if that is sooner.
+
+        :param user_id: int: The user of the result
+        :param key: Hashable: The query key
+        :param value: Any: The result to cache
+        :param expires_at: Optional[float]: A time.monotonic() deadline of the entry
+        :return: None
+        :doc-Author: BGU
+        """
+        deadline = time.monotonic() + self.ttl
+        if expires_at is not None:
+            deadline = min(deadline, expires_at)
+        with self.lock:
+            queries = self.users.get(user_id)
+            if queries is None:
+                queries = self.users[user_id] = OrderedDict()
+            queries[key] = (value, deadline)
+            queries.move_to_end(key)
+            self.users.move_to_end(user_id)
+            if len(queries) > self.per_user:
+                queries.popitem(last=False)
+            while len(self.users) > self.maxsize:
+                self.users.popitem(last=False)
+
+    def invalidate_user(self, user_id: int):
+        """
+        The invalidate_user method drops all cached results of a user in this worker.
+        Other workers and the shared backend miss by the new change number in the key.
+
+        :param user_id: int: The user whose contacts changed
+        :return: None
+        :doc-Author: BGU
+        """
+        with self.lock:
+            if self.users.pop(user_id, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        """
+        The clear method drops all cached results.
+
+        :return: None
+        :doc-Author: BGU
+        """
+        with self.lock:
+            self.users.clear()
+
+    async def get_or_load(self, user_id: int, key: Hashable, load: Callable[[], Awaitable],
+                          expires_at: Optional[float] = None, query: str = "query") -> Any:
+        """
+        The get_or_load method returns the cached result of a query, or loads it once for all concurrent callers.
+        If the request that runs the load is cancelled, a waiting caller runs the load itself.
+
+        :param user_id: int: The user of the result
+        :param key: Hashable: The query key
+        :param load: Callable: Returns an awaitable of the result
+        :param expires_at: Optional[float]: A time.monotonic() deadline of the result
+        :param query: str: The query name for metrics
+        :return: The result
+        :doc-Author: BGU
+        """
+        value = self.get(user_id, key)
+        if value is not MISSING:
+            self.hits += 1
+            QUERY_CACHE_LOOKUPS.labels(query, "hit").inc()
+            return value
+        flight = (user_id, key)
+        while flight in self.loading:
+            task = self.loading[flight]
+            self.coalesced += 1
+            QUERY_CACHE_LOOKUPS.labels(query, "coalesced").inc()
+            try:
+                return await asyncio.shield(task)
+            except asyncio.CancelledError:
+                # Скасовано запит, що завантажував, а не цей — пробуємо знову
+                if not task.cancelled() or asyncio.current_task().cancelling():
+                    raise
+        task = asyncio.ensure_future(self.load(user_id, key, load, expires_at, query))
+        self.loading[flight] = task
+        task.add_done_callback(lambda _: self.loading.pop(flight, None) if self.loading.get(flight) is task else None)
+        return await task
+
+    async def load(self, user_id: int, key: Hashable, load: Callable[[], Awaitable], expires_at: Optional[float],
+                   query: str) -> Any:
+        if self.shared is not None:
+            value = await run_in_threadpool(self.shared.get, user_id, key)
+            if value is not MISSING:
+                self.shared_hits += 1
+                QUERY_CACHE_LOOKUPS.labels(query, "shared_hit").inc()
+                self.set(user_id, key, value, expires_at)
+                return value
+        self.misses += 1
+        QUERY_CACHE_LOOKUPS.labels(query, "miss").inc()
+        value = await load()
+        self.set(user_id, key, value, expires_at)
+        if self.shared is not None:
+            ttl = self.ttl if expires_at is None else min(self.ttl, expires_at - time.monotonic())
+            if ttl > 0:
+                await run_in_threadpool(self.shared.set, user_id, key, value, ttl)
+        return value
+
+    def stats(self) -> dict:
+        """
+        The stats method returns the size and hit/miss counters of the cache.
+
+        :return: A dictionary of metrics
+        :doc-Author: BGU
+        """
+        lookups = self.hits + self.shared_hits + self.misses + self.coalesced
+        with self.lock:
+            size = sum(len(queries) for queries in self.users.values())
+        return {
+            "users": len(self.users),
+            "size": size,
+            "maxsize": self.maxsize,
+            "per_user": self.per_user,
+            "ttl": self.ttl,
+            "shared": self.shared is not None,
+            "hits": self.hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_ratio": round((self.hits + self.shared_hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+            "invalidations": self.invalidations,
+        }
+
+
+def freeze(value: Any) -> Hashable:
+    """
+    The freeze function turns query parameters into a hashable key: lists become tuples and columns their names.
+
+    :param value: Any: A query parameter
+    :return: A hashable value
+    :doc-Author: BGU
+    """
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    if isinstance(value, ColumnOperators):
+        # Колонки перевизначають ==, тож у ключі лише їхні назви
+        return str(value)
+    return value
+
+
+def until_midnight() -> float:
+    """
+    The until_midnight function returns the time.monotonic() deadline of the next local midnight,
+    when date-dependent results such as upcoming birthdays go stale.
+
+    :return: A time.monotonic() deadline
+    :doc-Author: BGU
+    """
+    now = datetime.now()
+    midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+    return time.monotonic() + (midnight - now).total_seconds()
+
+
+def cached_query(cache: QueryCache, name: str, until: Optional[Callable[[], float]] = None):
+    """
+    The cached_query decorator caches an async repository function (db, user_id, ...) by (user_id, query, params).
+    The caller passes the change number of the user as version; without it the cache is bypassed,
+    since a key without the version could outlive a write in another worker.
+
+    :param cache: QueryCache: The cache to use
+    :param name: str: The query name, part of the key and the metrics label
+    :param until: Optional[Callable]: Returns a time.monotonic() deadline of a result, e.g. until_midnight
+    :return: A decorator
+    :doc-Author: BGU
+    """
+    def decorator(fn: Callable):
+        signature = inspect.signature(fn)
+
+        @wraps(fn)
+        async def wrapper(db, user_id: int, *args, version: Optional[int] = None, **kwargs):
+            if version is None:
+                return await fn(db, user_id, *args, **kwargs)
+            # Дедлайн рахуємо до запиту: результат, прочитаний після півночі, лише раніше застаріє
+            expires_at = until() if until is not None else None
+            bound = signature.bind(db, user_id, *args, **kwargs)
+            bound.apply_defaults()
+            params = tuple((param, freeze(value)) for param, value in list(bound.arguments.items())[2:])
+            return await cache.get_or_load(user_id, (version, name, params), lambda: fn(db, user_id, *args, **kwargs),
+                                           expires_at, name)
+        return wrapper
+    return decorator
+
+
+def redis_query_backend(url: Optional[str]) -> Optional[RedisQueryBackend]:
+    """
+    The redis_query_backend function connects the shared query cache, if QUERY_CACHE_REDIS_URL is set.
+
+    :param url: Optional[str]: The Redis URL
+    :return: A RedisQueryBackend or None
+    :doc-Author: BGU
+    """
+    if not url:
+        return None
+    import redis
+    return RedisQueryBackend(redis.Redis.from_url(url))
+
+
+# Автентифіковані користувачі за email (sub токена)
+principal_cache = TTLCache(maxsize=config.PRINCIPAL_CACHE_SIZE, ttl=config.PRINCIPAL_CACHE_TTL)
+
+# Поточна версія токенів за id користувача
+token_versions = TTLCache(maxsize=config.PRINCIPAL_CACHE_SIZE, ttl=config.TOKEN_VERSION_CACHE_TTL)
+
+# Результати запитів контактів за користувачем, запитом і параметрами
+contact_queries = QueryCache(maxsize=config.QUERY_CACHE_USERS, per_user=config.QUERY_CACHE_PER_USER,
+                             ttl=config.QUERY_CACHE_TTL, shared=redis_query_backend(config.QUERY_CACHE_REDIS_URL))
@@ -0,0 +1,151 @@
+import zlib
+from typing import Optional
+
+import brotli
+from starlette.datastructures import Headers, MutableHeaders
+
+# Порядок переваги, якщо клієнт приймає обидва кодування з однаковою вагою
+ENCODINGS = ("br", "gzip")
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "application/javascript", "application/xml",
+                      "image/svg+xml")
+
+# Події SSE мають доходити до клієнта одразу, тому потік подій не стискаємо
+EXCLUDED_TYPES = ("text/event-stream",)
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """
+    The negotiate_encoding function picks the content coding from an Accept-Encoding header.
+    The coding with the highest q-value wins, ties go to the order of ENCODINGS; q=0 refuses a coding.
+
+    :param accept_encoding: str: The Accept-Encoding header of the request
+    :return: The coding name, or None to send the body uncompressed
+    :doc-Author: BGU
+    """
+    weights = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        weight = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[name] = weight
+    best, best_weight = None, 0.0
+    for encoding in ENCODINGS:
+        weight = weights.get(encoding, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+
+def compressible(content_type: str) -> bool:
+    """
+    The compressible function tells whether a media type benefits from compression.
+    Images, archives and other already compressed bodies are sent as is.
+
+    :param content_type: str: The Content-Type header of the response
+    :return: True for text, JSON and XML bodies
+    :doc-Author: BGU
+    """
+    media_type = content_type.split(";")[0].strip().lower()
+    if media_type in EXCLUDED_TYPES:
+        return False
+    return (media_type.startswith("text/") or media_type in COMPRESSIBLE_TYPES
+            or media_type.endswith("+json") or media_type.endswith("+xml"))
+
+
+class Compressor:
+    """
+    Incremental gzip or brotli encoder. Every chunk is flushed, so streamed responses reach the client as they go.
+    """
+
+    def __init__(self, encoding: str, gzip_level: int = 6, brotli_quality: int = 4):
+        self.encoding = encoding
+        if encoding == "br":
+            self.encoder = brotli.Compressor(quality=brotli_quality)
+        else:
+            # wbits 16 + 15: формат gzip замість zlib
+            self.encoder = zlib.compressobj(gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self.encoder.process(data) + self.encoder.flush()
+        return self.encoder.compress(data) + self.encoder.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        if self.encoding == "br":
+            return self.encoder.process(data) + self.encoder.finish()
+        return self.encoder.compress(data) + self.encoder.flush()
+
+
+class CompressionMiddleware:
+    """
+    Pure ASGI middleware that compresses responses with gzip or brotli negotiated from Accept-Encoding.
+    Bodies smaller than minimum_size, already encoded bodies, binary media types and event streams are sent as is.
+    """
+
+    def __init__(self, app, minimum_size: int = 500, gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        compressor = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start_message, compressor, passthrough
+            if message["type"] not in ("http.response.start", "http.response.body"):
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                # Заголовки відправляємо разом з першим шматком тіла, коли вже відомо, чи стискати
+                start_message = message
+                return
+            if passthrough:
+                await send(message)
+                return
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if compressor is None:
+                headers = Headers(raw=start_message["headers"])
+                if ("content-encoding" in headers or not compressible(headers.get("content-type", ""))
+                        or (not more_body and len(body) < self.minimum_size)):
+                    passthrough = True
+                    await send(start_message)
+                    await send(message)
+                    return
+                compressor = Compressor(encoding, self.gzip_level, self.brotli_quality)
+                headers = MutableHeaders(raw=list(start_message["headers"]))
+                headers["content-encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+                del headers["content-length"]
+                if not more_body:
+                    body = compressor.finish(body)
+                    headers["content-length"] = str(len(body))
+                    await send({**start_message, "headers": headers.raw})
+                    await send({"type": "http.response.body", "body": body})
+                    return
+                await send({**start_message, "headers": headers.raw})
+            body = compressor.compress(body) if more_body else compressor.finish(body)
+            await send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
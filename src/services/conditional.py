@@ -0,0 +1,101 @@
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+
+from fastapi import Request, Response, status
+
+
+def make_etag(*parts) -> str:
+    """
+    The make_etag function builds a weak entity tag from version parts.
+    It is weak because the compression middleware may send the same JSON in different encodings.
+
+    :param parts: The parts that identify the version of the representation
+    :return: An ETag header value
+    :doc-Author: BGU
+    """
+    return 'W/"' + "-".join(str(part) for part in parts) + '"'
+
+
+def validators(etag: str, last_modified: Optional[datetime] = None) -> dict:
+    """
+    The validators function returns the validator headers of a response.
+    Responses are per user, so shared caches must not store them and clients revalidate every time.
+
+    :param etag: str: The ETag of the representation
+    :param last_modified: Optional[datetime]: The time of the last change, naive values are UTC
+    :return: A dictionary of headers
+    :doc-Author: BGU
+    """
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if last_modified is not None:
+        headers["Last-Modified"] = format_datetime(to_utc(last_modified).replace(microsecond=0), usegmt=True)
+    return headers
+
+
+def to_utc(moment: datetime) -> datetime:
+    """
+    The to_utc function converts the time of a change to aware UTC.
+    PostgreSQL returns timestamptz in the time zone of the session; SQLite keeps no zone,
+    and its CURRENT_TIMESTAMP is UTC.
+
+    :param moment: datetime: The time read from the database
+    :return: An aware UTC datetime
+    :doc-Author: BGU
+    """
+    if moment.tzinfo is None:
+        return moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(timezone.utc)
+
+
+def collection_validators(user_id: int, version, *parts) -> dict:
+    """
+    The collection_validators function returns the validator headers of a listing of the user's contacts.
+
+    :param user_id: int: The user of the listing
+    :param version: Row: The row of get_contacts_version, None if the user has never changed a contact
+    :param parts: Other inputs of the representation that change without a write, e.g. the current date
+    :return: A dictionary of headers
+    :doc-Author: BGU
+    """
+    if version is None:
+        return validators(make_etag(user_id, 0, *parts))
+    return validators(make_etag(user_id, version.last_seq, *parts), version.updated_at)
+
+
+def is_not_modified(request: Request, headers: dict) -> bool:
+    """
+    The is_not_modified function evaluates If-None-Match, or If-Modified-Since when there is no If-None-Match.
+    Entity tags are compared weakly. Last-Modified has a resolution of one second,
+    so clients that need every change should revalidate with the ETag.
+
+    :param request: Request: The conditional request
+    :param headers: dict: The validator headers of the current representation
+    :return: True if the client already has the current representation
+    :doc-Author: BGU
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in tags or headers["ETag"].removeprefix("W/") in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is None or "Last-Modified" not in headers:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return parsedate_to_datetime(headers["Last-Modified"]) <= since
+
+
+def not_modified_response(headers: dict) -> Response:
+    """
+    The not_modified_response function returns 304 Not Modified with the validators and no body.
+
+    :param headers: dict: The validator headers of the current representation
+    :return: A 304 response
+    :doc-Author: BGU
+    """
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
@@ -1,11 +1,18 @@
+import asyncio
+import logging
+import time
+from email.message import EmailMessage
 from pathlib import Path
 
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig, MessageType
-from fastapi_mail.errors import ConnectionErrors
+import aiosmtplib
+from fastapi_mail import ConnectionConfig
 from pydantic import EmailStr
 
 from src.conf.config import config
 from src.services.auth import create_email_token
+from src.services.metrics import EMAIL_FAILED, EMAIL_QUEUE_DEPTH, EMAIL_SENT
+
+logger = logging.getLogger(__name__)
 
 conf = ConnectionConfig(
     MAIL_USERNAME=config.MAIL_USERNAME,
@@ -21,10 +28,199 @@ conf = ConnectionConfig(
     TEMPLATE_FOLDER=Path(__file__).parent / 'templates',
 )
 
+# Одне середовище Jinja на процес: скомпільовані шаблони кешуються в ньому
+templates = conf.template_engine()
+
+
+class EmailDispatcher:
+    """
+    In-process email queue.
+    Each worker keeps one persistent SMTP connection, reconnects when it drops,
+    sends the queued messages over it one after another and retries failed sends with exponential backoff.
+    """
+
+    def __init__(self, hostname: str, port: int, username: str = None, password: str = None,
+                 use_tls: bool = False, start_tls: bool = False, validate_certs: bool = True,
+                 workers: int = 2, queue_size: int = 1000,
+                 max_retries: int = 3, backoff: float = 1.0, timeout: float = 30):
+        self.smtp_options = dict(hostname=hostname, port=port, use_tls=use_tls, start_tls=start_tls,
+                                 validate_certs=validate_certs, timeout=timeout)
+        self.username = username
+        self.password = password
+        self.workers = workers
+        self.queue_size = queue_size
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.queue = None
+        self.loop = None
+        self.tasks = []
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.connections = 0
+        self.send_seconds_total = 0.0
+        self.delivery_seconds_total = 0.0
+        self.delivery_seconds_max = 0.0
+
+    async def start(self):
+        """
+        The start method starts the worker tasks, once per event loop.
+
+        :return: None
+        :doc-Author: BGU
+        """
+        if self.tasks and self.loop is asyncio.get_running_loop():
+            return
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(self.queue_size)
+        self.tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self, timeout: float = 10):
+        """
+        The stop method waits up to timeout seconds for the queue to drain and stops the workers.
+
+        :param timeout: float: How long to wait for queued messages
+        :return: None
+        :doc-Author: BGU
+        """
+        if not self.tasks:
+            return
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Email queue stopped with %s unsent messages", self.queue.qsize())
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    async def enqueue(self, message: EmailMessage):
+        """
+        The enqueue method puts a message in the queue, waiting while the queue is full.
+
+        :param message: EmailMessage: The message to send
+        :return: None
+        :doc-Author: BGU
+        """
+        await self.start()
+        await self.queue.put((message, time.perf_counter()))
+        EMAIL_QUEUE_DEPTH.inc()
+
+    async def _worker(self):
+        client = None
+        try:
+            while True:
+                message, enqueued = await self.queue.get()
+                try:
+                    client = await self._deliver(client, message)
+                except Exception:
+                    # Непередбачена помилка одного листа не повинна зупиняти воркер і вішати stop()
+                    self.failed += 1
+                    EMAIL_FAILED.inc()
+                    logger.exception("Email to %s failed", message["To"])
+                    if client is not None:
+                        client.close()
+                        client = None
+                finally:
+                    elapsed = time.perf_counter() - enqueued
+                    self.delivery_seconds_total += elapsed
+                    self.delivery_seconds_max = max(self.delivery_seconds_max, elapsed)
+                    self.queue.task_done()
+                    EMAIL_QUEUE_DEPTH.dec()
+        finally:
+            if client is not None:
+                client.close()
+
+    async def _connect(self) -> aiosmtplib.SMTP:
+        client = aiosmtplib.SMTP(**self.smtp_options)
+        await client.connect()
+        if self.username:
+            await client.login(self.username, self.password)
+        self.connections += 1
+        return client
+
+    async def _deliver(self, client, message: EmailMessage):
+        for attempt in range(self.max_retries + 1):
+            try:
+                if client is None or not client.is_connected:
+                    client = await self._connect()
+                started = time.perf_counter()
+                await client.send_message(message)
+                self.send_seconds_total += time.perf_counter() - started
+                self.sent += 1
+                EMAIL_SENT.inc()
+                return client
+            except (aiosmtplib.SMTPException, OSError) as err:
+                if client is not None:
+                    client.close()
+                    client = None
+                if attempt == self.max_retries:
+                    self.failed += 1
+                    EMAIL_FAILED.inc()
+                    logger.error("Email to %s failed after %s attempts: %s", message["To"], attempt + 1, err)
+                    return client
+                self.retried += 1
+                await asyncio.sleep(self.backoff * 2 ** attempt)
+        return client
+
+    def stats(self) -> dict:
+        """
+        The stats method returns the queue and latency counters of the dispatcher.
+
+        :return: A dictionary of metrics
+        :doc-Author: BGU
+        """
+        return {
+            "queue_depth": self.queue.qsize() if self.queue else 0,
+            "workers": len(self.tasks),
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+            "connections": self.connections,
+            "send_seconds_total": round(self.send_seconds_total, 6),
+            "delivery_seconds_total": round(self.delivery_seconds_total, 6),
+            "delivery_seconds_max": round(self.delivery_seconds_max, 6),
+        }
+
+
+dispatcher = EmailDispatcher(
+    hostname=conf.MAIL_SERVER,
+    port=conf.MAIL_PORT,
+    username=conf.MAIL_USERNAME if conf.USE_CREDENTIALS else None,
+    password=conf.MAIL_PASSWORD if conf.USE_CREDENTIALS else None,
+    use_tls=conf.MAIL_SSL_TLS,
+    start_tls=conf.MAIL_STARTTLS,
+    validate_certs=conf.VALIDATE_CERTS,
+    timeout=conf.TIMEOUT,
+    workers=config.MAIL_POOL_SIZE,
+    queue_size=config.MAIL_QUEUE_SIZE,
+    max_retries=config.MAIL_MAX_RETRIES,
+)
+
+
+def build_message(recipient: str, subject: str, template_name: str, **context) -> EmailMessage:
+    """
+    The build_message function renders a cached template into an HTML email.
+
+    :param recipient: str: The recipient address
+    :param subject: str: The subject of the email
+    :param template_name: str: The template file name
+    :param context: The template variables
+    :return: An EmailMessage
+    :doc-Author: BGU
+    """
+    message = EmailMessage()
+    message["Subject"] = subject
+    message["From"] = f"{conf.MAIL_FROM_NAME} <{conf.MAIL_FROM}>"
+    message["To"] = recipient
+    message.set_content(templates.get_template(template_name).render(**context), subtype="html")
+    return message
+
 
 async def send_email(email: EmailStr, username: str, host: str):
     """
-    The send_email function takes in an email address, a username, and a host.
+    The send_email function takes in an email address, a username, and a host,
+    and queues the verification email for the dispatcher.
 
     :param email: EmailStr: Specify the type of email address
     :param username: str: Store the username of the user
@@ -32,17 +228,7 @@ async def send_email(email: EmailStr, username: str, host: str):
     :return: A coroutine object
     :doc-Author: BGU
     """
-    try:
-        token_verification = create_email_token({"sub": email})
-        message = MessageSchema(
-            subject="Confirm your email ",
-            recipients=[email],
-            template_body={"host": host, "username": username, "token": token_verification},
-            subtype=MessageType.html
-        )
-
-        fm = FastMail(conf)
-        await fm.send_message(message, template_name="verify_email.html")
-    except ConnectionErrors as err:
-        print(err)
-
+    token_verification = create_email_token({"sub": email})
+    message = build_message(email, "Confirm your email ", "verify_email.html",
+                            host=host, username=username, token=token_verification)
+    await dispatcher.enqueue(message)
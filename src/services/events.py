@@ -0,0 +1,289 @@
+import asyncio
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+import orjson
+
+from src.conf.config import config
+from src.services.cache import principal_cache, token_versions
+from src.services.metrics import EVENT_SUBSCRIBERS, EVENTS_DROPPED
+
+# Через скільки мілісекунд EventSource перепідключається після обриву
+RETRY_MS = 3000
+
+KEEPALIVE = b": keepalive\n\n"
+
+
+def encode_event(event: str, data: dict, seq: Optional[int] = None) -> bytes:
+    """
+    The encode_event function encodes one Server-Sent Events frame.
+    Only changes carry an id, so Last-Event-ID of a reconnecting client is the last change it has applied.
+
+    :param event: str: The event type, "change" or "resync"
+    :param data: dict: The payload, encoded as one line of JSON
+    :param seq: Optional[int]: The change number sent as the event id
+    :return: The frame bytes
+    :doc-Author: BGU
+    """
+    frame = b"" if seq is None else b"id: %d\n" % seq
+    return frame + b"event: " + event.encode() + b"\ndata: " + orjson.dumps(data) + b"\n\n"
+
+
+class EventBroker(ABC):
+    """
+    Base class of the brokers that carry contact events and token revocations to the hubs of all workers.
+    A broker calls deliver(user_id, event, data, seq) in every worker for every published event;
+    a networked broker (Redis pub/sub, PostgreSQL LISTEN/NOTIFY) encodes the event with orjson
+    and subscribes to its channel in start.
+    """
+
+    def __init__(self):
+        self.deliver = None
+
+    def attach(self, deliver: Callable[[int, str, dict, Optional[int]], None]):
+        """
+        The attach method sets the callback that hands delivered events to the hub of this worker.
+
+        :param deliver: Callable: The deliver method of the hub
+        :return: None
+        :doc-Author: BGU
+        """
+        self.deliver = deliver
+
+    @abstractmethod
+    def publish(self, user_id: int, event: str, data: dict, seq: Optional[int] = None):
+        """
+        The publish method sends an event to all workers. It is called from the event loop
+        and from the threadpool, so it must not block.
+
+        :param user_id: int: The user the event belongs to
+        :param event: str: The event type
+        :param data: dict: The payload
+        :param seq: Optional[int]: The change number of the event
+        :return: None
+        :doc-Author: BGU
+        """
+
+    async def start(self):
+        """
+        The start method connects the broker and subscribes to its channel. The local broker has nothing to start.
+
+        :return: None
+        :doc-Author: BGU
+        """
+
+    async def stop(self):
+        """
+        The stop method unsubscribes and closes the connection of the broker.
+
+        :return: None
+        :doc-Author: BGU
+        """
+
+
+class LocalBroker(EventBroker):
+    """
+    In-memory broker of a single worker: a published event goes straight to the hub of this process.
+    """
+
+    def publish(self, user_id: int, event: str, data: dict, seq: Optional[int] = None):
+        """
+        The publish method delivers the event to the hub of this worker right away.
+
+        :param user_id: int: The user the event belongs to
+        :param event: str: The event type
+        :param data: dict: The payload
+        :param seq: Optional[int]: The change number of the event
+        :return: None
+        :doc-Author: BGU
+        """
+        self.deliver(user_id, event, data, seq)
+
+
+class Subscription:
+    """
+    One open event stream. Frames wait in a buffer of at most buffer_size entries; when a slow client lets it fill up,
+    the buffer is replaced by a single resync event and the client catches up from GET /contacts/changes.
+    """
+
+    def __init__(self, user_id: int, buffer_size: int):
+        self.user_id = user_id
+        self.buffer_size = buffer_size
+        self.loop = asyncio.get_running_loop()
+        self.frames = deque()
+        self.ready = asyncio.Event()
+        self.closed = False
+
+    def push(self, seq: Optional[int], frame: bytes):
+        """
+        The push method buffers a frame. It runs in the event loop of the stream.
+
+        :param seq: Optional[int]: The change number of the frame
+        :param frame: bytes: The encoded SSE frame
+        :return: None
+        :doc-Author: BGU
+        """
+        if len(self.frames) >= self.buffer_size:
+            EVENTS_DROPPED.inc(len(self.frames))
+            self.frames.clear()
+            frame = encode_event("resync", {"seq": seq})
+        self.frames.append(frame)
+        self.ready.set()
+
+    def close(self, frame: bytes):
+        """
+        The close method buffers the terminal frame of the stream, after it the stream ends.
+        It runs in the event loop of the stream.
+
+        :param frame: bytes: The encoded SSE frame that tells the client why the stream ended
+        :return: None
+        :doc-Author: BGU
+        """
+        self.frames.append(frame)
+        self.closed = True
+        self.ready.set()
+
+    async def get(self, timeout: float) -> bytes:
+        """
+        The get method waits for buffered frames and returns all of them as one chunk.
+
+        :param timeout: float: Seconds to wait
+        :return: The frames, or a keepalive comment if none arrived in time
+        :doc-Author: BGU
+        """
+        if not self.frames:
+            self.ready.clear()
+            try:
+                await asyncio.wait_for(self.ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return KEEPALIVE
+        chunk = b"".join(self.frames)
+        self.frames.clear()
+        return chunk
+
+
+class EventHub:
+    """
+    In-process pub/sub of contact changes. Repository writes publish through the broker,
+    the broker delivers to the hub of every worker and the hub fans out to the open streams of the user.
+    """
+
+    def __init__(self, broker: EventBroker, buffer_size: int = 100):
+        self.broker = broker
+        self.buffer_size = buffer_size
+        self.subscriptions = {}
+        # Публікують і потоки threadpool, тож словник підписок змінюється під блокуванням
+        self.lock = threading.Lock()
+        broker.attach(self.deliver)
+
+    def publish(self, user_id: int, event: str, data: dict, seq: Optional[int] = None):
+        """
+        The publish method sends an event of a user to all workers.
+
+        :param user_id: int: The user the event belongs to
+        :param event: str: The event type
+        :param data: dict: The payload
+        :param seq: Optional[int]: The change number of the event
+        :return: None
+        :doc-Author: BGU
+        """
+        self.broker.publish(user_id, event, data, seq)
+
+    def deliver(self, user_id: int, event: str, data: dict, seq: Optional[int] = None):
+        """
+        The deliver method hands an event to the open streams of the user in this worker.
+        The frame is encoded once for all streams and not at all when the user has none.
+        A token revocation also closes the open streams of the user, they were opened with the revoked tokens.
+
+        :param user_id: int: The user the event belongs to
+        :param event: str: The event type
+        :param data: dict: The payload
+        :param seq: Optional[int]: The change number of the event
+        :return: None
+        :doc-Author: BGU
+        """
+        if event == "revoke":
+            # Відкликання токенів скидає кеші автентифікації кожного воркера, що отримав подію
+            token_versions.invalidate(user_id)
+            principal_cache.invalidate(data["email"])
+        with self.lock:
+            subscriptions = tuple(self.subscriptions.get(user_id, ()))
+        if not subscriptions:
+            return
+        if event == "revoke":
+            frame = encode_event("revoked", {})
+            for subscription in subscriptions:
+                subscription.loop.call_soon_threadsafe(subscription.close, frame)
+            return
+        frame = encode_event(event, data, seq)
+        for subscription in subscriptions:
+            subscription.loop.call_soon_threadsafe(subscription.push, seq, frame)
+
+    @contextmanager
+    def subscribe(self, user_id: int):
+        """
+        The subscribe method opens a subscription to the events of a user for the duration of the with block.
+
+        :param user_id: int: The user whose events to receive
+        :return: A Subscription
+        :doc-Author: BGU
+        """
+        subscription = Subscription(user_id, self.buffer_size)
+        with self.lock:
+            self.subscriptions.setdefault(user_id, set()).add(subscription)
+        EVENT_SUBSCRIBERS.inc()
+        try:
+            yield subscription
+        finally:
+            with self.lock:
+                subscriptions = self.subscriptions[user_id]
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self.subscriptions[user_id]
+            EVENT_SUBSCRIBERS.dec()
+
+    async def stream(self, user_id: int, last_event_id: Optional[int] = None, heartbeat: float = 15,
+                     expires_at: Optional[float] = None):
+        """
+        The stream method yields the Server-Sent Events of a user until the client disconnects,
+        the token that opened the stream expires or the tokens of the user are revoked.
+        A reconnecting client gets a resync event first, so it fetches the changes it missed after last_event_id.
+        The stream ends with an "expired" or "revoked" event, the client reconnects with a fresh token.
+
+        :param user_id: int: The user whose events to stream
+        :param last_event_id: Optional[int]: The Last-Event-ID header of a reconnecting client
+        :param heartbeat: float: Seconds between keepalive comments, so proxies keep the connection open
+        :param expires_at: Optional[float]: The exp claim of the token (Unix time), None if it does not expire
+        :return: An async iterator of bytes
+        :doc-Author: BGU
+        """
+        with self.subscribe(user_id) as subscription:
+            yield b"retry: %d\n\n" % RETRY_MS
+            if last_event_id is not None:
+                yield encode_event("resync", {"seq": last_event_id})
+            while not subscription.closed:
+                timeout = heartbeat if expires_at is None else min(heartbeat, expires_at - time.time())
+                if timeout <= 0:
+                    yield encode_event("expired", {})
+                    return
+                yield await subscription.get(timeout)
+            # Кадр "revoked" міг надійти, поки споживач обробляв попередній фрагмент
+            if subscription.frames:
+                yield await subscription.get(0)
+
+
+event_hub = EventHub(LocalBroker(), config.EVENTS_BUFFER_SIZE)
+
+
+def get_event_hub() -> EventHub:
+    """
+    The get_event_hub function returns the event hub of this worker.
+
+    :return: An EventHub
+    :doc-Author: BGU
+    """
+    return event_hub
@@ -0,0 +1,97 @@
+import csv
+import io
+import json
+from typing import AsyncIterator
+
+from src.repository import contacts_async
+
+CSV_FIELDS = ("id", "first_name", "last_name", "email", "phone_number", "birthday", "additional_data", "user_id")
+
+# Формат: (media type, розширення файлу)
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv", "csv"),
+    "vcf": ("text/vcard", "vcf"),
+}
+
+
+def encode_ndjson(rows: list) -> bytes:
+    """
+    The encode_ndjson function encodes rows as one JSON object per line.
+
+    :param rows: list: Contact row mappings
+    :return: Encoded bytes
+    :doc-Author: BGU
+    """
+    return "".join(json.dumps(dict(row), default=str, ensure_ascii=False) + "\n" for row in rows).encode()
+
+
+def encode_csv(rows: list, header: bool = False) -> bytes:
+    """
+    The encode_csv function encodes rows as CSV lines.
+
+    :param rows: list: Contact row mappings
+    :param header: bool: Write the header line first
+    :return: Encoded bytes
+    :doc-Author: BGU
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(CSV_FIELDS)
+    writer.writerows([row[field] for field in CSV_FIELDS] for row in rows)
+    return buffer.getvalue().encode()
+
+
+def vcard_escape(value) -> str:
+    """
+    The vcard_escape function escapes a text value for a vCard property.
+
+    :param value: The value to escape
+    :return: The escaped text
+    :doc-Author: BGU
+    """
+    text = "" if value is None else str(value)
+    return (text.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+            .replace("\r\n", "\\n").replace("\n", "\\n"))
+
+
+def encode_vcard(rows: list) -> bytes:
+    """
+    The encode_vcard function encodes rows as vCard 3.0 cards.
+
+    :param rows: list: Contact row mappings
+    :return: Encoded bytes
+    :doc-Author: BGU
+    """
+    cards = []
+    for row in rows:
+        first_name, last_name = vcard_escape(row["first_name"]), vcard_escape(row["last_name"])
+        lines = ["BEGIN:VCARD", "VERSION:3.0", f"N:{last_name};{first_name};;;", f"FN:{first_name} {last_name}",
+                 f"EMAIL;TYPE=INTERNET:{vcard_escape(row['email'])}", f"TEL;TYPE=CELL:{vcard_escape(row['phone_number'])}"]
+        if row["birthday"]:
+            lines.append(f"BDAY:{row['birthday'].isoformat()}")
+        if row["additional_data"]:
+            lines.append(f"NOTE:{vcard_escape(row['additional_data'])}")
+        lines.append("END:VCARD")
+        cards.append("\r\n".join(lines) + "\r\n")
+    return "".join(cards).encode()
+
+
+async def export_contacts(db, user_id: int, fmt: str, batch_size: int = 1000) -> AsyncIterator[bytes]:
+    """
+    The export_contacts function streams all contacts of a user encoded batch by batch,
+    so memory stays constant and the first bytes are sent before the query finishes.
+
+    :param db: Session: Pass the database session to the repository
+    :param user_id: int: Specify the user ID of the contact
+    :param fmt: str: One of EXPORT_FORMATS
+    :param batch_size: int: The number of rows fetched and encoded at once
+    :return: An async iterator of encoded chunks
+    :doc-Author: BGU
+    """
+    if fmt == "csv":
+        yield encode_csv([], header=True)
+    encode = {"ndjson": encode_ndjson, "csv": encode_csv, "vcf": encode_vcard}[fmt]
+    async for rows in contacts_async.stream_contacts(db, user_id, batch_size):
+        yield encode(rows)
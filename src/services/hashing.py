@@ -0,0 +1,98 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+from fastapi import HTTPException, status
+
+from src.conf.config import config
+from src.services.metrics import HASH_REJECTED, HASH_SECONDS
+
+
+class HashingExecutor:
+    """
+    Bounded thread pool for bcrypt hashing and verification.
+    bcrypt releases the GIL, so the threads hash in parallel while the event loop keeps serving requests.
+    When more than max_workers + max_queue calls are pending new calls are rejected with 503.
+    """
+
+    def __init__(self, max_workers: int, max_queue: int, retry_after: int = 1):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bcrypt")
+        # Лічильники змінюються лише в потоці event loop, тому блокування не потрібне
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.hash_seconds_total = 0.0
+        self.hash_seconds_max = 0.0
+        self.wait_seconds_total = 0.0
+
+    async def run(self, fn: Callable, *args):
+        """
+        The run method runs fn in the hashing pool, or raises 503 with Retry-After when the queue is full.
+
+        :param fn: Callable: The hashing function
+        :param args: The arguments of fn
+        :return: The result of fn
+        :doc-Author: BGU
+        """
+        if self.pending >= self.max_workers + self.max_queue:
+            self.rejected += 1
+            HASH_REJECTED.inc()
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                                detail="Authentication is busy, try again later",
+                                headers={"Retry-After": str(self.retry_after)})
+        self.pending += 1
+        submitted = time.perf_counter()
+        try:
+            result, started, finished = await asyncio.get_running_loop().run_in_executor(
+                self.executor, self._timed, fn, *args
+            )
+        finally:
+            self.pending -= 1
+        self.completed += 1
+        self.wait_seconds_total += started - submitted
+        self.hash_seconds_total += finished - started
+        self.hash_seconds_max = max(self.hash_seconds_max, finished - started)
+        HASH_SECONDS.observe(finished - started)
+        return result
+
+    @staticmethod
+    def _timed(fn: Callable, *args):
+        started = time.perf_counter()
+        result = fn(*args)
+        return result, started, time.perf_counter()
+
+    def stats(self) -> dict:
+        """
+        The stats method returns the queue depth and latency counters of the pool.
+
+        :return: A dictionary of metrics
+        :doc-Author: BGU
+        """
+        return {
+            "workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "in_flight": min(self.pending, self.max_workers),
+            "queue_depth": max(self.pending - self.max_workers, 0),
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "hash_seconds_total": round(self.hash_seconds_total, 6),
+            "hash_seconds_max": round(self.hash_seconds_max, 6),
+            "hash_seconds_avg": round(self.hash_seconds_total / self.completed, 6) if self.completed else 0.0,
+            "wait_seconds_total": round(self.wait_seconds_total, 6),
+        }
+
+    def shutdown(self):
+        """
+        The shutdown method stops the worker threads.
+
+        :return: None
+        :doc-Author: BGU
+        """
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+hashing_executor = HashingExecutor(max_workers=config.HASH_WORKERS, max_queue=config.HASH_QUEUE_SIZE)
@@ -0,0 +1,157 @@
+import codecs
+import csv
+import json
+import time
+from typing import AsyncIterator
+
+from pydantic import ValidationError
+
+from src.repository import contacts_async
+from src.schemas import ContactSchema
+
+CSV_CONTENT_TYPES = ("text/csv", "application/csv")
+NDJSON_CONTENT_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """
+    The iter_lines function splits a stream of byte chunks into text lines without reading the whole body.
+
+    :param chunks: AsyncIterator[bytes]: The request body stream
+    :return: An async iterator of lines
+    :doc-Author: BGU
+    """
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    buffer = ""
+    async for chunk in chunks:
+        buffer += decoder.decode(chunk)
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    buffer += decoder.decode(b"", final=True)
+    if buffer:
+        yield buffer.rstrip("\r")
+
+
+async def iter_csv_records(lines: AsyncIterator[str]) -> AsyncIterator[tuple]:
+    """
+    The iter_csv_records function parses CSV lines into dicts keyed by the header row.
+    A record continues on the next line while it has an unclosed quote.
+
+    :param lines: AsyncIterator[str]: The lines of the body
+    :return: An async iterator of (row number, data, error)
+    :doc-Author: BGU
+    """
+    header = None
+    record = None
+    row = 0
+    async for line in lines:
+        record = line if record is None else f"{record}\n{line}"
+        if record.count('"') % 2:
+            continue
+        values, record = next(csv.reader([record]), []), None
+        if not values:
+            continue
+        if header is None:
+            header = [value.strip() for value in values]
+            continue
+        row += 1
+        if len(values) != len(header):
+            yield row, None, f"Expected {len(header)} columns, got {len(values)}"
+            continue
+        yield row, dict(zip(header, values)), None
+    if record is not None:
+        yield row + 1, None, "Unterminated quoted field"
+
+
+async def iter_ndjson_records(lines: AsyncIterator[str]) -> AsyncIterator[tuple]:
+    """
+    The iter_ndjson_records function parses one JSON object per line.
+
+    :param lines: AsyncIterator[str]: The lines of the body
+    :return: An async iterator of (row number, data, error)
+    :doc-Author: BGU
+    """
+    row = 0
+    async for line in lines:
+        if not line.strip():
+            continue
+        row += 1
+        try:
+            data = json.loads(line)
+        except ValueError as e:
+            yield row, None, f"Invalid JSON: {e}"
+            continue
+        if not isinstance(data, dict):
+            yield row, None, "Expected a JSON object"
+            continue
+        yield row, data, None
+
+
+def validation_message(error: ValidationError) -> str:
+    """
+    The validation_message function flattens a pydantic ValidationError into one line.
+
+    :param error: ValidationError: The validation error
+    :return: A string
+    :doc-Author: BGU
+    """
+    return "; ".join(f"{'.'.join(str(part) for part in item['loc'])}: {item['msg']}" for item in error.errors())
+
+
+async def import_contacts(db, chunks: AsyncIterator[bytes], content_type: str, user_id: int,
+                          batch_size: int) -> dict:
+    """
+    The import_contacts function streams contacts from a CSV or NDJSON body into the database in batches.
+    Each row is validated with ContactSchema, duplicates are resolved with one query per batch.
+
+    :param db: Session: Pass the database session to the repository
+    :param chunks: AsyncIterator[bytes]: The request body stream
+    :param content_type: str: The media type of the body
+    :param user_id: int: Identify the user who imports the contacts
+    :param batch_size: int: The number of contacts inserted at once
+    :return: An import report
+    :doc-Author: BGU
+    """
+    started = time.perf_counter()
+    lines = iter_lines(chunks)
+    records = iter_csv_records(lines) if content_type in CSV_CONTENT_TYPES else iter_ndjson_records(lines)
+    report = {"total": 0, "imported": 0, "failed": 0, "errors": []}
+    batch = {}
+
+    def fail(row: int, error: str):
+        report["failed"] += 1
+        report["errors"].append({"row": row, "error": error})
+
+    async def flush():
+        existing = await contacts_async.bulk_create_contacts(db, [data for _, data in batch.values()], user_id)
+        for email, (row, _) in batch.items():
+            if email in existing:
+                fail(row, "Email already exists")
+        report["imported"] += len(batch) - len(existing)
+        batch.clear()
+
+    async for row, data, error in records:
+        report["total"] += 1
+        if error:
+            fail(row, error)
+            continue
+        try:
+            contact = ContactSchema(**{key: value if value != "" else None for key, value in data.items()})
+        except ValidationError as e:
+            fail(row, validation_message(e))
+            continue
+        contact_data = contact.model_dump()
+        if contact_data["email"] in batch:
+            fail(row, "Duplicate email in the file")
+            continue
+        batch[contact_data["email"]] = (row, contact_data)
+        if len(batch) >= batch_size:
+            await flush()
+    if batch:
+        await flush()
+
+    report["errors"].sort(key=lambda item: item["row"])
+    report["seconds"] = round(time.perf_counter() - started, 3)
+    report["rows_per_second"] = round(report["total"] / report["seconds"], 1) if report["seconds"] else 0.0
+    return report
@@ -0,0 +1,166 @@
+import os
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram,
+                               generate_latest, multiprocess)
+from sqlalchemy import event
+from starlette.requests import Request
+
+# Якщо задано PROMETHEUS_MULTIPROC_DIR, кожен воркер пише значення у файли цієї теки,
+# а /metrics підсумовує їх для всіх воркерів
+MULTIPROC_DIR_ENV = "PROMETHEUS_MULTIPROC_DIR"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+HASH_BUCKETS = (0.05, 0.1, 0.2, 0.3, 0.5, 1.0, 2.0, 5.0)
+
+# Маршрут, якого немає серед шаблонів застосунку (404, статичні файли)
+UNMATCHED_ROUTE = "<unmatched>"
+
+REQUESTS = Counter("http_requests_total", "HTTP requests", ["method", "route", "status"])
+REQUEST_SECONDS = Histogram("http_request_duration_seconds", "HTTP request latency", ["method", "route"],
+                            buckets=LATENCY_BUCKETS)
+REQUESTS_IN_PROGRESS = Gauge("http_requests_in_progress", "HTTP requests being served", ["method"],
+                             multiprocess_mode="livesum")
+DB_QUERIES = Histogram("db_queries_per_request", "Database queries per HTTP request", ["route"],
+                       buckets=QUERY_COUNT_BUCKETS)
+DB_SECONDS = Histogram("db_query_seconds_per_request", "Database time per HTTP request", ["route"],
+                       buckets=LATENCY_BUCKETS)
+HASH_SECONDS = Histogram("bcrypt_duration_seconds", "bcrypt hash and verify time", buckets=HASH_BUCKETS)
+HASH_REJECTED = Counter("bcrypt_rejected_total", "bcrypt calls rejected because the pool was full")
+EMAIL_QUEUE_DEPTH = Gauge("email_queue_depth", "Emails waiting to be sent", multiprocess_mode="livesum")
+EMAIL_SENT = Counter("email_sent_total", "Emails sent")
+EMAIL_FAILED = Counter("email_failed_total", "Emails dropped after all retries")
+RATE_LIMITED = Counter("rate_limit_rejections_total", "Requests rejected by the rate limiter", ["route"])
+EVENT_SUBSCRIBERS = Gauge("contact_event_streams", "Open contact event streams", multiprocess_mode="livesum")
+EVENTS_DROPPED = Counter("contact_events_dropped_total", "Contact events replaced by resync for slow streams")
+QUERY_CACHE_LOOKUPS = Counter("contact_query_cache_lookups_total", "Contact query cache lookups",
+                              ["query", "result"])
+
+# [кількість запитів, секунди] до бази поточного HTTP-запиту; список змінюється і в потоках threadpool
+request_db_stats: ContextVar[Optional[list]] = ContextVar("request_db_stats", default=None)
+
+
+def route_template(scope: dict) -> str:
+    """
+    The route_template function returns the path template of the matched route, so metrics are not labelled by ids.
+
+    :param scope: dict: The ASGI scope after routing
+    :return: The route template
+    :doc-Author: BGU
+    """
+    route = scope.get("route")
+    return getattr(route, "path", UNMATCHED_ROUTE)
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware that records the count, latency, status and database usage of every HTTP request.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        method = scope["method"]
+        status_code = 500
+        db_stats = [0, 0.0]
+        token = request_db_stats.set(db_stats)
+        in_progress = REQUESTS_IN_PROGRESS.labels(method)
+        in_progress.inc()
+        started = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            route = route_template(scope)
+            REQUESTS.labels(method, route, str(status_code)).inc()
+            REQUEST_SECONDS.labels(method, route).observe(elapsed)
+            DB_QUERIES.labels(route).observe(db_stats[0])
+            DB_SECONDS.labels(route).observe(db_stats[1])
+            in_progress.dec()
+            request_db_stats.reset(token)
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context.metrics_started = time.perf_counter()
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    db_stats = request_db_stats.get()
+    if db_stats is not None:
+        db_stats[0] += 1
+        db_stats[1] += time.perf_counter() - context.metrics_started
+
+
+def instrument_engine(engine):
+    """
+    The instrument_engine function counts the queries and database time of the current request on an engine.
+    For an AsyncEngine pass its sync_engine.
+
+    :param engine: Engine: The engine to instrument
+    :return: None
+    :doc-Author: BGU
+    """
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", after_cursor_execute)
+
+
+def record_rate_limited(request: Request):
+    """
+    The record_rate_limited function counts a request rejected by the rate limiter.
+
+    :param request: Request: The rejected request
+    :return: None
+    :doc-Author: BGU
+    """
+    RATE_LIMITED.labels(route_template(request.scope)).inc()
+
+
+def metrics_registry() -> CollectorRegistry:
+    """
+    The metrics_registry function returns the registry to expose: the process registry,
+    or in multiprocess mode a registry that aggregates the files of all workers.
+
+    :return: A CollectorRegistry
+    :doc-Author: BGU
+    """
+    if not os.environ.get(MULTIPROC_DIR_ENV):
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def render_metrics() -> tuple:
+    """
+    The render_metrics function renders the metrics in the Prometheus text exposition format.
+
+    :return: A tuple of the payload and its media type
+    :doc-Author: BGU
+    """
+    return generate_latest(metrics_registry()), CONTENT_TYPE_LATEST
+
+
+def mark_worker_dead(pid: int):
+    """
+    The mark_worker_dead function removes the live gauges of a stopped worker in multiprocess mode.
+
+    :param pid: int: The process id of the worker
+    :return: None
+    :doc-Author: BGU
+    """
+    if os.environ.get(MULTIPROC_DIR_ENV):
+        multiprocess.mark_process_dead(pid)
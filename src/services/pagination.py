@@ -0,0 +1,46 @@
+import base64
+import json
+from typing import Optional
+
+from fastapi import HTTPException, status
+
+
+def encode_cursor(sort: str, values: list) -> str:
+    """
+    The encode_cursor function packs the sort key values of the last returned contact into an opaque cursor.
+
+    :param sort: str: The sort key of the listing
+    :param values: list: The sort key values of the last returned contact
+    :return: A cursor string
+    :doc-Author: BGU
+    """
+    payload = json.dumps({"s": sort, "v": values}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str], sort: str, columns: tuple) -> Optional[list]:
+    """
+    The decode_cursor function unpacks a cursor created by encode_cursor.
+    An empty cursor means the first page. The cursor comes from the client, so it must hold exactly one value
+    of the column type for every column of the sort key, otherwise the database fails on the row comparison.
+
+    :param cursor: Optional[str]: The cursor from the request
+    :param sort: str: The sort key of the listing
+    :param columns: tuple: The columns of the sort key
+    :return: The sort key values to continue after, or None for the first page
+    :doc-Author: BGU
+    """
+    if not cursor:
+        return None
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        values = payload["v"]
+        if payload["s"] != sort or not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError(cursor)
+        for value, column in zip(values, columns):
+            # type(), а не isinstance: bool є підкласом int
+            if not (type(value) is column.type.python_type or value is None and column.nullable):
+                raise ValueError(cursor)
+        return values
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
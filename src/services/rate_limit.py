@@ -0,0 +1,467 @@
+import logging
+import os
+from abc import ABC, abstractmethod
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from limits.storage import MovingWindowSupport, Storage
+from slowapi.util import get_remote_address
+from starlette.requests import Request
+
+from src.conf.config import config
+
+logger = logging.getLogger(__name__)
+
+
+def rate_limit_key(request: Request) -> str:
+    """
+    The rate_limit_key function keys the rate limits of authenticated requests by the subject of the JWT,
+    so users behind one NAT or proxy get their own buckets. Requests without a valid token are keyed by the address.
+    The limit is checked after the dependencies, so the subject is read from request.state.token_subject,
+    where the auth dependency keeps it, instead of decoding the token again.
+
+    :param request: Request: The incoming request
+    :return: "user:<subject>" or "ip:<address>"
+    :doc-Author: BGU
+    """
+    subject = getattr(request.state, "token_subject", None)
+    if subject:
+        return f"user:{subject}"
+    return f"ip:{get_remote_address(request)}"
+
+
+def batch_cost(request: Request) -> int:
+    """
+    The batch_cost function returns the rate limit cost of a batch request: the number of contacts in it,
+    recorded in request.state.batch_size when the body is parsed. A batch is one request and one transaction,
+    but it costs as much of the limit as the single requests it replaces.
+
+    :param request: Request: The incoming request
+    :return: The cost of the request
+    :doc-Author: BGU
+    """
+    return getattr(request.state, "batch_size", 1)
+
+
+class CounterStore(ABC):
+    """
+    Base class of the stores that share fixed-window hit counters between workers.
+    A counter is addressed by the rate limit key and the start of its window.
+    """
+
+    @abstractmethod
+    def add(self, deltas: dict) -> dict:
+        """
+        The add method atomically adds hits to the counters and returns their totals over all workers.
+
+        :param deltas: dict: (key, window start) -> (hits, expires_at)
+        :return: (key, window start) -> total hits
+        :doc-Author: BGU
+        """
+
+    @abstractmethod
+    def clear(self, key: Optional[str] = None):
+        """
+        The clear method drops the counters of a key, or all counters.
+
+        :param key: Optional[str]: The rate limit key, None for all keys
+        :return: None
+        :doc-Author: BGU
+        """
+
+    @abstractmethod
+    def check(self) -> bool:
+        """
+        The check method tells whether the store is reachable, for the health check of limits.
+
+        :return: True if the store answers
+        :doc-Author: BGU
+        """
+
+
+class SQLiteCounterStore(CounterStore):
+    """
+    Counters in a SQLite file shared by the workers of one host. A sync is one short write transaction.
+    """
+
+    def __init__(self, path: str, timeout: float = 5):
+        self.path = path
+        self.timeout = timeout
+        self.connection = None
+        self.pid = None
+        self.lock = threading.Lock()
+
+    def connect(self) -> sqlite3.Connection:
+        """
+        The connect method returns the connection of this process, creating the table on first use.
+
+        :return: A sqlite3 connection
+        :doc-Author: BGU
+        """
+        # З'єднання не переживає fork, тож кожен процес відкриває власне
+        if self.connection is None or self.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None,
+                                         check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("CREATE TABLE IF NOT EXISTS rate_limits (key TEXT NOT NULL, start INTEGER NOT NULL, "
+                               "hits INTEGER NOT NULL, expires_at REAL NOT NULL, PRIMARY KEY (key, start))")
+            connection.execute("CREATE INDEX IF NOT EXISTS ix_rate_limits_expires_at ON rate_limits (expires_at)")
+            self.connection, self.pid = connection, os.getpid()
+        return self.connection
+
+    def add(self, deltas: dict) -> dict:
+        """
+        The add method upserts the counters in one BEGIN IMMEDIATE transaction and drops the expired ones.
+
+        :param deltas: dict: (key, window start) -> (hits, expires_at)
+        :return: (key, window start) -> total hits
+        :doc-Author: BGU
+        """
+        totals = {}
+        with self.lock:
+            connection = self.connect()
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                for (key, start), (hits, expires_at) in deltas.items():
+                    totals[key, start] = connection.execute(
+                        "INSERT INTO rate_limits (key, start, hits, expires_at) VALUES (?, ?, ?, ?) "
+                        "ON CONFLICT (key, start) DO UPDATE SET hits = hits + excluded.hits RETURNING hits",
+                        (key, start, hits, expires_at)).fetchone()[0]
+                connection.execute("DELETE FROM rate_limits WHERE expires_at < ?", (time.time(),))
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+        return totals
+
+    def clear(self, key: Optional[str] = None):
+        """
+        The clear method deletes the counters of a key, or all counters.
+
+        :param key: Optional[str]: The rate limit key, None for all keys
+        :return: None
+        :doc-Author: BGU
+        """
+        with self.lock:
+            if key is None:
+                self.connect().execute("DELETE FROM rate_limits")
+            else:
+                self.connect().execute("DELETE FROM rate_limits WHERE key = ?", (key,))
+
+    def check(self) -> bool:
+        """
+        The check method runs a trivial query on the SQLite file.
+
+        :return: True if the file can be queried
+        :doc-Author: BGU
+        """
+        with self.lock:
+            return self.connect().execute("SELECT 1").fetchone() == (1,)
+
+
+class RedisCounterStore(CounterStore):
+    """
+    Counters in Redis, shared by workers on several hosts. A sync is one pipelined round trip of INCRBY and EXPIREAT.
+    Any client with the redis-py interface works, so a local fake can stand in for the server.
+    """
+
+    def __init__(self, client, prefix: str = "rate_limits"):
+        self.client = client
+        self.prefix = prefix
+
+    def add(self, deltas: dict) -> dict:
+        """
+        The add method sends INCRBY and EXPIREAT of every counter in one pipeline.
+
+        :param deltas: dict: (key, window start) -> (hits, expires_at)
+        :return: (key, window start) -> total hits
+        :doc-Author: BGU
+        """
+        pipeline = self.client.pipeline(transaction=False)
+        for (key, start), (hits, expires_at) in deltas.items():
+            name = f"{self.prefix}:{key}:{start}"
+            pipeline.incrby(name, hits)
+            pipeline.expireat(name, int(expires_at) + 1)
+        results = pipeline.execute()
+        # На кожен лічильник дві команди: INCRBY повертає суму, EXPIREAT — прапорець
+        return {item: int(results[2 * index]) for index, item in enumerate(deltas)}
+
+    def clear(self, key: Optional[str] = None):
+        """
+        The clear method deletes the counter keys of a rate limit key, or all counter keys.
+
+        :param key: Optional[str]: The rate limit key, None for all keys
+        :return: None
+        :doc-Author: BGU
+        """
+        names = list(self.client.scan_iter(match=f"{self.prefix}:{'*' if key is None else key + ':*'}"))
+        if names:
+            self.client.delete(*names)
+
+    def check(self) -> bool:
+        """
+        The check method pings the Redis server.
+
+        :return: True if Redis answers
+        :doc-Author: BGU
+        """
+        return bool(self.client.ping())
+
+
+class BatchedStorage(Storage, MovingWindowSupport):
+    """
+    limits storage that counts hits in the worker and syncs the counters with a shared CounterStore
+    every sync_interval seconds from a background thread, so a limit check never waits for the store.
+    A limit can be overshot by the hits other workers made since the last sync.
+
+    The moving-window strategy is served by a sliding-window counter: the hits of the previous fixed window,
+    weighted by the part of it still inside the sliding window, plus the hits of the current one.
+    """
+
+    def __init__(self, store: CounterStore, sync_interval: float = config.RATE_LIMIT_SYNC_INTERVAL):
+        super().__init__()
+        self.store = store
+        self.sync_interval = sync_interval
+        # (key, початок вікна) -> [тривалість вікна, сума всіх воркерів на останню синхронізацію, ще не надіслані]
+        self.counters = {}
+        self.expiries = {}
+        self.pid = None
+        self.stopped = threading.Event()
+
+    def start_sync(self):
+        """
+        The start_sync method starts the sync thread of this process. It is called under the lock.
+
+        :return: None
+        :doc-Author: BGU
+        """
+        # Потік не переживає fork, тож кожен воркер запускає власний при першому зверненні
+        if self.pid != os.getpid():
+            self.pid = os.getpid()
+            threading.Thread(target=self.run_sync, name="rate-limit-sync", daemon=True).start()
+
+    def run_sync(self):
+        """
+        The run_sync method syncs the counters every sync_interval seconds until close is called.
+
+        :return: None
+        :doc-Author: BGU
+        """
+        while not self.stopped.wait(self.sync_interval):
+            try:
+                self.sync()
+            except Exception as e:
+                # Ліміти й далі рахуються локально, не надіслані удари підуть з наступною синхронізацією
+                logger.warning("Rate limit sync failed: %s", e)
+
+    def close(self):
+        """
+        The close method stops the sync thread.
+
+        :return: None
+        :doc-Author: BGU
+        """
+        self.stopped.set()
+
+    def sync(self):
+        """
+        The sync method sends the hits counted since the last sync to the store and takes the totals of all workers.
+        The previous window of every key is synced too, the sliding window needs it.
+
+        :return: None
+        :doc-Author: BGU
+        """
+        now = time.time()
+        with self.lock:
+            for (key, start), counter in list(self.counters.items()):
+                if start + 2 * counter[0] <= now:
+                    del self.counters[key, start]
+                elif start + counter[0] > now:
+                    self.counters.setdefault((key, start - counter[0]), [counter[0], 0, 0])
+            deltas = {(key, start): (counter[2], start + 2 * counter[0])
+                      for (key, start), counter in self.counters.items()}
+        if not deltas:
+            return
+        totals = self.store.add(deltas)
+        with self.lock:
+            for item, total in totals.items():
+                counter = self.counters.get(item)
+                if counter is not None:
+                    counter[1] = total
+                    counter[2] -= deltas[item][0]
+
+    def counter(self, key: str, start: int, expiry: int) -> list:
+        """
+        The counter method returns the local counter of a window, creating it. It is called under the lock.
+
+        :param key: str: The rate limit key
+        :param start: int: The start of the window
+        :param expiry: int: The length of the window in seconds
+        :return: [window length, synced total, pending hits]
+        :doc-Author: BGU
+        """
+        counter = self.counters.get((key, start))
+        if counter is None:
+            counter = self.counters[key, start] = [expiry, 0, 0]
+        return counter
+
+    def hits(self, key: str, expiry: int, now: float) -> float:
+        """
+        The hits method estimates the hits in the sliding window ending now. It is called under the lock.
+
+        :param key: str: The rate limit key
+        :param expiry: int: The length of the window in seconds
+        :param now: float: The current time
+        :return: The weighted hits of the previous window plus the hits of the current one
+        :doc-Author: BGU
+        """
+        start = int(now // expiry * expiry)
+        current = self.counter(key, start, expiry)
+        previous = self.counters.get((key, start - expiry), (expiry, 0, 0))
+        return (previous[1] + previous[2]) * (start + expiry - now) / expiry + current[1] + current[2]
+
+    def acquire_entry(self, key: str, limit: int, expiry: int, amount: int = 1) -> bool:
+        """
+        The acquire_entry method counts amount hits if they fit into the sliding window (moving-window strategy).
+
+        :param key: str: The rate limit key
+        :param limit: int: The allowed hits per window
+        :param expiry: int: The length of the window in seconds
+        :param amount: int: The cost of the request
+        :return: True if the hits were counted
+        :doc-Author: BGU
+        """
+        if amount > limit:
+            return False
+        now = time.time()
+        with self.lock:
+            self.start_sync()
+            if self.hits(key, expiry, now) + amount > limit:
+                return False
+            self.counter(key, int(now // expiry * expiry), expiry)[2] += amount
+            return True
+
+    def get_moving_window(self, key: str, limit: int, expiry: int) -> tuple:
+        """
+        The get_moving_window method returns the window state for the rate limit headers.
+
+        :param key: str: The rate limit key
+        :param limit: int: The allowed hits per window
+        :param expiry: int: The length of the window in seconds
+        :return: The start of the current window and the estimated hits
+        :doc-Author: BGU
+        """
+        now = time.time()
+        with self.lock:
+            self.start_sync()
+            return int(now // expiry * expiry), int(self.hits(key, expiry, now))
+
+    def incr(self, key: str, expiry: int, elastic_expiry: bool = False, amount: int = 1) -> int:
+        """
+        The incr method counts hits in the current fixed window (fixed-window strategy).
+
+        :param key: str: The rate limit key
+        :param expiry: int: The length of the window in seconds
+        :param elastic_expiry: bool: Not supported, windows are aligned to the clock
+        :param amount: int: The cost of the request
+        :return: The hits of the window known to this worker
+        :doc-Author: BGU
+        """
+        now = time.time()
+        with self.lock:
+            self.start_sync()
+            self.expiries[key] = expiry
+            counter = self.counter(key, int(now // expiry * expiry), expiry)
+            counter[2] += amount
+            return counter[1] + counter[2]
+
+    def get(self, key: str) -> int:
+        """
+        The get method returns the hits of the current fixed window known to this worker.
+
+        :param key: str: The rate limit key
+        :return: The number of hits
+        :doc-Author: BGU
+        """
+        now = time.time()
+        with self.lock:
+            expiry = self.expiries.get(key)
+            counter = expiry and self.counters.get((key, int(now // expiry * expiry)))
+            return counter[1] + counter[2] if counter else 0
+
+    def get_expiry(self, key: str) -> int:
+        """
+        The get_expiry method returns when the current fixed window of a key ends.
+
+        :param key: str: The rate limit key
+        :return: A Unix timestamp
+        :doc-Author: BGU
+        """
+        now = time.time()
+        expiry = self.expiries.get(key)
+        return int(now // expiry * expiry + expiry) if expiry else int(now)
+
+    def check(self) -> bool:
+        """
+        The check method checks the shared store.
+
+        :return: True if the store answers
+        :doc-Author: BGU
+        """
+        return self.store.check()
+
+    def reset(self) -> Optional[int]:
+        """
+        The reset method drops all local and shared counters.
+
+        :return: The number of local counters dropped
+        :doc-Author: BGU
+        """
+        with self.lock:
+            count = len(self.counters)
+            self.counters.clear()
+            self.expiries.clear()
+        self.store.clear()
+        return count
+
+    def clear(self, key: str):
+        """
+        The clear method drops the local and shared counters of a key.
+
+        :param key: str: The rate limit key
+        :return: None
+        :doc-Author: BGU
+        """
+        with self.lock:
+            for item in [item for item in self.counters if item[0] == key]:
+                del self.counters[item]
+            self.expiries.pop(key, None)
+        self.store.clear(key)
+
+
+class SQLiteStorage(BatchedStorage):
+    """
+    Batched storage for the workers of one host, e.g. sqlite:///./ratelimit.db
+    """
+
+    STORAGE_SCHEME = ["sqlite"]
+
+    def __init__(self, uri: str, sync_interval: float = config.RATE_LIMIT_SYNC_INTERVAL, **options):
+        super().__init__(SQLiteCounterStore(uri[len("sqlite:///"):]), sync_interval)
+
+
+class BatchedRedisStorage(BatchedStorage):
+    """
+    Batched storage for workers on several hosts, e.g. batched+redis://localhost:6379/0.
+    Unlike limits' own redis:// storage, a limit check is not a Redis round trip.
+    """
+
+    STORAGE_SCHEME = ["batched+redis", "batched+rediss"]
+    DEPENDENCIES = ["redis"]
+
+    def __init__(self, uri: str, sync_interval: float = config.RATE_LIMIT_SYNC_INTERVAL, client=None, **options):
+        if client is None:
+            client = self.dependencies["redis"].module.from_url(uri[len("batched+"):], **options)
+        super().__init__(RedisCounterStore(client), sync_interval)
@@ -0,0 +1,125 @@
+from typing import Optional
+
+from fastapi import HTTPException, status
+from fastapi.responses import ORJSONResponse
+
+from src.repository.contacts import CONTACT_FIELDS
+
+
+def parse_fields(fields: Optional[str]) -> Optional[tuple]:
+    """
+    The parse_fields function parses the comma-separated ?fields= parameter into ContactResponse field names.
+
+    :param fields: Optional[str]: The parameter from the request
+    :return: The field names in ContactResponse order, or None when all fields are requested
+    :doc-Author: BGU
+    """
+    if fields is None:
+        return None
+    requested = {name.strip() for name in fields.split(",") if name.strip()}
+    unknown = requested.difference(CONTACT_FIELDS)
+    if not requested or unknown:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"Unknown fields: {', '.join(sorted(unknown))}. "
+                                   f"Available fields: {', '.join(CONTACT_FIELDS)}")
+    return tuple(name for name in CONTACT_FIELDS if name in requested)
+
+
+def encode_row(row, fields: Optional[tuple] = None) -> dict:
+    """
+    The encode_row function converts a Core row to a dictionary with the requested fields.
+    A row may carry more columns than requested, e.g. the sort key of a keyset page.
+
+    :param row: Row: The Core row
+    :param fields: Optional[tuple]: The requested field names, None for all columns of the row
+    :return: A dictionary
+    :doc-Author: BGU
+    """
+    if fields is None:
+        return row._asdict()
+    mapping = row._mapping
+    return {field: mapping[field] for field in fields}
+
+
+def row_response(row, fields: Optional[tuple] = None, headers: Optional[dict] = None) -> ORJSONResponse:
+    """
+    The row_response function encodes one Core row straight to JSON bytes with orjson.
+
+    :param row: Row: The Core row
+    :param fields: Optional[tuple]: The requested field names
+    :param headers: Optional[dict]: Extra response headers, e.g. validators
+    :return: A JSON response with an object
+    :doc-Author: BGU
+    """
+    return ORJSONResponse(encode_row(row, fields), headers=headers)
+
+
+def rows_response(rows: list, fields: Optional[tuple] = None, headers: Optional[dict] = None) -> ORJSONResponse:
+    """
+    The rows_response function encodes Core rows straight to JSON bytes with orjson.
+    Returning a Response skips the response_model validation, so the rows must already have the API columns.
+
+    :param rows: list: Core rows
+    :param fields: Optional[tuple]: The requested field names
+    :param headers: Optional[dict]: Extra response headers, e.g. validators
+    :return: A JSON response with a list of objects
+    :doc-Author: BGU
+    """
+    return ORJSONResponse([encode_row(row, fields) for row in rows], headers=headers)
+
+
+def page_response(rows: list, next_cursor: Optional[str], fields: Optional[tuple] = None,
+                  headers: Optional[dict] = None) -> ORJSONResponse:
+    """
+    The page_response function encodes a keyset page of Core rows in the shape of ContactPage.
+
+    :param rows: list: Core rows of the page
+    :param next_cursor: Optional[str]: The cursor of the next page
+    :param fields: Optional[tuple]: The requested field names
+    :param headers: Optional[dict]: Extra response headers, e.g. validators
+    :return: A JSON response with items and next_cursor
+    :doc-Author: BGU
+    """
+    return ORJSONResponse({"items": [encode_row(row, fields) for row in rows], "next_cursor": next_cursor},
+                          headers=headers)
+
+
+def changes_response(changes: list, since: int, has_more: bool) -> ORJSONResponse:
+    """
+    The changes_response function encodes contact changes in the shape of ContactChanges.
+    next_since is the change number to pass as since for the next request.
+
+    :param changes: list: A list of ("upsert" | "delete", row) ordered by seq
+    :param since: int: The change number of the request
+    :param has_more: bool: More changes follow
+    :return: A JSON response with changes, next_since and has_more
+    :doc-Author: BGU
+    """
+    items = [{"seq": row.seq, "op": op, "id": row.id,
+              "contact": encode_row(row, CONTACT_FIELDS) if op == "upsert" else None} for op, row in changes]
+    return ORJSONResponse({"changes": items, "next_since": changes[-1][1].seq if changes else since,
+                           "has_more": has_more})
+
+
+def batch_results(ids: list[int], found, rows: Optional[dict] = None, conflicts=()) -> dict:
+    """
+    The batch_results function builds the per-item results of a batch in the order of the request,
+    in the shape of BatchResult.
+
+    :param ids: list[int]: The IDs of the batch
+    :param found: The IDs the batch applied to
+    :param rows: Optional[dict]: The contact rows by id to return with the results
+    :param conflicts: The IDs skipped because their email is taken
+    :return: A dictionary with the results
+    :doc-Author: BGU
+    """
+    results = []
+    for contact_id in ids:
+        if contact_id in conflicts:
+            results.append({"id": contact_id, "status": "conflict"})
+        elif contact_id in found:
+            contact = rows[contact_id]._asdict() if rows is not None else None
+            results.append({"id": contact_id, "status": "ok", "contact": contact})
+        else:
+            results.append({"id": contact_id, "status": "not_found"})
+    return {"results": results}
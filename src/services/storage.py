@@ -0,0 +1,102 @@
+from abc import ABC, abstractmethod
+from pathlib import Path
+
+import cloudinary
+import cloudinary.uploader
+from starlette.concurrency import run_in_threadpool
+
+from src.conf.config import config
+
+
+class AvatarStorage(ABC):
+    """
+    Base class of avatar storage backends.
+    Every user has one stable key, a new avatar overwrites the old one, so the storage keeps no orphans.
+    """
+
+    @abstractmethod
+    async def save(self, key: str, data: bytes, content_type: str, version: str) -> str:
+        """
+        The save method stores the avatar under its key, replacing the previous one, and returns its public URL.
+
+        :param key: str: The stable name of the user's avatar
+        :param data: bytes: The encoded image
+        :param content_type: str: The media type of the image
+        :param version: str: The content hash, busts the caches of the old image in the URL
+        :return: The URL of the avatar
+        :doc-Author: BGU
+        """
+
+
+class CloudinaryStorage(AvatarStorage):
+    """
+    Stores avatars in Cloudinary. The SDK is synchronous, so uploads run in the threadpool.
+    """
+
+    def __init__(self, folder: str = "Web16_BGU"):
+        self.folder = folder
+        cloudinary.config(
+            cloud_name=config.CLD_NAME,
+            api_key=config.CLD_API_KEY,
+            api_secret=config.CLD_API_SECRET,
+        )
+
+    async def save(self, key: str, data: bytes, content_type: str, version: str) -> str:
+        """
+        The save method overwrites the asset of the user and invalidates its CDN copies.
+        The version of the upload in the URL busts the browser caches.
+
+        :param key: str: The stable name of the user's avatar
+        :param data: bytes: The encoded image
+        :param content_type: str: The media type of the image
+        :param version: str: The content hash, Cloudinary versions the asset itself
+        :return: The URL of the avatar
+        :doc-Author: BGU
+        """
+        public_id = f"{self.folder}/{Path(key).stem}"
+        result = await run_in_threadpool(cloudinary.uploader.upload, data, public_id=public_id, overwrite=True,
+                                         invalidate=True)
+        return cloudinary.CloudinaryImage(public_id).build_url(version=result.get("version"))
+
+
+class LocalStorage(AvatarStorage):
+    """
+    Stores avatars in a local directory served by the application, for tests and air-gapped runs.
+    """
+
+    def __init__(self, root: str, base_url: str):
+        self.root = Path(root)
+        self.base_url = base_url.rstrip("/")
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    async def save(self, key: str, data: bytes, content_type: str, version: str) -> str:
+        """
+        The save method writes the avatar to a temporary file and renames it over the old one,
+        so the static files never serve a partly written image.
+
+        :param key: str: The stable name of the user's avatar
+        :param data: bytes: The encoded image
+        :param content_type: str: The media type of the image
+        :param version: str: The content hash, added to the URL as a query parameter
+        :return: The URL of the avatar
+        :doc-Author: BGU
+        """
+        path = self.root / key
+        temp = path.with_name(f".{key}.{version}")
+        await run_in_threadpool(temp.write_bytes, data)
+        await run_in_threadpool(temp.replace, path)
+        return f"{self.base_url}/{key}?v={version}"
+
+
+avatar_storage = (LocalStorage(config.AVATAR_LOCAL_DIR, config.AVATAR_LOCAL_URL)
+                  if config.AVATAR_STORAGE == "local" else CloudinaryStorage())
+
+
+def get_avatar_storage() -> AvatarStorage:
+    """
+    The get_avatar_storage function returns the configured avatar storage backend.
+
+    :return: An AvatarStorage
+    :doc-Author: BGU
+    """
+    return avatar_storage
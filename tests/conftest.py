@@ -4,11 +4,16 @@ from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
 from main import app
-from src.database.db import Base, get_db
+from src.database.models import User
+from src.services.cache import contact_queries, principal_cache
+from src.services.metrics import instrument_engine
+from src.database.db import Base, get_db, sql_profiler
 
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
 
 engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+instrument_engine(engine)
+sql_profiler.install(engine)
 
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -31,9 +36,35 @@ def client(session):
         finally:
             session.close()
     app.dependency_overrides[get_db] = override_get_db
+    # Кожен модуль створює базу заново, тож кешовані користувачі застаріли
+    principal_cache.clear()
+    contact_queries.clear()
     yield TestClient(app)
 
 @pytest.fixture(scope="module")
 def user():
     user = {"username": "test", "email": "test@example.com", "password": "test"}
-    return user
\ No newline at end of file
+    return user
+
+
+@pytest.fixture(scope="module")
+def token(client, session, user, monkeypatch_module):
+    monkeypatch_module.setattr("src.routes.auth.send_email", lambda *args: None)
+    client.post("auth/auth/register", json=user)
+    current_user: User = session.query(User).filter(User.email == user.get('email')).first()
+    current_user.confirmed = True
+    session.commit()
+    response = client.post("auth/auth/token", data={"username": user.get('email'), "password": user.get('password')})
+    return response.json()["access_token"]
+
+
+@pytest.fixture(scope="module")
+def monkeypatch_module():
+    mp = pytest.MonkeyPatch()
+    yield mp
+    mp.undo()
+
+
+@pytest.fixture(scope="module")
+def headers(token):
+    return {"Authorization": f"Bearer {token}"}
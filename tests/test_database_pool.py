@@ -0,0 +1,71 @@
+import tempfile
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+from src.database.pool import MonitoredQueuePool, PoolMonitor, autosize_pool, pool_options
+
+
+def make_settings(**kwargs):
+    settings = dict(DB_POOL_SIZE=1, DB_MAX_OVERFLOW=0, DB_POOL_TIMEOUT=0.1, DB_POOL_RECYCLE=1800,
+                    DB_POOL_PRE_PING=True, DB_POOL_AUTOSIZE=False, DB_MAX_CONNECTIONS=100,
+                    WEB_CONCURRENCY=1, THREADPOOL_SIZE=40)
+    settings.update(kwargs)
+    return SimpleNamespace(**settings)
+
+
+class TestPool(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.url = f"sqlite:///{Path(self.tmp.name) / 'pool.db'}"
+        self.engine = create_engine(self.url, **pool_options(self.url, make_settings()))
+        self.monitor = PoolMonitor("test")
+        self.monitor.attach(self.engine.pool)
+
+    def tearDown(self):
+        self.engine.dispose()
+        self.tmp.cleanup()
+
+    def test_autosize_pool(self):
+        self.assertEqual(autosize_pool(workers=4, threads=40, max_connections=100), (25, 0))
+        self.assertEqual(autosize_pool(workers=2, threads=10, max_connections=100), (10, 40))
+        self.assertEqual(autosize_pool(workers=200, threads=10, max_connections=100), (1, 0))
+
+    def test_pool_options(self):
+        self.assertEqual(pool_options("sqlite://", make_settings()), {})
+        options = pool_options(self.url, make_settings(DB_POOL_AUTOSIZE=True, WEB_CONCURRENCY=4))
+        self.assertIs(options["poolclass"], MonitoredQueuePool)
+        self.assertEqual((options["pool_size"], options["max_overflow"]), (25, 0))
+        options = pool_options(self.url, make_settings(DB_POOL_AUTOSIZE=True), serves_requests=False)
+        self.assertEqual((options["pool_size"], options["max_overflow"]), (1, 0))
+
+    def test_checkout_counters(self):
+        with self.engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+            self.assertEqual(self.monitor.stats(self.engine.pool)["checked_out"], 1)
+        stats = self.monitor.stats(self.engine.pool)
+        self.assertEqual((stats["checkouts"], stats["checkins"], stats["connects"]), (1, 1, 1))
+        self.assertEqual(stats["checked_out"], 0)
+        self.assertGreater(stats["wait_seconds_total"], 0)
+
+    def test_checkout_timeout(self):
+        with self.engine.connect():
+            with self.assertRaises(PoolTimeoutError):
+                self.engine.connect()
+        stats = self.monitor.stats(self.engine.pool)
+        self.assertEqual(stats["timeouts"], 1)
+        self.assertGreaterEqual(stats["wait_seconds_max"], 0.1)
+
+    def test_monitor_survives_dispose(self):
+        self.engine.dispose()
+        with self.engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+        self.assertIs(self.engine.pool.monitor, self.monitor)
+        self.assertEqual(self.monitor.stats(self.engine.pool)["checkouts"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import logging
+import unittest
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+
+from src.database.profiler import QueryProfile, SQLProfiler, SQLProfilerMiddleware, current_profile
+
+
+class TestQueryProfile(unittest.TestCase):
+    def test_record(self):
+        profile = QueryProfile(top=2, repeat_threshold=3)
+        for seconds in (0.1, 0.3, 0.2):
+            profile.record("SELECT * FROM contacts WHERE id = ?", (1,), seconds)
+        profile.record("SELECT * FROM users WHERE id = ?", (1,), 0.05)
+
+        summary = profile.summary()
+        self.assertEqual(summary["queries"], 4)
+        self.assertAlmostEqual(summary["seconds"], 0.65)
+        self.assertEqual([item["seconds"] for item in summary["slowest"]], [0.3, 0.2])
+        self.assertEqual(summary["repeated"], [{"count": 3, "statement": "SELECT * FROM contacts WHERE id = ?"}])
+
+
+class TestSQLProfiler(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine("sqlite://")
+        self.profiler = SQLProfiler(slow_query_seconds=0)
+        self.profiler.install(self.engine)
+
+    def tearDown(self):
+        self.engine.dispose()
+
+    def test_profiles_current_request_only(self):
+        profile = QueryProfile()
+        token = current_profile.set(profile)
+        try:
+            with self.engine.connect() as conn:
+                for i in range(3):
+                    conn.execute(text("SELECT :value"), {"value": i})
+        finally:
+            current_profile.reset(token)
+        with self.engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+
+        self.assertEqual(profile.count, 3)
+        self.assertEqual(profile.repeated(), [("SELECT ?", 3)])
+
+    def test_logs_slow_queries(self):
+        self.profiler.slow_query_seconds = 1e-9
+        with self.assertLogs("src.database.profiler", level=logging.WARNING) as logs:
+            with self.engine.connect() as conn:
+                conn.execute(text("SELECT :value"), {"value": 42})
+        self.assertIn("Slow query", logs.output[0])
+        self.assertIn("42", logs.output[0])
+
+
+class TestSQLProfilerMiddleware(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine("sqlite://")
+        SQLProfiler(slow_query_seconds=0).install(self.engine)
+        self.client = self.make_client()
+
+    def make_client(self, sample_rate=0.0):
+        app = FastAPI()
+
+        @app.get("/")
+        def index():
+            with self.engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+            return {}
+
+        app.add_middleware(SQLProfilerMiddleware, sample_rate=sample_rate, allow_header=True,
+                           authorize=lambda token: token == "secret")
+        return TestClient(app)
+
+    def tearDown(self):
+        self.engine.dispose()
+
+    def test_internal_caller_gets_profile(self):
+        response = self.client.get("/", headers={"X-SQL-Profile": "1", "X-Internal-Token": "secret"})
+        self.assertEqual(response.headers["x-sql-queries"], "1")
+        self.assertTrue(response.headers["server-timing"].startswith("db;dur="))
+        self.assertNotIn("x-sql-queries", self.client.get("/").headers)
+
+    def test_anonymous_caller_gets_no_profile(self):
+        for headers in ({"X-SQL-Profile": "1"}, {"X-SQL-Profile": "1", "X-Internal-Token": "wrong"}):
+            self.assertNotIn("x-sql-queries", self.client.get("/", headers=headers).headers)
+
+    def test_sampled_request_only_logged(self):
+        with self.assertLogs("src.database.profiler", level=logging.INFO) as logs:
+            response = self.make_client(sample_rate=1.0).get("/")
+        self.assertNotIn("x-sql-queries", response.headers)
+        self.assertTrue(any("SQL profile GET /" in line for line in logs.output))
+
+
+if __name__ == '__main__':
+    unittest.main()
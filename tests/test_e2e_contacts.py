@@ -0,0 +1,427 @@
+import json
+from datetime import date, timedelta
+import pytest
+from sqlalchemy import event
+
+from src.database.models import Contact
+from src.schemas import ContactResponse
+from src.services.pagination import encode_cursor
+
+
+@pytest.fixture(scope="module")
+def contacts(client, headers):
+    created = []
+    for i, last_name in enumerate(["Shevchenko", "Franko", "Ukrainka", "Kotsiubynskyi", "Franko"]):
+        contact = {"first_name": f"Name{i}", "last_name": last_name, "email": f"contact{i}@example.com",
+                   "phone_number": "+380123456789", "birthday": "1990-01-01"}
+        reset_limits(client)
+        response = client.post("/contacts/contacts/", json=contact, headers=headers)
+        assert response.status_code == 201, response.text
+        created.append(response.json())
+    return created
+
+
+def reset_limits(client):
+    client.app.state.limiter.reset()
+
+
+def collect_pages(client, headers, url, params):
+    items, cursor = [], ""
+    while cursor is not None:
+        reset_limits(client)
+        response = client.get(url, params={**params, "after": cursor}, headers=headers)
+        assert response.status_code == 200, response.text
+        page = response.json()
+        items.extend(page["items"])
+        cursor = page["next_cursor"]
+    return items
+
+
+def test_get_contacts_cursor_pages(client, headers, contacts):
+    items = collect_pages(client, headers, "/contacts/contacts/", {"limit": 2})
+    assert [item["id"] for item in items] == sorted(contact["id"] for contact in contacts)
+
+
+def test_get_contacts_cursor_sort_last_name(client, headers, contacts):
+    items = collect_pages(client, headers, "/contacts/contacts/", {"limit": 2, "sort": "last_name"})
+    expected = sorted(contacts, key=lambda contact: (contact["last_name"], contact["id"]))
+    assert [item["id"] for item in items] == [contact["id"] for contact in expected]
+
+
+def test_search_contacts_cursor_pages(client, headers, contacts):
+    items = collect_pages(client, headers, "/contacts/contacts/search", {"last_name": "franko", "limit": 1})
+    assert [item["email"] for item in items] == ["contact1@example.com", "contact4@example.com"]
+
+
+def test_get_contacts_invalid_cursor(client, headers, contacts):
+    reset_limits(client)
+    response = client.get("/contacts/contacts/", params={"after": "garbage"}, headers=headers)
+    assert response.status_code == 400, response.text
+    # Курсор приходить від клієнта: неправильна кількість або тип значень - теж 400, а не помилка бази
+    for sort, values in [("id", [1, 2, 3]), ("id", [{"x": 1}]), ("id", ["1"]), ("id", [True]), ("last_name", [1, 2])]:
+        response = client.get("/contacts/contacts/", params={"after": encode_cursor(sort, values), "sort": sort},
+                              headers=headers)
+        assert response.status_code == 400, response.text
+
+
+def test_get_contacts_offset(client, headers, contacts):
+    reset_limits(client)
+    response = client.get("/contacts/contacts/", params={"skip": 1, "limit": 2}, headers=headers)
+    assert response.status_code == 200, response.text
+    assert len(response.json()) == 2
+
+
+def test_search_contacts_q(client, headers, contacts):
+    reset_limits(client)
+    response = client.get("/contacts/contacts/search", params={"q": "FRANK"}, headers=headers)
+    assert response.status_code == 200, response.text
+    assert [item["email"] for item in response.json()] == ["contact1@example.com", "contact4@example.com"]
+
+
+def test_import_contacts_csv(client, headers, contacts):
+    body = ("first_name,last_name,email,phone_number,birthday,additional_data\n"
+            "Lesia,Ukrainka,lesia@example.com,+380123456789,1871-02-25,\"poet,\nplaywright\"\n"
+            "Bad,Phone,bad@example.com,123,,\n"
+            "Dup,Existing,contact0@example.com,+380123456789,,\n"
+            "Lesia,Again,lesia@example.com,+380123456789,,\n"
+            "Short,Row\n")
+    reset_limits(client)
+    response = client.post("/contacts/contacts/import", content=body.encode(),
+                           headers={**headers, "Content-Type": "text/csv"})
+    assert response.status_code == 200, response.text
+    report = response.json()
+    assert report["total"] == 5
+    assert report["imported"] == 1
+    assert [error["row"] for error in report["errors"]] == [2, 3, 4, 5]
+    assert report["errors"][1]["error"] == "Email already exists"
+
+
+def test_import_contacts_ndjson(client, headers, contacts, monkeypatch):
+    monkeypatch.setattr("src.routes.contacts.config.IMPORT_BATCH_SIZE", 2)
+    lines = [
+        '{"first_name": "A", "last_name": "A", "email": "a@example.com", "phone_number": "+380123456789", "birthday": null}',
+        'not json',
+        '{"first_name": "B", "last_name": "B", "email": "b@example.com", "phone_number": "+380123456789", "birthday": "2000-02-29"}',
+        '{"first_name": "C", "last_name": "C", "email": "c@example.com", "phone_number": "+380123456789", "birthday": null}',
+    ]
+    reset_limits(client)
+    response = client.post("/contacts/contacts/import", content="\n".join(lines).encode(),
+                           headers={**headers, "Content-Type": "application/x-ndjson"})
+    assert response.status_code == 200, response.text
+    report = response.json()
+    assert (report["total"], report["imported"], report["failed"]) == (4, 3, 1)
+    assert report["errors"][0]["row"] == 2
+
+
+def test_import_contacts_unsupported(client, headers, contacts):
+    reset_limits(client)
+    response = client.post("/contacts/contacts/import", content=b"{}",
+                           headers={**headers, "Content-Type": "application/json"})
+    assert response.status_code == 415, response.text
+
+
+@pytest.mark.parametrize("fmt, media_type", [("ndjson", "application/x-ndjson"), ("csv", "text/csv"),
+                                             ("vcf", "text/vcard")])
+def test_export_contacts(client, headers, contacts, fmt, media_type, monkeypatch):
+    monkeypatch.setattr("src.routes.contacts.config.EXPORT_BATCH_SIZE", 2)
+    reset_limits(client)
+    response = client.get("/contacts/contacts/export", params={"format": fmt}, headers=headers)
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"].startswith(media_type)
+    body = response.text
+    for contact in contacts:
+        assert contact["email"] in body
+    if fmt == "ndjson":
+        assert all(json.loads(line)["user_id"] for line in body.splitlines())
+    if fmt == "csv":
+        assert body.splitlines()[0].startswith("id,first_name,last_name")
+    if fmt == "vcf":
+        assert body.count("BEGIN:VCARD") == body.count("END:VCARD") >= len(contacts)
+
+
+def test_create_contact_duplicate_email(client, headers, contacts):
+    reset_limits(client)
+    duplicate = {key: contacts[0][key] for key in ("first_name", "last_name", "email", "phone_number", "birthday")}
+    response = client.post("/contacts/contacts/", json=duplicate, headers=headers)
+    assert response.status_code == 400, response.text
+
+
+def test_update_and_delete_contact(client, headers, contacts):
+    reset_limits(client)
+    contact = {"first_name": "Lesia", "last_name": "Kosach", "email": "kosach@example.com",
+               "phone_number": "+380123456789", "birthday": "1990-01-01"}
+    response = client.post("/contacts/contacts/", json=contact, headers=headers)
+    assert response.status_code == 201, response.text
+    contact_id = response.json()["id"]
+
+    birthday = date.today() + timedelta(days=3)
+    response = client.put(f"/contacts/contacts/{contact_id}", json={**contact, "first_name": "Larysa",
+                                                                    "birthday": birthday.replace(year=1992).isoformat()},
+                          headers=headers)
+    assert response.status_code == 200, response.text
+    assert response.json()["first_name"] == "Larysa"
+    # birthday_doy оновлюється разом із датою народження
+    response = client.get("/contacts/contacts/birthdays", params={"days": 7}, headers=headers)
+    assert contact_id in [item["id"] for item in response.json()]
+
+    response = client.delete(f"/contacts/contacts/{contact_id}", headers=headers)
+    assert response.status_code == 200, response.text
+    assert response.json()["first_name"] == "Larysa"
+    response = client.delete(f"/contacts/contacts/{contact_id}", headers=headers)
+    assert response.status_code == 404, response.text
+    response = client.put(f"/contacts/contacts/{contact_id}", json=contact, headers=headers)
+    assert response.status_code == 404, response.text
+
+
+def test_sql_profile_header_ignored_by_default(client, headers, contacts):
+    reset_limits(client)
+    response = client.get("/contacts/contacts/", headers={**headers, "X-SQL-Profile": "1"})
+    assert response.status_code == 200, response.text
+    assert "x-sql-queries" not in response.headers
+    assert "server-timing" not in response.headers
+
+
+def test_list_responses_match_contact_response(client, headers, session, contacts):
+    expected = {contact.id: ContactResponse.model_validate(contact).model_dump(mode="json")
+                for contact in session.query(Contact)}
+    reset_limits(client)
+    response = client.get("/contacts/contacts/", params={"limit": 100}, headers=headers)
+    assert response.headers["content-type"] == "application/json"
+    assert sorted(response.json(), key=lambda item: item["id"]) == sorted(expected.values(), key=lambda item: item["id"])
+    items = collect_pages(client, headers, "/contacts/contacts/search", {"q": "franko", "limit": 1})
+    assert items == [expected[item["id"]] for item in items] and len(items) == 2
+    # Пошук без курсора та дні народження теж віддають лише поля ContactResponse
+    response = client.get("/contacts/contacts/search", params={"q": "franko"}, headers=headers)
+    assert sorted(response.json(), key=lambda item: item["id"]) == [expected[item["id"]] for item in items]
+    response = client.get("/contacts/contacts/birthdays", params={"days": 365}, headers=headers)
+    assert response.json() and all(item == expected[item["id"]] for item in response.json())
+
+
+def test_sparse_fields(client, headers, session, contacts):
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(session.get_bind(), "before_cursor_execute", listener)
+    try:
+        reset_limits(client)
+        response = client.get("/contacts/contacts/", params={"fields": "last_name,id, first_name"}, headers=headers)
+        assert response.status_code == 200, response.text
+        assert all(list(item) == ["id", "first_name", "last_name"] for item in response.json())
+        selects = [statement for statement in statements if "FROM contacts" in statement]
+        assert selects and "phone_number" not in selects[-1]
+    finally:
+        event.remove(session.get_bind(), "before_cursor_execute", listener)
+
+    items = collect_pages(client, headers, "/contacts/contacts/search",
+                          {"q": "franko", "limit": 1, "sort": "last_name", "fields": "email"})
+    assert [list(item) for item in items] == [["email"], ["email"]]
+
+    reset_limits(client)
+    response = client.get("/contacts/contacts/birthdays", params={"days": 365, "fields": "id,birthday"},
+                          headers=headers)
+    assert response.status_code == 200, response.text
+    assert all(list(item) == ["id", "birthday"] for item in response.json())
+
+    reset_limits(client)
+    response = client.get(f"/contacts/contacts/{contacts[0]['id']}", params={"fields": "first_name"}, headers=headers)
+    assert response.json() == {"first_name": contacts[0]["first_name"]}
+    reset_limits(client)
+    response = client.get(f"/contacts/contacts/{contacts[0]['id']}", headers=headers)
+    assert response.json() == contacts[0]
+
+    reset_limits(client)
+    response = client.get("/contacts/contacts/", params={"fields": "id,password"}, headers=headers)
+    assert response.status_code == 400, response.text
+    assert "password" in response.json()["detail"]
+
+
+def test_compressed_listing(client, headers, contacts):
+    reset_limits(client)
+    response = client.get("/contacts/contacts/", params={"limit": 100}, headers={**headers, "Accept-Encoding": "br"})
+    assert response.headers["content-encoding"] == "br"
+    assert {contact["id"] for contact in contacts} <= {item["id"] for item in response.json()}
+    reset_limits(client)
+    response = client.get("/contacts/contacts/", params={"limit": 1, "fields": "id"},
+                          headers={**headers, "Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+
+
+def test_changes(client, headers, contacts):
+    reset_limits(client)
+    response = client.get("/contacts/contacts/changes", params={"limit": 1000}, headers=headers)
+    assert response.status_code == 200, response.text
+    data = response.json()
+    seqs = [change["seq"] for change in data["changes"]]
+    assert seqs == sorted(seqs) and not data["has_more"]
+    assert {contact["id"] for contact in contacts} <= {change["id"] for change in data["changes"]}
+    since = data["next_since"]
+
+    created = []
+    for name in ("Olena", "Marko"):
+        reset_limits(client)
+        response = client.post("/contacts/contacts/", json={"first_name": name, "last_name": "Vovchok",
+                                                            "email": f"{name.lower()}.vovchok@example.com",
+                                                            "phone_number": "+380123456789", "birthday": None},
+                               headers=headers)
+        created.append(response.json())
+    reset_limits(client)
+    client.put(f"/contacts/contacts/{created[0]['id']}", json={**created[0], "first_name": "Olenka"}, headers=headers)
+    reset_limits(client)
+    client.delete(f"/contacts/contacts/{created[1]['id']}", headers=headers)
+
+    reset_limits(client)
+    data = client.get("/contacts/contacts/changes", params={"since": since}, headers=headers).json()
+    assert [(change["op"], change["id"]) for change in data["changes"]] == [("upsert", created[0]["id"]),
+                                                                             ("delete", created[1]["id"])]
+    assert data["changes"][0]["contact"]["first_name"] == "Olenka"
+    assert data["changes"][1]["contact"] is None
+    # Номери зростають, але можуть мати пропуски (наприклад, після відкату транзакції)
+    assert since < data["changes"][0]["seq"] < data["changes"][1]["seq"] == data["next_since"]
+    last = data["next_since"]
+
+    reset_limits(client)
+    data = client.get("/contacts/contacts/changes", params={"since": since, "limit": 1}, headers=headers).json()
+    assert len(data["changes"]) == 1 and data["has_more"]
+    reset_limits(client)
+    data = client.get("/contacts/contacts/changes", params={"since": data["next_since"], "limit": 1},
+                      headers=headers).json()
+    assert data["changes"][0]["op"] == "delete" and not data["has_more"]
+
+    reset_limits(client)
+    data = client.get("/contacts/contacts/changes", params={"since": last}, headers=headers).json()
+    assert data == {"changes": [], "next_since": last, "has_more": False}
+
+
+def test_stream_requires_token(client):
+    # Маршрут оголошено перед /{contact_id}, тож "stream" не розбирається як id контакту
+    reset_limits(client)
+    response = client.get("/contacts/contacts/stream")
+    assert response.status_code == 401, response.text
+
+
+def test_conditional_get(client, headers, session, contacts):
+    reset_limits(client)
+    response = client.get("/contacts/contacts/", headers=headers)
+    assert response.status_code == 200, response.text
+    etag = response.headers["etag"]
+    assert etag.startswith('W/"') and response.headers["cache-control"] == "private, no-cache"
+
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(session.get_bind(), "before_cursor_execute", listener)
+    try:
+        reset_limits(client)
+        response = client.get("/contacts/contacts/", headers={**headers, "If-None-Match": etag})
+        assert response.status_code == 304 and response.content == b""
+        assert response.headers["etag"] == etag
+        # Лише запит версії, без вибірки самих контактів
+        assert not [statement for statement in statements if "FROM contacts" in statement]
+    finally:
+        event.remove(session.get_bind(), "before_cursor_execute", listener)
+
+    reset_limits(client)
+    response = client.get("/contacts/contacts/", params={"after": ""}, headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 304
+
+    reset_limits(client)
+    response = client.get("/contacts/contacts/birthdays", headers=headers)
+    birthdays_etag = response.headers["etag"]
+    assert birthdays_etag != etag and date.today().isoformat() in birthdays_etag
+    reset_limits(client)
+    response = client.get("/contacts/contacts/birthdays", headers={**headers, "If-None-Match": birthdays_etag})
+    assert response.status_code == 304
+
+    contact_id = contacts[0]["id"]
+    reset_limits(client)
+    response = client.get(f"/contacts/contacts/{contact_id}", headers=headers)
+    assert response.json() == contacts[0]
+    row_etag, last_modified = response.headers["etag"], response.headers["last-modified"]
+    reset_limits(client)
+    response = client.get(f"/contacts/contacts/{contact_id}", headers={**headers, "If-None-Match": f'"x", {row_etag}'})
+    assert response.status_code == 304
+    reset_limits(client)
+    response = client.get(f"/contacts/contacts/{contact_id}", headers={**headers, "If-Modified-Since": last_modified})
+    assert response.status_code == 304
+
+    reset_limits(client)
+    response = client.put(f"/contacts/contacts/{contact_id}", json={**{key: value for key, value in contacts[0].items() if key not in ("id", "user_id")},
+                                "first_name": "Etag"}, headers=headers)
+    assert response.status_code == 200, response.text
+    reset_limits(client)
+    response = client.get(f"/contacts/contacts/{contact_id}", headers={**headers, "If-None-Match": row_etag})
+    assert response.status_code == 200 and response.json()["first_name"] == "Etag"
+    assert response.headers["etag"] != row_etag
+    reset_limits(client)
+    response = client.get("/contacts/contacts/", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200 and response.headers["etag"] != etag
+
+
+def test_cached_listing(client, headers, session, contacts):
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(session.get_bind(), "before_cursor_execute", listener)
+    try:
+        for path in ("/contacts/contacts/", "/contacts/contacts/birthdays"):
+            reset_limits(client)
+            first = client.get(path, params={"fields": "id,email"}, headers=headers)
+            statements.clear()
+            reset_limits(client)
+            second = client.get(path, params={"fields": "id,email"}, headers=headers)
+            assert second.json() == first.json()
+            # Лише запит версії, сам список узято з кешу
+            assert not [statement for statement in statements if "FROM contacts" in statement]
+    finally:
+        event.remove(session.get_bind(), "before_cursor_execute", listener)
+
+    reset_limits(client)
+    response = client.delete(f"/contacts/contacts/{contacts[1]['id']}", headers=headers)
+    assert response.status_code == 200, response.text
+    reset_limits(client)
+    response = client.get("/contacts/contacts/", params={"fields": "id,email"}, headers=headers)
+    assert contacts[1]["id"] not in [item["id"] for item in response.json()]
+
+
+def test_batch_endpoints(client, headers, contacts):
+    first, second, third = contacts[0], contacts[2], contacts[3]
+    reset_limits(client)
+    response = client.post("/contacts/contacts/batch-get", json={"ids": [second["id"], 999999, first["id"]]},
+                           headers=headers)
+    assert response.status_code == 200, response.text
+    results = response.json()["results"]
+    assert [(item["id"], item["status"]) for item in results] == [(second["id"], "ok"), (999999, "not_found"),
+                                                                  (first["id"], "ok")]
+    assert results[0]["contact"]["email"] == second["email"] and results[1]["contact"] is None
+
+    reset_limits(client)
+    response = client.patch("/contacts/contacts/batch", json={"items": [
+        {"id": second["id"], "first_name": "Batch", "birthday": None},
+        {"id": third["id"], "email": first["email"]},
+        {"id": 999999, "last_name": "Missing"},
+    ]}, headers=headers)
+    assert response.status_code == 200, response.text
+    results = response.json()["results"]
+    assert [item["status"] for item in results] == ["ok", "conflict", "not_found"]
+    assert results[0]["contact"] == {**second, "first_name": "Batch", "birthday": None}
+    reset_limits(client)
+    response = client.get(f"/contacts/contacts/{third['id']}", headers=headers)
+    assert response.json()["email"] == third["email"]
+
+    reset_limits(client)
+    response = client.request("DELETE", "/contacts/contacts/batch", json={"ids": [third["id"], 999999]},
+                              headers=headers)
+    assert [item["status"] for item in response.json()["results"]] == ["ok", "not_found"]
+    reset_limits(client)
+    response = client.get(f"/contacts/contacts/{third['id']}", headers=headers)
+    assert response.status_code == 404
+
+    reset_limits(client)
+    response = client.post("/contacts/contacts/batch-get", json={"ids": [1, 1]}, headers=headers)
+    assert response.status_code == 422
+    response = client.post("/contacts/contacts/batch-get", json={"ids": list(range(101))}, headers=headers)
+    assert response.status_code == 422
+
+    # Пакет рахується за кількістю контактів: два по 60 перевищують 100 на хвилину
+    reset_limits(client)
+    response = client.post("/contacts/contacts/batch-get", json={"ids": list(range(60))}, headers=headers)
+    assert response.status_code == 200, response.text
+    response = client.post("/contacts/contacts/batch-get", json={"ids": list(range(60))}, headers=headers)
+    assert response.status_code == 429
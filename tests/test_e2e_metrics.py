@@ -0,0 +1,82 @@
+import re
+
+import pytest
+from prometheus_client import CollectorRegistry
+
+from src.services.metrics import metrics_registry
+
+
+def sample(text, name, **labels):
+    pattern = re.escape(name) + r"\{" + "".join(f'(?=[^}}]*{key}="{re.escape(value)}")' for key, value in labels.items())
+    values = [float(line.rsplit(" ", 1)[1]) for line in text.splitlines()
+              if re.match(pattern, line)]
+    return sum(values)
+
+
+def test_metrics_requests(client, headers):
+    client.app.state.limiter.reset()
+    before = client.get("/metrics").text
+    for _ in range(2):
+        response = client.get("/contacts/contacts/", headers=headers)
+        assert response.status_code in (200, 404), response.text
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    after = response.text
+
+    labels = dict(method="GET", route="/contacts/contacts/")
+    assert (sample(after, "http_requests_total", **labels)
+            - sample(before, "http_requests_total", **labels)) == 2
+    assert (sample(after, "http_request_duration_seconds_count", **labels)
+            - sample(before, "http_request_duration_seconds_count", **labels)) == 2
+    # Кожен запит читає контакти з бази
+    route = dict(route="/contacts/contacts/")
+    assert (sample(after, "db_queries_per_request_sum", **route)
+            - sample(before, "db_queries_per_request_sum", **route)) >= 2
+    assert "http_requests_in_progress" in after
+
+
+def test_metrics_route_templates(client, headers):
+    client.app.state.limiter.reset()
+    client.get("/contacts/contacts/123456", headers=headers)
+    text = client.get("/metrics").text
+    assert 'route="/contacts/contacts/{contact_id}"' in text
+    assert "/contacts/contacts/123456" not in text
+
+
+def test_metrics_middleware_rejections(client):
+    labels = dict(method="GET", route="<unmatched>", status="403")
+    before = sample(client.get("/metrics").text, "http_requests_total", **labels)
+    response = client.get("/", headers={"User-Agent": "Googlebot"})
+    assert response.status_code == 403
+    # Відмова middleware до маршрутизації теж рахується
+    after = sample(client.get("/metrics").text, "http_requests_total", **labels)
+    assert after - before == 1
+
+
+def test_metrics_rate_limited(client, headers):
+    client.app.state.limiter.reset()
+    before = sample(client.get("/metrics").text, "rate_limit_rejections_total", route="/contacts/contacts/")
+    statuses = [client.get("/contacts/contacts/", headers=headers).status_code for _ in range(11)]
+    assert 429 in statuses
+    after = sample(client.get("/metrics").text, "rate_limit_rejections_total", route="/contacts/contacts/")
+    assert after - before == statuses.count(429)
+    client.app.state.limiter.reset()
+
+
+def test_metrics_registry_multiprocess(tmp_path, monkeypatch):
+    monkeypatch.setenv("PROMETHEUS_MULTIPROC_DIR", str(tmp_path))
+    registry = metrics_registry()
+    assert isinstance(registry, CollectorRegistry)
+    assert list(registry.collect()) == []
+
+
+@pytest.mark.parametrize("path", ["hashing", "email", "principals", "queries", "pool"])
+def test_internal_requires_token(client, monkeypatch, path):
+    monkeypatch.setattr("src.services.auth.config.INTERNAL_API_TOKEN", None)
+    assert client.get(f"/internal/{path}").status_code == 404
+    monkeypatch.setattr("src.services.auth.config.INTERNAL_API_TOKEN", "secret")
+    assert client.get(f"/internal/{path}").status_code == 403
+    assert client.get(f"/internal/{path}", headers={"X-Internal-Token": "wrong"}).status_code == 403
+    response = client.get(f"/internal/{path}", headers={"X-Internal-Token": "secret"})
+    assert response.status_code == 200, response.text
@@ -0,0 +1,157 @@
+import io
+
+import pytest
+from jose import jwt
+from PIL import Image
+from sqlalchemy import event
+
+from src.repository import users_async
+from src.services.cache import principal_cache
+from src.services.storage import LocalStorage, get_avatar_storage
+
+
+class CountingStorage(LocalStorage):
+    def __init__(self, root: str, base_url: str):
+        super().__init__(root, base_url)
+        self.saved = []
+
+    async def save(self, key: str, data: bytes, content_type: str, version: str) -> str:
+        self.saved.append(version)
+        return await super().save(key, data, content_type, version)
+
+
+@pytest.fixture(scope="module")
+def storage(client, tmp_path_factory):
+    storage = CountingStorage(str(tmp_path_factory.mktemp("avatars")), "/static/avatars")
+    client.app.dependency_overrides[get_avatar_storage] = lambda: storage
+    yield storage
+    client.app.dependency_overrides.pop(get_avatar_storage, None)
+
+
+def make_image(size=(640, 480), color=(200, 30, 30), fmt="JPEG") -> bytes:
+    output = io.BytesIO()
+    Image.new("RGB", size, color).save(output, format=fmt)
+    return output.getvalue()
+
+
+def upload(client, headers, data, content_type="image/jpeg"):
+    client.app.state.limiter.reset()
+    return client.patch("/users/users/avatar", files={"file": ("avatar.jpg", data, content_type)}, headers=headers)
+
+
+def test_update_avatar(client, headers, storage):
+    response = upload(client, headers, make_image())
+    assert response.status_code == 200, response.text
+    assert len(storage.saved) == 1
+    user_id = response.json()["id"]
+    assert response.json()["avatar"] == f"/static/avatars/{user_id}.png?v={storage.saved[0]}"
+    with Image.open(storage.root / f"{user_id}.png") as avatar:
+        assert avatar.size == (250, 250)
+        assert avatar.format == "PNG"
+
+
+def test_update_avatar_same_image_skips_upload(client, headers, storage):
+    saved = len(storage.saved)
+    response = upload(client, headers, make_image())
+    assert response.status_code == 200, response.text
+    assert len(storage.saved) == saved
+
+
+def test_update_avatar_new_image(client, headers, storage):
+    saved = len(storage.saved)
+    response = upload(client, headers, make_image(color=(30, 200, 30), fmt="PNG"), "image/png")
+    assert response.status_code == 200, response.text
+    assert len(storage.saved) == saved + 1
+    assert response.json()["avatar"].endswith(storage.saved[-1])
+    # Новий аватар замінює файл старого, а не лягає поруч
+    assert [path.name for path in storage.root.iterdir()] == [f"{response.json()['id']}.png"]
+
+
+def test_update_avatar_too_large(client, headers, storage, monkeypatch):
+    monkeypatch.setattr("src.routes.users.config.AVATAR_MAX_BYTES", 1024)
+    response = upload(client, headers, make_image(size=(1024, 1024), color=(1, 2, 3), fmt="BMP"), "image/bmp")
+    assert response.status_code == 413, response.text
+
+
+def test_update_avatar_too_large_content_length(client, headers, storage, monkeypatch):
+    monkeypatch.setattr("src.routes.users.config.AVATAR_MAX_BYTES", 1024)
+    saved = len(storage.saved)
+    response = upload(client, headers, b"\0" * 64 * 1024, "image/png")
+    assert response.status_code == 413, response.text
+    assert len(storage.saved) == saved
+
+
+def test_update_avatar_invalid_image(client, headers, storage):
+    response = upload(client, headers, b"not an image", "image/png")
+    assert response.status_code == 400, response.text
+
+
+def test_update_avatar_invalid_type(client, headers, storage):
+    response = upload(client, headers, b"plain text", "text/plain")
+    assert response.status_code == 400, response.text
+
+
+def test_current_user_is_cached(client, headers, storage, monkeypatch):
+    calls = []
+    get_user_by_email = users_async.get_user_by_email
+
+    async def counting_get_user_by_email(db, email):
+        calls.append(email)
+        return await get_user_by_email(db, email)
+
+    image = make_image(color=(120, 120, 120))
+    upload(client, headers, image)
+    monkeypatch.setattr("src.services.auth.users_async.get_user_by_email", counting_get_user_by_email)
+    # Зміна аватара скинула кеш: перший запит читає користувача, наступні - з кешу
+    for _ in range(3):
+        response = upload(client, headers, image)
+        assert response.status_code == 200, response.text
+    assert len(calls) == 1
+
+
+def test_contacts_skip_users_table(client, session, headers):
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(session.get_bind(), "before_cursor_execute", listener)
+    try:
+        for _ in range(3):
+            client.app.state.limiter.reset()
+            response = client.get("/contacts/contacts/", headers=headers)
+            assert response.status_code in (200, 404), response.text
+    finally:
+        event.remove(session.get_bind(), "before_cursor_execute", listener)
+    # Лише перший запит читає версію токена, далі - жодного запиту до users
+    assert len([statement for statement in statements if "FROM users" in statement]) <= 1
+    assert statements and "FROM users" not in statements[-1]
+
+
+def test_update_avatar_invalidates_cached_user(client, headers, storage):
+    principal_cache.clear()
+    first = upload(client, headers, make_image(color=(10, 10, 200))).json()["avatar"]
+    second = upload(client, headers, make_image(color=(10, 200, 200))).json()["avatar"]
+    assert first != second
+    # Повторне завантаження порівнюється з оновленим хешем, а не з кешованим
+    saved = len(storage.saved)
+    response = upload(client, headers, make_image(color=(10, 200, 200)))
+    assert response.json()["avatar"] == second
+    assert len(storage.saved) == saved
+
+
+def test_revoke_tokens(client, user):
+    client.app.state.limiter.reset()
+    tokens = client.post("auth/auth/token", data={"username": user["email"], "password": user["password"]}).json()
+    headers = {"Authorization": f"Bearer {tokens['access_token']}"}
+    claims = jwt.get_unverified_claims(tokens["access_token"])
+    assert {"sub", "uid", "confirmed", "ver"} <= set(claims)
+
+    response = client.post("auth/auth/revoke", headers=headers)
+    assert response.status_code == 204, response.text
+    response = client.get("/contacts/contacts/", headers=headers)
+    assert response.status_code == 401, response.text
+    response = client.post("auth/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert response.status_code == 401, response.text
+
+    tokens = client.post("auth/auth/token", data={"username": user["email"], "password": user["password"]}).json()
+    assert jwt.get_unverified_claims(tokens["access_token"])["ver"] == claims["ver"] + 1
+    response = client.get("/contacts/contacts/", headers={"Authorization": f"Bearer {tokens['access_token']}"})
+    assert response.status_code in (200, 404), response.text
@@ -1,16 +1,23 @@
 import unittest
 from unittest.mock import Mock, patch, MagicMock
 
+from sqlalchemy.dialects import sqlite
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
+from datetime import date
 from src.repository.contacts import (create_contact, get_contacts, get_contact, update_contact,
-                                     delete_contact, search_contacts, get_upcoming_birthdays)
+                                     delete_contact, search_contacts, get_upcoming_birthdays, birthday_windows)
 from src.database.models import Contact
 from src.schemas import ContactSchema
 
 class TestContacts(unittest.TestCase):
     def setUp(self):
         self.db_session_mock = MagicMock(spec=Session)
+        # За замовчуванням перевіряємо шлях для бекендів без RETURNING
+        self.dialect_mock = self.db_session_mock.get_bind.return_value.dialect
+        self.dialect_mock.name = "mysql"
+        self.dialect_mock.insert_returning = self.dialect_mock.update_returning = False
+        self.dialect_mock.delete_returning = False
 
     def test_create_contact(self):
         # Підготовка тестових даних
@@ -179,6 +186,50 @@ class TestContacts(unittest.TestCase):
         with self.assertRaises(SQLAlchemyError):
             delete_contact(self.db_session_mock, user_id, contact_id)
 
+    def test_write_contact_returning(self):
+        self.dialect_mock.name = "sqlite"
+        self.dialect_mock.insert_returning = self.dialect_mock.update_returning = True
+        self.dialect_mock.delete_returning = True
+        row = Mock()
+        self.db_session_mock.execute.return_value.first.return_value = row
+        contact_data = {'first_name': 'Ivan', 'last_name': 'Ivanenko', 'email': 'ivan@example.com',
+                        'phone_number': '+380123456789', 'birthday': date(1990, 1, 1)}
+
+        self.assertEqual(create_contact(self.db_session_mock, contact_data, 1), row)
+        self.assertEqual(update_contact(self.db_session_mock, 1, 1, {'birthday': date(1990, 3, 1)}), row)
+        self.assertEqual(delete_contact(self.db_session_mock, 1, 1), row)
+
+        # Номер зміни, потім одна інструкція запису, що його й записує (надгробок для видалення), та commit,
+        # без SELECT та refresh
+        self.assertEqual(self.db_session_mock.execute.call_count, 7)
+        self.assertEqual(self.db_session_mock.commit.call_count, 3)
+        self.db_session_mock.query.assert_not_called()
+        self.db_session_mock.refresh.assert_not_called()
+        statements = [call.args[0] for call in self.db_session_mock.execute.call_args_list]
+        seq_sql = str(statements[0].compile(dialect=sqlite.dialect()))
+        self.assertIn("ON CONFLICT (user_id) DO UPDATE SET last_seq", seq_sql)
+        insert_sql = str(statements[1].compile(dialect=sqlite.dialect()))
+        self.assertIn("ON CONFLICT (email) DO NOTHING RETURNING", insert_sql)
+        self.assertIn("seq", statements[1].compile().params)
+        update_params = statements[3].compile().params
+        self.assertEqual(update_params["birthday_doy"], 61)
+        self.assertIn("seq", update_params)
+        self.assertIn("DELETE FROM contacts", str(statements[5]))
+        self.assertIn("INSERT INTO contact_tombstones", str(statements[6]))
+
+    def test_write_contact_returning_not_found(self):
+        self.dialect_mock.name = "sqlite"
+        self.dialect_mock.insert_returning = self.dialect_mock.update_returning = True
+        self.dialect_mock.delete_returning = True
+        self.db_session_mock.execute.return_value.first.return_value = None
+        self.assertIsNone(update_contact(self.db_session_mock, 1, 1, {'first_name': 'John'}))
+        self.assertIsNone(delete_contact(self.db_session_mock, 1, 1))
+        self.db_session_mock.query.assert_not_called()
+        # Номер зміни резервується першим, але відкат повертає його, якщо запис нічого не змінив
+        self.assertEqual(self.db_session_mock.execute.call_count, 4)
+        self.assertEqual(self.db_session_mock.rollback.call_count, 2)
+        self.db_session_mock.commit.assert_not_called()
+
     def test_search_contacts(self):
         user_id = 1
         test_contacts = [Contact(id=1, first_name='Ivan', last_name='Ivanenko', email='ivan@example.com',
@@ -210,6 +261,7 @@ class TestContacts(unittest.TestCase):
         # Сценарій, коли дні народження не існують
         query_mock = self.db_session_mock.query.return_value
         query_mock.filter.return_value = query_mock  # Повертає сам себе при виклику filter
+        query_mock.order_by.return_value = query_mock
         query_mock.all.return_value = []
         result = get_upcoming_birthdays(self.db_session_mock, user_id)
         self.assertEqual(result, [])
@@ -217,10 +269,23 @@ class TestContacts(unittest.TestCase):
         # Сценарій, коли дні народження існують
         query_mock = self.db_session_mock.query.return_value
         query_mock.filter.return_value = query_mock  # Повертає сам себе при виклику filter
+        query_mock.order_by.return_value = query_mock
         query_mock.all.return_value = test_birthdays
         result = get_upcoming_birthdays(self.db_session_mock, user_id)
         self.assertEqual(result, test_birthdays)
 
+    def test_birthday_windows(self):
+        # Діапазон у межах року
+        self.assertEqual(birthday_windows(date(2023, 5, 1), 7), [(122, 129)])
+        # Діапазон перетинає кінець року
+        self.assertEqual(birthday_windows(date(2023, 12, 28), 7), [(363, 366), (1, 4)])
+        # У невисокосному році 29 лютого святкують 28 лютого
+        self.assertEqual(birthday_windows(date(2023, 2, 21), 7), [(52, 60)])
+        self.assertEqual(birthday_windows(date(2024, 2, 21), 7), [(52, 59)])
+        self.assertEqual(birthday_windows(date(2023, 3, 1), 0), [(61, 61)])
+        # Увесь рік
+        self.assertEqual(birthday_windows(date(2023, 7, 1), 365), [(1, 366)])
+
     def tearDown (self):
         self.db_session_mock.reset_mock()
 
@@ -0,0 +1,262 @@
+import asyncio
+import json
+import unittest
+from unittest.mock import patch
+from datetime import date, timedelta
+
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from src.database.db import Base
+from src.database.models import User
+from src.repository import contacts
+from src.repository.contacts_async import (create_contact, get_contacts, get_contact, update_contact,
+                                           delete_contact, search_contacts, get_upcoming_birthdays,
+                                           stream_contacts, get_contacts_rows, get_contacts_page,
+                                           get_contacts_page_rows, search_contacts_rows, search_contacts_page,
+                                           search_contacts_page_rows, get_upcoming_birthdays_rows,
+                                           bulk_create_contacts, get_changes, get_contacts_by_ids,
+                                           update_contacts, delete_contacts, get_contacts_version)
+from src.schemas import ContactResponse
+from src.services.events import event_hub
+from src.repository.users_async import get_user_by_email, register_user, confirm_email, update_avatar
+
+
+class TestContactsAsync(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.engine = create_async_engine("sqlite+aiosqlite://")
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        self.db = async_sessionmaker(self.engine, expire_on_commit=False)()
+        self.user = await register_user(self.db, "test", "test@example.com", "hashedpassword")
+        # Відкат невдалого запису робить expire усім об'єктам сесії, тож користувача тримаємо від'єднаним
+        self.db.expunge(self.user)
+
+    def contact_data(self, **kwargs):
+        data = {
+            'first_name': 'Ivan',
+            'last_name': 'Ivanenko',
+            'email': 'ivan@example.com',
+            'phone_number': '+380123456789',
+            'birthday': date(1990, 1, 1),
+        }
+        data.update(kwargs)
+        return data
+
+    async def test_create_contact(self):
+        result = await create_contact(self.db, self.contact_data(), self.user.id)
+        self.assertIsNotNone(result.id)
+        self.assertEqual(result.user_id, self.user.id)
+
+        # Сценарій, коли контакт вже існує
+        result = await create_contact(self.db, self.contact_data(), self.user.id)
+        self.assertIsNone(result)
+
+    async def test_get_contacts(self):
+        result = await get_contacts(self.db, self.user.id)
+        self.assertIsNone(result)
+
+        await create_contact(self.db, self.contact_data(), self.user.id)
+        await create_contact(self.db, self.contact_data(email='petro@example.com'), self.user.id)
+        result = await get_contacts(self.db, self.user.id, 1, 10)
+        self.assertEqual([contact.email for contact in result], ['petro@example.com'])
+
+    async def test_update_and_delete_contact(self):
+        contact = await create_contact(self.db, self.contact_data(), self.user.id)
+
+        result = await update_contact(self.db, self.user.id, contact.id, {'first_name': 'John'})
+        self.assertEqual(result.first_name, 'John')
+        self.assertIsNone(await update_contact(self.db, self.user.id + 1, contact.id, {'first_name': 'John'}))
+
+        result = await delete_contact(self.db, self.user.id, contact.id)
+        self.assertEqual(result.id, contact.id)
+        self.assertIsNone(await get_contact(self.db, self.user.id, contact.id))
+
+    async def test_search_contacts(self):
+        await create_contact(self.db, self.contact_data(), self.user.id)
+        await create_contact(self.db, self.contact_data(first_name='John', email='john@example.com'), self.user.id)
+
+        result = await search_contacts(self.db, self.user.id, first_name='joh')
+        self.assertEqual([contact.email for contact in result], ['john@example.com'])
+
+    async def test_search_contacts_q(self):
+        await create_contact(self.db, self.contact_data(first_name='Taras', last_name='Shevchenko',
+                                                        email='kobzar@example.com'), self.user.id)
+        await create_contact(self.db, self.contact_data(first_name='Ivan', last_name='Franko',
+                                                        email='shevchenko.fan@example.com'), self.user.id)
+        await create_contact(self.db, self.contact_data(email='other@example.com'), self.user.id)
+
+        result = await search_contacts(self.db, self.user.id, q='shevch')
+        self.assertEqual({contact.first_name for contact in result}, {'Taras', 'Ivan'})
+
+        # Індекс оновлюється при зміні та видаленні контакту
+        await update_contact(self.db, self.user.id, result[0].id, {'last_name': 'Kotliarevskyi'})
+        await delete_contact(self.db, self.user.id, result[1].id)
+        result = await search_contacts(self.db, self.user.id, q='KOTLIAR')
+        self.assertEqual(len(result), 1)
+        self.assertEqual(await search_contacts(self.db, self.user.id, q='shevch'), [])
+
+    async def test_get_upcoming_birthdays(self):
+        soon = date.today() + timedelta(days=2)
+        later = date.today() + timedelta(days=20)
+        await create_contact(self.db, self.contact_data(birthday=later.replace(year=1992)), self.user.id)
+        contact = await create_contact(self.db, self.contact_data(email='petro@example.com',
+                                                                  birthday=soon.replace(year=1992)), self.user.id)
+
+        result = await get_upcoming_birthdays(self.db, self.user.id)
+        self.assertEqual([c.id for c in result], [contact.id])
+        result = await get_upcoming_birthdays(self.db, self.user.id, 30)
+        self.assertEqual(len(result), 2)
+        self.assertEqual(result[0].id, contact.id)
+
+        # birthday_doy оновлюється разом з birthday
+        await update_contact(self.db, self.user.id, contact.id, {'birthday': later.replace(year=1992)})
+        self.assertEqual(await get_upcoming_birthdays(self.db, self.user.id), [])
+
+    async def test_rows_match_orm(self):
+        self.assertIsNone(await get_contacts_rows(self.db, self.user.id))
+        soon = date.today() + timedelta(days=2)
+        for i, last_name in enumerate(['Franko', 'Shevchenko', 'Frankiv']):
+            await create_contact(self.db, self.contact_data(last_name=last_name, email=f'contact{i}@example.com',
+                                                            birthday=soon.replace(year=1990 + i)), self.user.id)
+
+        def api(contacts):
+            return [ContactResponse.model_validate(contact).model_dump() for contact in contacts]
+
+        rows = await get_contacts_rows(self.db, self.user.id)
+        self.assertEqual(sorted(api(rows), key=lambda item: item['id']),
+                         sorted(api(await get_contacts(self.db, self.user.id)), key=lambda item: item['id']))
+        rows, after = await get_contacts_page_rows(self.db, self.user.id, None, 2, 'last_name')
+        contacts, contacts_after = await get_contacts_page(self.db, self.user.id, None, 2, 'last_name')
+        self.assertEqual((api(rows), after), (api(contacts), contacts_after))
+        rows, after = await search_contacts_page_rows(self.db, self.user.id, q='fran', limit=1)
+        contacts, contacts_after = await search_contacts_page(self.db, self.user.id, q='fran', limit=1)
+        self.assertEqual((api(rows), after), (api(contacts), contacts_after))
+
+        # Без курсора пошук і дні народження віддають лише поля ContactResponse, без службових колонок
+        rows = await search_contacts_rows(self.db, self.user.id, q='fran')
+        self.assertEqual([row._asdict() for row in rows],
+                         api(await search_contacts(self.db, self.user.id, q='fran')))
+        rows = await get_upcoming_birthdays_rows(self.db, self.user.id)
+        self.assertEqual([row._asdict() for row in rows], api(await get_upcoming_birthdays(self.db, self.user.id)))
+        self.assertEqual(list(rows[0]._fields), list(ContactResponse.model_fields))
+
+    async def test_changes(self):
+        first = await create_contact(self.db, self.contact_data(), self.user.id)
+        await bulk_create_contacts(self.db, [self.contact_data(email=f'bulk{i}@example.com') for i in range(2)],
+                                   self.user.id)
+        await update_contact(self.db, self.user.id, first.id, {'first_name': 'John'})
+        second = next(contact for contact in await get_contacts(self.db, self.user.id)
+                      if contact.email == 'bulk0@example.com')
+        await delete_contact(self.db, self.user.id, second.id)
+
+        changes, has_more = await get_changes(self.db, self.user.id)
+        self.assertEqual([(op, row.seq) for op, row in changes],
+                         [('upsert', 3), ('upsert', 4), ('delete', 5)])
+        self.assertEqual((changes[1][1].first_name, changes[2][1].id), ('John', second.id))
+        self.assertFalse(has_more)
+
+        changes, has_more = await get_changes(self.db, self.user.id, since=3, limit=1)
+        self.assertEqual([row.seq for _, row in changes], [4])
+        self.assertTrue(has_more)
+        self.assertEqual(await get_changes(self.db, self.user.id, since=5), ([], False))
+
+    async def test_bulk_create_race(self):
+        await create_contact(self.db, self.contact_data(), self.user.id)
+        data = [self.contact_data(), self.contact_data(email='petro@example.com')]
+        self.assertEqual(await bulk_create_contacts(self.db, data, self.user.id), {'ivan@example.com'})
+
+        # Контакт, створений паралельним запитом після перевірки, пропускається ON CONFLICT, а не падає з IntegrityError
+        data = [self.contact_data(), self.contact_data(email='olena@example.com')]
+        with patch('src.repository.contacts_async.bulk_rows',
+                   side_effect=lambda rows, user_id, existing: contacts.bulk_rows(rows, user_id, set())):
+            self.assertEqual(await bulk_create_contacts(self.db, data, self.user.id), {'ivan@example.com'})
+        self.assertEqual(sorted(contact.email for contact in await get_contacts(self.db, self.user.id)),
+                         ['ivan@example.com', 'olena@example.com', 'petro@example.com'])
+
+    async def test_no_change_keeps_version(self):
+        from src.repository.contacts_async import get_contacts_version
+        contact = await create_contact(self.db, self.contact_data(), self.user.id)
+        version = await get_contacts_version(self.db, self.user.id)
+        self.assertIsNone(await create_contact(self.db, self.contact_data(), self.user.id))
+        self.assertIsNone(await update_contact(self.db, self.user.id, contact.id + 1, {'first_name': 'John'}))
+        self.assertEqual(await get_contacts_version(self.db, self.user.id), version)
+
+    async def test_no_change_keeps_version(self):
+        contact = await create_contact(self.db, self.contact_data(), self.user.id)
+        version = await get_contacts_version(self.db, self.user.id)
+        self.assertIsNone(await create_contact(self.db, self.contact_data(), self.user.id))
+        self.assertIsNone(await update_contact(self.db, self.user.id, contact.id + 1, {'first_name': 'John'}))
+        self.assertEqual(await get_contacts_version(self.db, self.user.id), version)
+
+    async def test_publish_changes(self):
+        with event_hub.subscribe(self.user.id) as subscription:
+            contact = await create_contact(self.db, self.contact_data(), self.user.id)
+            self.assertIsNone(await create_contact(self.db, self.contact_data(), self.user.id))
+            await update_contact(self.db, self.user.id, contact.id, {'first_name': 'John'})
+            await delete_contact(self.db, self.user.id, contact.id)
+            await bulk_create_contacts(self.db, [self.contact_data(email=f'bulk{i}@example.com') for i in range(2)],
+                                       self.user.id)
+            await asyncio.sleep(0)
+            chunk = await subscription.get(1)
+
+        events = [block.split('\n') for block in chunk.decode().strip().split('\n\n')]
+        self.assertEqual([lines[:2] for lines in events[:3]],
+                         [['id: 1', 'event: change'], ['id: 2', 'event: change'], ['id: 3', 'event: change']])
+        upsert, delete = json.loads(events[1][2][6:]), json.loads(events[2][2][6:])
+        self.assertEqual((upsert['op'], upsert['id'], upsert['contact']['first_name']), ('upsert', contact.id, 'John'))
+        self.assertEqual(delete, {'seq': 3, 'op': 'delete', 'id': contact.id, 'contact': None})
+        self.assertEqual(events[3], ['event: resync', 'data: {"seq":5}'])
+
+    async def test_batch(self):
+        ivan = await create_contact(self.db, self.contact_data(), self.user.id)
+        petro = await create_contact(self.db, self.contact_data(email='petro@example.com'), self.user.id)
+        olena = await create_contact(self.db, self.contact_data(email='olena@example.com'), self.user.id)
+
+        rows = await get_contacts_by_ids(self.db, self.user.id, [ivan.id, 999])
+        self.assertEqual(list(rows), [ivan.id])
+
+        rows, conflicts = await update_contacts(self.db, self.user.id, [
+            {'id': ivan.id, 'first_name': 'John', 'birthday': date(1990, 3, 1)},
+            {'id': petro.id, 'email': 'olena@example.com'},
+            {'id': olena.id, 'last_name': 'Kosach'},
+            {'id': 999, 'first_name': 'Nobody'},
+        ])
+        self.assertEqual(conflicts, {petro.id})
+        self.assertEqual(set(rows), {ivan.id, olena.id})
+        self.assertEqual((rows[ivan.id].first_name, rows[olena.id].last_name), ('John', 'Kosach'))
+
+        self.assertEqual(await delete_contacts(self.db, self.user.id, [petro.id, 999]), {petro.id})
+        self.assertEqual(await get_contacts_by_ids(self.db, self.user.id, [petro.id]), {})
+        changes, _ = await get_changes(self.db, self.user.id, since=3)
+        # Оновлення згруповано за полями, номери змін ідуть у порядку груп
+        self.assertEqual([(op, row.id, row.seq) for op, row in changes],
+                         [('upsert', ivan.id, 4), ('upsert', olena.id, 5), ('delete', petro.id, 6)])
+
+    async def test_stream_contacts(self):
+        for i in range(5):
+            await create_contact(self.db, self.contact_data(email=f'contact{i}@example.com'), self.user.id)
+
+        batches = [batch async for batch in stream_contacts(self.db, self.user.id, 2)]
+        self.assertEqual([len(batch) for batch in batches], [2, 2, 1])
+        self.assertEqual(batches[0][0]['email'], 'contact0@example.com')
+
+    async def test_confirm_email(self):
+        await confirm_email(self.db, self.user.email)
+        result = await get_user_by_email(self.db, self.user.email)
+        self.assertTrue(result.confirmed)
+
+    async def test_update_avatar_keeps_other_columns(self):
+        # Знімок з кешу автентифікації, зроблений до підтвердження email
+        snapshot = User(id=self.user.id, email=self.user.email, username=self.user.username, confirmed=False)
+        await confirm_email(self.db, self.user.email)
+        result = await update_avatar(self.db, snapshot, 'https://example.com/avatar.png', 'hash')
+        self.assertEqual((result.avatar, result.avatar_hash), ('https://example.com/avatar.png', 'hash'))
+        self.assertTrue(result.confirmed)
+
+    async def asyncTearDown(self):
+        await self.db.close()
+        await self.engine.dispose()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,6 @@
 import unittest
 from unittest.mock import Mock
-from src.repository.users import get_user_by_email, register_user, confirm_email
+from src.repository.users import get_user_by_email, register_user, confirm_email, get_token_version, revoke_tokens
 from src.database.models import User
 
 class TestUsers(unittest.TestCase):
@@ -74,6 +74,20 @@ class TestUsers(unittest.TestCase):
         self.assertTrue(user_to_confirm.confirmed)
         self.db_session_mock.commit.assert_called_once()
 
+    def test_get_token_version(self):
+        self.db_session_mock.query.return_value.filter.return_value.scalar.return_value = 3
+        self.assertEqual(get_token_version(self.db_session_mock, 1), 3)
+
+    def test_revoke_tokens(self):
+        user = User(id=1, email='user@example.com', token_version=0)
+
+        result = revoke_tokens(self.db_session_mock, user)
+
+        self.assertIs(result, self.db_session_mock.scalar.return_value)
+        self.db_session_mock.execute.assert_called_once()
+        self.db_session_mock.commit.assert_called_once()
+        self.db_session_mock.merge.assert_not_called()
+
     def tearDown(self):
         self.db_session_mock.reset_mock()
 
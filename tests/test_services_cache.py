@@ -0,0 +1,176 @@
+import asyncio
+import time
+import unittest
+from datetime import date
+from unittest.mock import patch
+
+from sqlalchemy import create_engine, insert, select
+
+from src.database.models import Base, Contact
+from src.repository.contacts import CONTACT_COLUMNS
+from src.services.cache import MISSING, QueryCache, RedisQueryBackend, TTLCache, cached_query, freeze
+from src.services.serialization import encode_row
+
+
+class TestTTLCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = TTLCache(maxsize=2, ttl=60)
+
+    def test_get_and_set(self):
+        self.assertIsNone(self.cache.get('a'))
+        self.cache.set('a', 1)
+        self.assertEqual(self.cache.get('a'), 1)
+        stats = self.cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['hit_ratio']), (1, 1, 0.5))
+
+    def test_lru_eviction(self):
+        self.cache.set('a', 1)
+        self.cache.set('b', 2)
+        self.cache.get('a')
+        self.cache.set('c', 3)
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEqual(self.cache.get('a'), 1)
+        self.assertEqual(self.cache.stats()['evictions'], 1)
+
+    def test_expiry_capped_by_deadline(self):
+        now = time.monotonic()
+        self.cache.set('a', 1, expires_at=now + 5)
+        self.cache.set('b', 2, expires_at=now + 600)
+        with patch('src.services.cache.time.monotonic', return_value=now + 10):
+            self.assertIsNone(self.cache.get('a'))
+            self.assertEqual(self.cache.get('b'), 2)
+        with patch('src.services.cache.time.monotonic', return_value=now + 61):
+            self.assertIsNone(self.cache.get('b'))
+        self.assertEqual(self.cache.stats()['size'], 0)
+
+    def test_invalidate(self):
+        self.cache.set('a', 1)
+        self.cache.invalidate('a')
+        self.cache.invalidate('missing')
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(self.cache.stats()['invalidations'], 1)
+
+
+
+class FakeRedis:
+    def __init__(self):
+        self.values = {}
+
+    def get(self, name):
+        return self.values.get(name)
+
+    def set(self, name, value, px=None):
+        self.values[name] = value
+
+
+class TestQueryCache(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.cache = QueryCache(maxsize=2, per_user=2, ttl=60)
+        self.loads = 0
+
+    async def load(self, value='rows', delay=0.0):
+        self.loads += 1
+        await asyncio.sleep(delay)
+        return value
+
+    def test_lru_levels(self):
+        for key in ('a', 'b', 'c'):
+            self.cache.set(1, key, key)
+        self.assertIs(self.cache.get(1, 'a'), MISSING)
+        self.assertEqual(self.cache.get(1, 'c'), 'c')
+        self.cache.set(2, 'a', None)
+        self.cache.set(3, 'a', 3)
+        self.assertIs(self.cache.get(1, 'c'), MISSING)
+        self.assertIsNone(self.cache.get(2, 'a'))
+
+    def test_invalidate_user(self):
+        self.cache.set(1, 'a', 1)
+        self.cache.set(2, 'a', 2)
+        self.cache.invalidate_user(1)
+        self.assertIs(self.cache.get(1, 'a'), MISSING)
+        self.assertEqual(self.cache.get(2, 'a'), 2)
+        self.assertEqual(self.cache.stats()['invalidations'], 1)
+
+    def test_expiry_capped_by_deadline(self):
+        now = time.monotonic()
+        self.cache.set(1, 'a', 1, expires_at=now + 5)
+        with patch('src.services.cache.time.monotonic', return_value=now + 10):
+            self.assertIs(self.cache.get(1, 'a'), MISSING)
+
+    async def test_single_flight(self):
+        results = await asyncio.gather(*(self.cache.get_or_load(1, 'a', lambda: self.load(delay=0.01))
+                                         for _ in range(5)))
+        self.assertEqual(results, ['rows'] * 5)
+        self.assertEqual(self.loads, 1)
+        self.assertEqual(await self.cache.get_or_load(1, 'a', self.load), 'rows')
+        stats = self.cache.stats()
+        self.assertEqual((stats['misses'], stats['coalesced'], stats['hits']), (1, 4, 1))
+        self.assertEqual(self.cache.loading, {})
+
+    async def test_cancelled_leader(self):
+        leader = asyncio.ensure_future(self.cache.get_or_load(1, 'a', lambda: self.load(delay=10)))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(self.cache.get_or_load(1, 'a', lambda: self.load('own')))
+        await asyncio.sleep(0)
+        leader.cancel()
+        self.assertEqual(await follower, 'own')
+        self.assertTrue(leader.cancelled())
+
+    async def test_load_error(self):
+        async def fail():
+            raise ValueError('db')
+
+        with self.assertRaises(ValueError):
+            await self.cache.get_or_load(1, 'a', fail)
+        self.assertEqual(await self.cache.get_or_load(1, 'a', self.load), 'rows')
+
+    async def test_shared_backend(self):
+        shared = RedisQueryBackend(FakeRedis())
+        first, second = (QueryCache(maxsize=2, per_user=2, ttl=60, shared=shared) for _ in range(2))
+        self.assertEqual(await first.get_or_load(1, 'a', self.load), 'rows')
+        self.assertEqual(await second.get_or_load(1, 'a', self.load), 'rows')
+        self.assertEqual((self.loads, second.stats()['shared_hits']), (1, 1))
+
+    def test_shared_backend_rows(self):
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        with engine.begin() as conn:
+            conn.execute(insert(Contact), [
+                {"first_name": "Ivan", "last_name": "Franko", "email": "ivan@example.com", "phone_number": "1",
+                 "birthday": date(1990, 1, 2), "user_id": 1},
+                {"first_name": "Lesia", "last_name": "Ukrainka", "email": "lesia@example.com", "phone_number": "2",
+                 "birthday": None, "user_id": 1}])
+            rows = conn.execute(select(*CONTACT_COLUMNS).order_by(Contact.id)).all()
+        engine.dispose()
+        redis = FakeRedis()
+        shared = RedisQueryBackend(redis)
+        shared.set(1, 'page', (rows, [2]), 60)
+        # У Redis лежить JSON, а не pickle
+        self.assertTrue(next(iter(redis.values.values())).startswith(b'{'))
+        cached, after = shared.get(1, 'page')
+        self.assertEqual(after, [2])
+        self.assertEqual([encode_row(row) for row in cached], [encode_row(row) for row in rows])
+        self.assertEqual((cached[0].birthday, cached[1].birthday), (date(1990, 1, 2), None))
+        self.assertEqual(encode_row(cached[0], ('id', 'email')), {'id': 1, 'email': 'ivan@example.com'})
+        shared.set(1, 'none', None, 60)
+        self.assertIsNone(shared.get(1, 'none'))
+        self.assertIs(shared.get(1, 'missing'), MISSING)
+
+    async def test_cached_query(self):
+        calls = []
+
+        @cached_query(self.cache, 'contacts')
+        async def query(db, user_id, limit=10, columns=()):
+            calls.append((user_id, limit))
+            return [user_id, limit]
+
+        self.assertEqual(await query(None, 1, 5, version=3), [1, 5])
+        self.assertEqual(await query(None, 1, limit=5, version=3), [1, 5])
+        self.assertEqual(await query(None, 1, 5, version=4), [1, 5])
+        self.assertEqual(await query(None, 1, 5), [1, 5])
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(freeze([(Contact.id, Contact.__table__.c.email), [1]]), (('Contact.id', 'contacts.email'), (1,)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import gzip
+import unittest
+
+import brotli
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse, Response, StreamingResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from src.services.compression import CompressionMiddleware, compressible, negotiate_encoding
+
+BODY = "contact," * 200
+
+
+async def large(request):
+    return PlainTextResponse(BODY)
+
+
+async def small(request):
+    return PlainTextResponse("ok")
+
+
+async def image(request):
+    return Response(b"\xff\xd8" * 1000, media_type="image/jpeg")
+
+
+async def events(request):
+    return Response("data: 1\n\n" * 100, media_type="text/event-stream")
+
+
+async def stream(request):
+    async def chunks():
+        for i in range(3):
+            yield BODY
+    return StreamingResponse(chunks(), media_type="application/x-ndjson")
+
+
+class TestCompression(unittest.TestCase):
+    def setUp(self):
+        app = Starlette(routes=[Route("/large", large), Route("/small", small), Route("/image", image),
+                                Route("/events", events), Route("/stream", stream)])
+        app.add_middleware(CompressionMiddleware, minimum_size=500)
+        self.client = TestClient(app)
+
+    def get(self, url, accept_encoding):
+        # stream=True не даємо httpx розпаковувати тіло, щоб перевірити байти на дроті
+        with self.client.stream("GET", url, headers={"Accept-Encoding": accept_encoding}) as response:
+            return response, b"".join(response.iter_raw())
+
+    def test_negotiate_encoding(self):
+        self.assertEqual(negotiate_encoding("gzip, deflate, br"), "br")
+        self.assertEqual(negotiate_encoding("gzip"), "gzip")
+        self.assertEqual(negotiate_encoding("br;q=0.5, gzip;q=0.8"), "gzip")
+        self.assertEqual(negotiate_encoding("*;q=0.1, br;q=0"), "gzip")
+        self.assertIsNone(negotiate_encoding("identity"))
+        self.assertIsNone(negotiate_encoding(""))
+        self.assertIsNone(negotiate_encoding("gzip;q=0"))
+
+    def test_compressible(self):
+        self.assertTrue(compressible("application/json"))
+        self.assertTrue(compressible("text/csv; charset=utf-8"))
+        self.assertFalse(compressible("text/event-stream"))
+        self.assertFalse(compressible("image/jpeg"))
+
+    def test_gzip_and_brotli(self):
+        response, raw = self.get("/large", "gzip")
+        self.assertEqual(response.headers["content-encoding"], "gzip")
+        self.assertEqual(response.headers["vary"], "Accept-Encoding")
+        self.assertEqual(int(response.headers["content-length"]), len(raw))
+        self.assertEqual(gzip.decompress(raw).decode(), BODY)
+
+        response, raw = self.get("/large", "br, gzip")
+        self.assertEqual(response.headers["content-encoding"], "br")
+        self.assertEqual(brotli.decompress(raw).decode(), BODY)
+
+    def test_not_compressed(self):
+        for url in ("/small", "/image", "/events"):
+            response, raw = self.get(url, "gzip, br")
+            self.assertNotIn("content-encoding", response.headers, url)
+        response, raw = self.get("/large", "identity")
+        self.assertEqual(raw.decode(), BODY)
+
+    def test_streaming(self):
+        response, raw = self.get("/stream", "gzip")
+        self.assertEqual(response.headers["content-encoding"], "gzip")
+        self.assertNotIn("content-length", response.headers)
+        self.assertEqual(gzip.decompress(raw).decode(), BODY * 3)
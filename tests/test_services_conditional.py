@@ -0,0 +1,18 @@
+import unittest
+from datetime import datetime, timedelta, timezone
+
+from src.services.conditional import validators
+
+
+class TestValidators(unittest.TestCase):
+    def test_last_modified_is_utc(self):
+        expected = "Sat, 17 Oct 2026 09:30:00 GMT"
+        # PostgreSQL повертає timestamptz у часовому поясі сесії, SQLite - наївний UTC
+        kyiv = datetime(2026, 10, 17, 12, 30, 0, 123456, tzinfo=timezone(timedelta(hours=3)))
+        self.assertEqual(validators('W/"1"', kyiv)["Last-Modified"], expected)
+        self.assertEqual(validators('W/"1"', datetime(2026, 10, 17, 9, 30))["Last-Modified"], expected)
+        self.assertNotIn("Last-Modified", validators('W/"1"'))
+
+
+if __name__ == '__main__':
+    unittest.main()
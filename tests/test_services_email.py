@@ -0,0 +1,70 @@
+import socket
+import unittest
+
+from aiosmtpd.controller import Controller
+
+from src.services.email import EmailDispatcher, build_message
+
+
+class CollectingHandler:
+    def __init__(self):
+        self.messages = []
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append(envelope)
+        return "250 OK"
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class TestEmailDispatcher(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.handler = CollectingHandler()
+        self.controller = Controller(self.handler, hostname="127.0.0.1", port=free_port())
+        self.controller.start()
+
+    def message(self, i):
+        return build_message(f"user{i}@example.com", "Confirm your email ", "verify_email.html",
+                             host="http://testserver/", username=f"user{i}", token="token")
+
+    async def test_send_over_one_connection(self):
+        dispatcher = EmailDispatcher(self.controller.hostname, self.controller.port, workers=1)
+        for i in range(5):
+            await dispatcher.enqueue(self.message(i))
+        await dispatcher.stop()
+
+        self.assertEqual(len(self.handler.messages), 5)
+        self.assertIn(b"user3", self.handler.messages[3].content)
+        stats = dispatcher.stats()
+        self.assertEqual((stats["sent"], stats["failed"], stats["connections"]), (5, 0, 1))
+
+    async def test_retry_and_fail(self):
+        dispatcher = EmailDispatcher("127.0.0.1", free_port(), workers=1, max_retries=2, backoff=0.01, timeout=1)
+        await dispatcher.enqueue(self.message(0))
+        await dispatcher.stop()
+
+        stats = dispatcher.stats()
+        self.assertEqual((stats["sent"], stats["failed"], stats["retried"]), (0, 1, 2))
+
+    async def test_unexpected_error_keeps_worker(self):
+        dispatcher = EmailDispatcher(self.controller.hostname, self.controller.port, workers=1)
+        broken = self.message(0)
+        broken.set_payload(object())
+        await dispatcher.enqueue(broken)
+        await dispatcher.enqueue(self.message(1))
+        await dispatcher.stop(timeout=5)
+
+        self.assertEqual(len(self.handler.messages), 1)
+        stats = dispatcher.stats()
+        self.assertEqual((stats["sent"], stats["failed"], stats["workers"]), (1, 1, 0))
+
+    def tearDown(self):
+        self.controller.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import asyncio
+import time
+import unittest
+
+import orjson
+
+from src.services.cache import principal_cache, token_versions
+from src.services.events import KEEPALIVE, EventHub, LocalBroker, encode_event
+
+
+def parse(chunk: bytes) -> list:
+    # Кадри SSE розділені порожнім рядком, поля кадру — рядками "назва: значення"
+    frames = []
+    for block in chunk.decode().strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.split("\n"))
+        frames.append((fields.get("id"), fields["event"], orjson.loads(fields["data"])))
+    return frames
+
+
+class TestEventHub(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.hub = EventHub(LocalBroker(), buffer_size=3)
+
+    def test_encode_event(self):
+        self.assertEqual(encode_event("change", {"seq": 5}, 5), b'id: 5\nevent: change\ndata: {"seq":5}\n\n')
+        self.assertEqual(encode_event("resync", {"seq": 5}), b'event: resync\ndata: {"seq":5}\n\n')
+
+    async def test_publish_from_threadpool(self):
+        with self.hub.subscribe(1) as subscription, self.hub.subscribe(2) as other:
+            await asyncio.to_thread(self.hub.publish, 1, "change", {"seq": 1}, 1)
+            self.hub.publish(1, "change", {"seq": 2}, 2)
+            # Події доставляються через call_soon_threadsafe, тож даємо циклу їх обробити
+            await asyncio.sleep(0)
+            self.assertEqual(parse(await subscription.get(1)),
+                             [("1", "change", {"seq": 1}), ("2", "change", {"seq": 2})])
+            self.assertEqual(await other.get(0.01), KEEPALIVE)
+        self.assertEqual(self.hub.subscriptions, {})
+        self.hub.publish(1, "change", {"seq": 3}, 3)
+
+    async def test_slow_consumer(self):
+        with self.hub.subscribe(1) as subscription:
+            for seq in range(1, 6):
+                self.hub.publish(1, "change", {"seq": seq}, seq)
+            await asyncio.sleep(0)
+            self.assertEqual(parse(await subscription.get(1)),
+                             [(None, "resync", {"seq": 4}), ("5", "change", {"seq": 5})])
+
+    async def test_stream(self):
+        stream = self.hub.stream(1, last_event_id=7, heartbeat=0.01)
+        self.assertEqual(await anext(stream), b"retry: 3000\n\n")
+        self.assertEqual(parse(await anext(stream)), [(None, "resync", {"seq": 7})])
+        self.assertEqual(await anext(stream), KEEPALIVE)
+        self.hub.publish(1, "change", {"seq": 8}, 8)
+        self.assertEqual(parse(await anext(stream)), [("8", "change", {"seq": 8})])
+        await stream.aclose()
+        self.assertEqual(self.hub.subscriptions, {})
+
+    async def test_revoke(self):
+        token_versions.set(1, 0)
+        principal_cache.set("user@example.com", {"token_version": 0})
+        stream = self.hub.stream(1, heartbeat=0.01)
+        self.assertEqual(await anext(stream), b"retry: 3000\n\n")
+        with self.hub.subscribe(2) as other:
+            self.hub.publish(1, "revoke", {"email": "user@example.com"})
+            await asyncio.sleep(0)
+            self.assertEqual(parse(await anext(stream)), [(None, "revoked", {})])
+            with self.assertRaises(StopAsyncIteration):
+                await anext(stream)
+            self.assertEqual(await other.get(0.01), KEEPALIVE)
+        self.assertEqual(self.hub.subscriptions, {})
+        self.assertIsNone(token_versions.get(1))
+        self.assertIsNone(principal_cache.get("user@example.com"))
+
+    async def test_stream_expires(self):
+        stream = self.hub.stream(1, heartbeat=10, expires_at=time.time() + 0.05)
+        self.assertEqual(await anext(stream), b"retry: 3000\n\n")
+        self.assertEqual(await anext(stream), KEEPALIVE)
+        self.assertEqual(parse(await anext(stream)), [(None, "expired", {})])
+        with self.assertRaises(StopAsyncIteration):
+            await anext(stream)
+        self.assertEqual(self.hub.subscriptions, {})
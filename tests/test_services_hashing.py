@@ -0,0 +1,42 @@
+import asyncio
+import threading
+import unittest
+
+from fastapi import HTTPException
+
+from src.services.hashing import HashingExecutor
+
+
+class TestHashingExecutor(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.executor = HashingExecutor(max_workers=1, max_queue=1)
+
+    async def test_run(self):
+        result = await self.executor.run(lambda password: password.upper(), 'secret')
+        self.assertEqual(result, 'SECRET')
+        stats = self.executor.stats()
+        self.assertEqual(stats['completed'], 1)
+        self.assertEqual(stats['queue_depth'], 0)
+
+    async def test_run_rejects_when_queue_is_full(self):
+        release = threading.Event()
+        busy = [asyncio.create_task(self.executor.run(release.wait)) for _ in range(2)]
+        await asyncio.sleep(0)
+        self.assertEqual(self.executor.stats()['queue_depth'], 1)
+
+        with self.assertRaises(HTTPException) as error:
+            await self.executor.run(release.wait)
+        self.assertEqual(error.exception.status_code, 503)
+        self.assertEqual(error.exception.headers['Retry-After'], '1')
+        self.assertEqual(self.executor.stats()['rejected'], 1)
+
+        release.set()
+        await asyncio.gather(*busy)
+        self.assertEqual(self.executor.stats()['completed'], 2)
+
+    async def asyncTearDown(self):
+        self.executor.shutdown()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,144 @@
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from limits import parse
+from limits.storage import storage_from_string
+from limits.strategies import FixedWindowRateLimiter, MovingWindowRateLimiter
+from starlette.requests import Request
+
+from src.services.auth import create_access_token
+from src.services.rate_limit import BatchedRedisStorage, SQLiteStorage, rate_limit_key
+
+
+class FakeRedis:
+    """
+    The commands of redis-py the counter store uses, kept in a dictionary.
+    """
+
+    def __init__(self):
+        self.values = {}
+        self.expirations = {}
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def incrby(self, name, amount):
+        self.values[name] = self.values.get(name, 0) + amount
+        return self.values[name]
+
+    def expireat(self, name, when):
+        self.expirations[name] = when
+        return True
+
+    def scan_iter(self, match):
+        prefix = match.rstrip("*")
+        return [name for name in self.values if name.startswith(prefix)]
+
+    def delete(self, *names):
+        for name in names:
+            self.values.pop(name, None)
+
+    def ping(self):
+        return True
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def __getattr__(self, name):
+        return lambda *args: self.commands.append((name, args))
+
+    def execute(self):
+        return [getattr(self.client, name)(*args) for name, args in self.commands]
+
+
+def request(headers: dict = None) -> Request:
+    raw = [(key.lower().encode(), value.encode()) for key, value in (headers or {}).items()]
+    return Request({"type": "http", "headers": raw, "client": ("10.0.0.1", 1234)})
+
+
+class TestRateLimitKey(unittest.TestCase):
+    def test_rate_limit_key(self):
+        authenticated = request()
+        # Суб'єкт токена зберігає залежність автентифікації, повторно токен не декодується
+        authenticated.state.token_subject = "user@example.com"
+        self.assertEqual(rate_limit_key(authenticated), "user:user@example.com")
+        token = create_access_token({"sub": "user@example.com"})
+        self.assertEqual(rate_limit_key(request({"Authorization": f"Bearer {token}"})), "ip:10.0.0.1")
+        self.assertEqual(rate_limit_key(request()), "ip:10.0.0.1")
+
+
+class TestBatchedStorage(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        uri = f"sqlite:///{Path(self.directory.name) / 'limits.db'}"
+        # Два сховища на одному файлі — це два воркери; синхронізуємо вручну
+        self.workers = [storage_from_string(uri, sync_interval=3600) for _ in range(2)]
+        self.limit = parse("5/minute")
+
+    def tearDown(self):
+        for worker in self.workers:
+            worker.close()
+        self.directory.cleanup()
+
+    def sync(self):
+        for worker in self.workers + self.workers:
+            worker.sync()
+
+    def test_shared_between_workers(self):
+        self.assertIsInstance(self.workers[0], SQLiteStorage)
+        first, second = (MovingWindowRateLimiter(worker) for worker in self.workers)
+        self.assertTrue(all(first.hit(self.limit, "user:a") for _ in range(3)))
+        self.assertTrue(all(second.hit(self.limit, "user:a") for _ in range(2)))
+        self.assertTrue(first.test(self.limit, "user:a"))
+
+        self.sync()
+        self.assertFalse(first.hit(self.limit, "user:a"))
+        self.assertFalse(second.hit(self.limit, "user:a"))
+        self.assertTrue(second.hit(self.limit, "user:b"))
+        self.assertEqual(first.get_window_stats(self.limit, "user:a").remaining, 0)
+
+        self.workers[0].reset()
+        self.workers[1].reset()
+        self.assertTrue(first.hit(self.limit, "user:a"))
+
+    def test_sliding_window(self):
+        limiter = MovingWindowRateLimiter(self.workers[0])
+        with patch("src.services.rate_limit.time.time", return_value=1000.0):
+            self.assertTrue(all(limiter.hit(self.limit, "user:a") for _ in range(5)))
+            self.assertFalse(limiter.hit(self.limit, "user:a"))
+        # Вікно 960..1020 закінчилось, але 5/6 його ударів ще в ковзному вікні
+        with patch("src.services.rate_limit.time.time", return_value=1030.0):
+            self.assertFalse(limiter.hit(self.limit, "user:a"))
+        with patch("src.services.rate_limit.time.time", return_value=1070.0):
+            self.assertTrue(all(limiter.hit(self.limit, "user:a") for _ in range(4)))
+            self.assertFalse(limiter.hit(self.limit, "user:a"))
+
+    def test_fixed_window(self):
+        limiter = FixedWindowRateLimiter(self.workers[0])
+        self.assertTrue(all(limiter.hit(self.limit, "user:a") for _ in range(5)))
+        self.assertFalse(limiter.hit(self.limit, "user:a"))
+        self.assertEqual(limiter.get_window_stats(self.limit, "user:a").remaining, 0)
+        self.workers[0].clear(self.limit.key_for("user:a"))
+        self.assertTrue(limiter.test(self.limit, "user:a"))
+
+    def test_redis(self):
+        client = FakeRedis()
+        workers = [BatchedRedisStorage("batched+redis://localhost:6379/0", sync_interval=3600, client=client)
+                   for _ in range(2)]
+        first, second = (MovingWindowRateLimiter(worker) for worker in workers)
+        self.assertTrue(all(first.hit(self.limit, "user:a") for _ in range(4)))
+        self.assertTrue(second.hit(self.limit, "user:a"))
+        for worker in workers + workers:
+            worker.sync()
+        self.assertFalse(second.hit(self.limit, "user:a"))
+        self.assertEqual(sum(client.values.values()), 5)
+        self.assertTrue(workers[0].check())
+        workers[0].reset()
+        self.assertEqual(client.values, {})
+        for worker in workers:
+            worker.close()